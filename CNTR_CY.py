@@ -4,8 +4,6 @@ import sys
 import numpy as np
 import pandas as pd
 import sqlite3
-import win32com.client
-import qdarkstyle
 import matplotlib
 matplotlib.use('Qt5Agg')
 import matplotlib.pyplot as plt
@@ -15,7 +13,7 @@ from PyQt5.QtWidgets import (
     QTableView, QHBoxLayout, QTableWidget, QTableWidgetItem, QGridLayout, QLabel, QInputDialog, QDateEdit,
     QDialogButtonBox, QTextEdit, QAction, QScrollArea, QMenu, QListWidgetItem, QAbstractItemView, QListWidget,
     QGroupBox, QHeaderView, QCheckBox, QProgressBar, QColorDialog)
-from PyQt5.QtCore import Qt, QSortFilterProxyModel, QDate, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QSortFilterProxyModel, QDate, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QStandardItemModel, QStandardItem, QCursor, QColor
 from datetime import datetime, timedelta
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -25,6 +23,14 @@ import warnings
 import time
 import io
 import csv
+import argparse
+import functools
+import threading
+import hashlib
+import json
+import urllib.parse
+from collections import OrderedDict
+from contextlib import contextmanager
 from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import QShortcut, QMenu
 warnings.filterwarnings("ignore", category=UserWarning, module='openpyxl')
@@ -37,6 +43,78 @@ matplotlib.rcParams['axes.unicode_minus'] = False  # 마이너스 부호 깨짐
 db_file = r"\\10.193.232.18\Java\우현 테스트\master_database.db"
 #contact_db_path = r"C:\Users\SyncthingServiceAcct\test\aiden\Vessel contact.db"
 contact_db_path = r"\\10.193.232.18\Java\우현 테스트\Vessel contact.db"
+# master_database.db 로컬 읽기 전용 복제본 폴더 (DatabaseReplica)
+replica_dir = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'CNTR_CY')
+
+# SQLite 연결 프로필: URI 모드 (ro / rw / rwc), 연결 직후 실행할 PRAGMA, 스레드별 연결 유지 여부
+# reader는 조회 / 분석 화면용 (읽기 전용, 큰 캐시와 mmap), writer는 업로드 등 쓰기용 (쓸 때만 열고 닫음)
+DB_PROFILES = {
+    "reader": {
+        "mode": "ro",
+        "persistent": True,
+        "pragmas": {"mmap_size": 268435456, "cache_size": -65536, "temp_store": "MEMORY", "query_only": 1}
+    },
+    "writer": {
+        "mode": "rwc",
+        "persistent": False,
+        "pragmas": {"cache_size": -16384, "temp_store": "MEMORY"}
+    },
+    "default": {"mode": "rwc", "persistent": True, "pragmas": {}}
+}
+DB_READ_PROFILE = "reader"
+DB_WRITE_PROFILE = "writer"
+
+# 설정 파일 (없으면 위 기본값 사용): CNTR_CY_CONFIG 환경 변수 또는 프로그램 폴더의 cntr_cy_config.json
+CONFIG_FILE = os.environ.get('CNTR_CY_CONFIG') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'cntr_cy_config.json')
+
+
+def load_config(path=None):
+    """
+    설정 파일(JSON)로 DB 경로와 연결 프로필을 바꾸는 함수
+    키: db_file, contact_db_path, replica_dir, read_profile, write_profile, profiles ({이름: 프로필 값})
+    """
+    global db_file, contact_db_path, replica_dir, DB_READ_PROFILE, DB_WRITE_PROFILE
+    path = path or CONFIG_FILE
+    if not os.path.exists(path):
+        return False
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    db_file = config.get('db_file', db_file)
+    contact_db_path = config.get('contact_db_path', contact_db_path)
+    replica_dir = config.get('replica_dir', replica_dir)
+    for name, profile in config.get('profiles', {}).items():
+        merged = dict(DB_PROFILES.get(name, DB_PROFILES['default']))
+        merged.update(profile)
+        DB_PROFILES[name] = merged
+    DB_READ_PROFILE = config.get('read_profile', DB_READ_PROFILE)
+    DB_WRITE_PROFILE = config.get('write_profile', DB_WRITE_PROFILE)
+    for name in (DB_READ_PROFILE, DB_WRITE_PROFILE):
+        if name not in DB_PROFILES:
+            raise ValueError(f"Unknown database profile in {path}: {name}")
+    return True
+
+
+load_config()
+
+# 탭 이름 -> 선사별 테이블
+TAB_INFO = {
+    "WM": "table1",
+    "AC": "table2",
+    "AV_AO": "table3",
+    "REF": "table4",
+    "MWO": "table5",
+    "DW": "table6",
+    "MN": "table7",
+    "TV": "table8",
+    "RB": "table9",
+    "JEM": "table10",
+    "FCL": "table11"
+}
+
+# 명령줄(kpi-report)로 실행 중이면 True: 오류를 메시지 박스 대신 예외로만 전달
+HEADLESS = False
 
 
 
@@ -50,32 +128,33 @@ class LoadingWorker(QThread):
             total_steps = 100
             current_step = 0
             
-            # 1. 데이터베이스 연결 (30%)
-            conn = connect_db()
-            for i in range(30):
-                self.progress.emit(current_step)
-                current_step += 1
-                time.sleep(0.02)
+            # 1. 로컬 복제본 동기화 및 데이터베이스 연결 (30%)
+            DatabaseReplica.refresh()
+            with db_connection() as conn:
+                for i in range(30):
+                    self.progress.emit(current_step)
+                    current_step += 1
+                    time.sleep(0.02)
             
-            # 2. 테이블 정보 가져오기 (30%)
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            for i in range(30):
-                self.progress.emit(current_step)
-                current_step += 1
-                time.sleep(0.02)
+                # 2. 테이블 정보 가져오기 (30%)
+                cursor = conn.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")
+                tables = cursor.fetchall()
+                for i in range(30):
+                    self.progress.emit(current_step)
+                    current_step += 1
+                    time.sleep(0.02)
             
-            # 3. 초기 데이터 로드 (40%)
-            initial_data = {}
-            steps_per_table = 40 // (len(tables) or 1)
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"SELECT * FROM {table_name} LIMIT 1")
-                initial_data[table_name] = cursor.description
-                self.progress.emit(current_step)
-                current_step += steps_per_table
-                time.sleep(0.02)
+                # 3. 초기 데이터 로드 (40%)
+                initial_data = {}
+                steps_per_table = 40 // (len(tables) or 1)
+                for table in tables:
+                    table_name = table[0]
+                    cursor.execute(f"SELECT * FROM {table_name} LIMIT 1")
+                    initial_data[table_name] = cursor.description
+                    self.progress.emit(current_step)
+                    current_step += steps_per_table
+                    time.sleep(0.02)
             
             # 남은 진행률을 100%까지 채움
             while current_step <= 100:
@@ -85,6 +164,9 @@ class LoadingWorker(QThread):
             
         except Exception as e:
             print(f"Error in worker thread: {str(e)}")
+        finally:
+            # 작업자 스레드 전용 연결은 스레드와 함께 정리
+            ConnectionManager.close_current()
 
 class LoadingScreen(QWidget):
     def __init__(self):
@@ -145,9 +227,10 @@ class LoadingScreen(QWidget):
 
 
 class KPICalculator:
-    def __init__(self, tab_info=None):  # tab_info 파라미터 추가
+    def __init__(self, tab_info=None, frame=None):  # tab_info 파라미터 추가
         self.storage_utils = StorageUtils()
         self.tab_info = tab_info  # tab_info 저장
+        self.frame = frame  # 지정하면 월별 데이터를 DB 대신 이 DataFrame에서 사용 (스냅샷 저장용)
         
     def calculate_container_bonus(self, container_count):
         """컨테이너 수에 따른 가산점 계산"""
@@ -163,162 +246,271 @@ class KPICalculator:
             return 2
         return 0
 
-    def calculate_division_kpi(self, table_name, target_month):
+    def _monthly_frame(self):
+        """KPI 대상 디비전 전체의 (division, month) 월별 스토리지 데이터"""
+        if self.frame is not None:
+            return self.frame
+        return StorageUtils.get_monthly_storage_data_many(self._tables())
+
+    def _tables(self):
+        """KPI 대상 디비전 테이블 목록"""
+        return list(self.tab_info.values()) if self.tab_info else [f'table{i}' for i in range(1, 12)]
+
+    # calculate_all_divisions_kpi 결과 컬럼 (calculate_division_kpi 반환 dict의 키와 같은 순서)
+    KPI_COLUMNS = [
+        'total_score', 'grade', 'mom_change', 'mom_score', 'yoy_change', 'yoy_score',
+        'cost_per_container_score', 'trend_score', 'current_cost', 'cost_per_container_rank',
+        'cost_per_container', 'container_count', 'container_bonus'
+    ]
+
+    def calculate_kpi_range(self, start_month, end_month):
+        """
+        start_month ~ end_month 각 월의 모든 디비전 KPI를 한 번에 계산 ((division, month) 인덱스, KPI_COLUMNS 컬럼)
+        디비전 x 월 행렬을 한 번 만들어 MoM / YoY는 월 축 이동, 순위는 월별 열 단위로 계산 (동점은 같은 순위)
+        """
+        frame = self._monthly_frame()
+        empty = pd.DataFrame(columns=self.KPI_COLUMNS,
+                             index=pd.MultiIndex.from_arrays([[], []], names=['division', 'month']))
+        if frame.empty:
+            return empty
+
+        divisions, first, matrices = self._month_matrices(frame, start_month, end_month)
+        scores = self._score_matrices(matrices)
+        scores['trend_score'], _, _ = self._trend_matrix(matrices['total_storage_cost'], matrices['present'])
+        return self._kpi_frame(divisions, first, scores, start_month, end_month)
+
+    def _score_matrices(self, matrices, columns=None):
+        """
+        디비전 x 월 행렬의 MoM / YoY / 컨테이너당 비용 점수 행렬 계산 (추세 점수는 _trend_matrix)
+        columns: 지정한 월 열만 계산 (what-if 부분 재계산용, 순위는 월 열마다 독립)
+        반환값: 컬럼별 행렬 dict (columns가 있으면 해당 열만)
+        """
+        cost = matrices['total_storage_cost']
+        if columns is None:
+            columns = np.arange(cost.shape[1])
+        current = cost[:, columns]
+        container_count = matrices['container_count'][:, columns]
+        cost_per_container = matrices['cost_per_container'][:, columns]
+
+        # 비용이 있는 칸만 KPI 대상
+        valid = matrices['present'][:, columns] & ~np.isnan(current)
+
+        # MoM / YoY 변화율: 이전 데이터가 없거나 0이면 현재 비용이 0일 때 0, 아니면 100
+        def change_from(shift):
+            base = np.full_like(current, np.nan)
+            has_base = columns >= shift
+            base[:, has_base] = cost[:, columns[has_base] - shift]
+            no_base = np.isnan(base) | (base == 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change = (current - base) / base * 100
+            return np.where(no_base, np.where(current == 0, 0.0, 100.0), change)
+
+        scores = {'valid': valid, 'current_cost': current, 'container_count': container_count}
+        scores['mom_change'] = change_from(1)
+        scores['yoy_change'] = change_from(12)
+
+        # 컨테이너당 비용 순위 (컨테이너가 있는 디비전만, 순위가 없으면 0): 1등 25점부터 순위마다 2.5점씩 감소
+        has_containers = valid & (container_count > 0)
+        cost_rank, cost_score = self.rank_score(cost_per_container, 25, step=2.5, mask=has_containers)
+        scores['cost_per_container_rank'] = np.nan_to_num(cost_rank, nan=0).astype(int)
+        scores['cost_per_container_score'] = np.nan_to_num(cost_score, nan=0)
+        scores['cost_per_container'] = np.where(has_containers, cost_per_container, 0.0)
+
+        # MoM (35점 ~ 17.5점), YoY (25점 ~ 12.5점): 변화율이 낮을수록 높은 순위
+        _, scores['mom_score'] = self.rank_score(scores['mom_change'], 35, worst=17.5, mask=valid)
+        _, scores['yoy_score'] = self.rank_score(scores['yoy_change'], 25, worst=12.5, mask=valid)
+        return scores
+
+    def _kpi_frame(self, divisions, first, scores, start_month, end_month):
+        """점수 행렬에서 조회 범위의 유효한 칸만 (division, month) 행의 KPI 표로 변환"""
+        columns = scores['valid'].shape[1]
+        start = start_month.year * 12 + start_month.month - 1
+        end = end_month.year * 12 + end_month.month - 1
+
+        in_range = np.zeros(columns, dtype=bool)
+        in_range[start - first:end - first + 1] = True
+        rows, cols = np.nonzero(scores['valid'] & in_range)
+        kpi = pd.DataFrame(index=pd.MultiIndex.from_arrays([
+            divisions[rows],
+            pd.to_datetime({'year': (cols + first) // 12, 'month': (cols + first) % 12 + 1, 'day': 1})
+        ], names=['division', 'month']))
+
+        for column in ['mom_change', 'mom_score', 'yoy_change', 'yoy_score', 'cost_per_container_rank',
+                       'cost_per_container_score', 'cost_per_container', 'trend_score', 'current_cost']:
+            kpi[column] = scores[column][rows, cols]
+        kpi['container_count'] = scores['container_count'][rows, cols].astype(int)
+        kpi['container_bonus'] = kpi['container_count'].map(self.calculate_container_bonus)
+
+        kpi['total_score'] = (kpi['mom_score'] + kpi['yoy_score'] + kpi['cost_per_container_score'] +
+                              kpi['trend_score'] + kpi['container_bonus'])
+        kpi['grade'] = kpi['total_score'].map(self._calculate_grade)
+        return kpi[self.KPI_COLUMNS].sort_index()
+
+    def what_if(self, start_month, end_month=None):
+        """
+        start_month ~ end_month KPI에 대한 what-if 시뮬레이터 (KPIWhatIf) 생성
+        디비전 x 월 행렬을 한 번만 읽고, 시나리오마다 메모리 사본에서 영향받는 순위 / 추세 구간만 다시 계산
+        """
+        return KPIWhatIf(self, start_month, end_month or start_month)
+
+    def get_kpi_range(self, start_month, end_month):
+        """
+        calculate_kpi_range와 같은 결과를 지난 월은 kpi_snapshot에서 읽고 이번 달 이후만 실시간 계산
+        (스냅샷은 읽기만 함: 스냅샷이 없거나 data_version이 현재 데이터와 다른 지난 월은 실시간 계산,
+        스냅샷 저장은 업로드 / 요금 규칙 변경 시 KPISnapshot.backfill에서 수행)
+        """
+        current_month = pd.Timestamp(datetime.now().strftime('%Y-%m-01'))
+        if start_month >= current_month:
+            return self.calculate_kpi_range(start_month, end_month)
+
+        past_end = min(end_month, current_month - pd.DateOffset(months=1))
         try:
-            # container_count 데이터 먼저 가져오기
-            container_data = StorageUtils.get_kpi_container_count(table_name)
-            if container_data.empty:
-                return None
-                
-            # storage cost 데이터 가져오기
-            storage_data = self.storage_utils.get_monthly_storage_data(table_name)
-            if storage_data.empty:
-                return None
+            frame = self._monthly_frame()
+            months = sorted(m for m in frame.index.get_level_values('month').unique() if start_month <= m <= past_end)
+            versions = KPISnapshot.month_versions(frame, months)
+            with db_connection() as conn:
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='kpi_snapshot'").fetchone() is None:
+                    # 아직 스냅샷을 만든 적 없는 DB
+                    return self.calculate_kpi_range(start_month, end_month)
+                kpi = KPISnapshot.load(conn, start_month, past_end)
+                stored = KPISnapshot.stored_versions(conn)
+        except Exception as e:
+            print(f"Debug - KPI snapshot unavailable, computing live: {str(e)}")
+            return self.calculate_kpi_range(start_month, end_month)
 
-            # 데이터 병합
-            df = pd.merge(storage_data, container_data[['month', 'container_count']], 
-                         on='month', how='left')
+        stale = [m for m in months if stored.get(m.strftime('%Y-%m')) != versions[m]]
+        kpi_months = kpi.index.get_level_values('month')
+        kpi = kpi[kpi_months.isin(months) & ~kpi_months.isin(stale)]
+        if stale:
+            live = self.calculate_kpi_range(stale[0], stale[-1])
+            kpi = pd.concat([kpi, live[live.index.get_level_values('month').isin(stale)]]).sort_index()
+
+        if end_month >= current_month:
+            kpi = pd.concat([kpi, self.calculate_kpi_range(current_month, end_month)]).sort_index()
+        return kpi
+
+    def _month_matrices(self, frame, start_month=None, end_month=None):
+        """
+        월별 데이터를 디비전 x 연속 월 행렬로 변환 (데이터가 없는 칸은 NaN, 조회 범위가 데이터 밖이면 열을 늘림)
+        반환값: (디비전 배열, 첫 열의 월 번호(year * 12 + month - 1), 컬럼별 행렬 + present 행렬)
+        """
+        divisions, division_codes = np.unique(frame.index.get_level_values('division'), return_inverse=True)
+        months = frame.index.get_level_values('month')
+        month_numbers = (months.year * 12 + months.month - 1).to_numpy()
+        first, last = month_numbers.min(), month_numbers.max()
+        if start_month is not None:
+            first = min(first, start_month.year * 12 + start_month.month - 1)
+        if end_month is not None:
+            last = max(last, end_month.year * 12 + end_month.month - 1)
+        positions = month_numbers - first
+
+        matrices = {}
+        for column in ['total_storage_cost', 'container_count', 'cost_per_container']:
+            matrices[column] = np.full((len(divisions), last - first + 1), np.nan)
+            matrices[column][division_codes, positions] = frame[column].to_numpy(dtype='float64')
+        matrices['present'] = np.zeros((len(divisions), last - first + 1), dtype=bool)
+        matrices['present'][division_codes, positions] = True
+        return divisions, first, matrices
+
+    @staticmethod
+    def _trend_matrix(cost, present):
+        """
+        디비전 x 월 행렬의 추세 점수 (calculate_trend_score와 같은 기준)
+        최근 12개월 안의 연속된 두 데이터 사이에서 비용이 늘어난 횟수: 0~3회 15점, 4~10회 14점 ~ 8점, 11회 이상 7점
+        12개월 안의 데이터가 2개월 미만이면 5점
+        반환값: (trend_score, increases, months_with_data) 행렬
+        """
+        division_count, columns = cost.shape
+        index = np.arange(columns)
+
+        # 각 칸 바로 이전 데이터 월의 위치 (-1: 없음)와 비용
+        last_seen = np.maximum.accumulate(np.where(present, index, -1), axis=1)
+        previous = np.c_[np.full(division_count, -1), last_seen[:, :-1]]
+        previous_cost = np.take_along_axis(cost, np.maximum(previous, 0), axis=1)
+        with np.errstate(invalid='ignore'):
+            increased = present & (previous >= 0) & (cost > previous_cost) & (index - previous <= 11)
+
+        # 증가 한 번은 [해당 월, 이전 데이터 월 + 11] 범위의 기준월에 포함 (이벤트 배열 누적합)
+        rows, cols = np.nonzero(increased)
+        events = np.zeros((division_count, columns + 12))
+        np.add.at(events, (rows, cols), 1)
+        np.add.at(events, (rows, previous[rows, cols] + 12), -1)
+        increases = np.cumsum(events, axis=1)[:, :columns]
+
+        # 12개월 안의 데이터 개수
+        counts = np.cumsum(np.c_[np.zeros(division_count), present], axis=1)
+        months_with_data = counts[:, 1:] - counts[:, np.maximum(index - 11, 0)]
+
+        trend_score = np.where(months_with_data >= 2, np.clip(18 - increases, 7, 15), 5.0)
+        return trend_score, increases, months_with_data
+
+    def calculate_trend_history(self, start_month=None, end_month=None):
+        """
+        모든 디비전의 월별 추세 점수를 한 번에 계산 ((division, month) 인덱스)
+        start_month / end_month가 없으면 데이터가 있는 전체 기간, 반환 컬럼: trend_score, increases, months_with_data
+        """
+        frame = self._monthly_frame()
+        columns = ['trend_score', 'increases', 'months_with_data']
+        if frame.empty:
+            return pd.DataFrame(columns=columns,
+                                index=pd.MultiIndex.from_arrays([[], []], names=['division', 'month']))
+
+        divisions, first, matrices = self._month_matrices(frame, start_month, end_month)
+        trend_score, increases, months_with_data = self._trend_matrix(
+            matrices['total_storage_cost'], matrices['present'])
+
+        # 조회 범위의 열만 사용
+        month_numbers = first + np.arange(trend_score.shape[1])
+        selected = np.ones(len(month_numbers), dtype=bool)
+        if start_month is not None:
+            selected &= month_numbers >= start_month.year * 12 + start_month.month - 1
+        if end_month is not None:
+            selected &= month_numbers <= end_month.year * 12 + end_month.month - 1
+        month_numbers = month_numbers[selected]
+        months = pd.to_datetime({'year': month_numbers // 12, 'month': month_numbers % 12 + 1, 'day': 1})
+
+        index = pd.MultiIndex.from_product([divisions, months], names=['division', 'month'])
+        return pd.DataFrame({
+            'trend_score': trend_score[:, selected].ravel(),
+            'increases': increases[:, selected].ravel().astype(int),
+            'months_with_data': months_with_data[:, selected].ravel().astype(int)
+        }, index=index)
+
+    def calculate_all_divisions_kpi(self, target_month):
+        """target_month 데이터가 있는 모든 디비전의 KPI를 한 번에 계산 (division 인덱스, KPI_COLUMNS 컬럼)"""
+        kpi = self.calculate_kpi_range(target_month, target_month)
+        return kpi.droplevel('month')
+
+    def calculate_all_divisions_kpi_records(self, target_month):
+        """target_month 모든 디비전의 KPI를 {division: KPI dict} 형태로 반환 (지난 월은 스냅샷, 값은 파이썬 기본 타입)"""
+        kpi = self.get_kpi_range(target_month, target_month).droplevel('month')
+        return dict(zip(kpi.index, kpi.to_dict('records')))
+
+    def calculate_division_kpi(self, table_name, target_month):
+        try:
+            return self.calculate_all_divisions_kpi_records(target_month).get(table_name)
 
-            if df.empty:
-                return None
-                
-            current_data = df[df['month'] == target_month]
-            if current_data.empty:
-                return None
-                
-            current_cost = current_data.iloc[0]['total_storage_cost']
-            
-            # MoM 변화율 계산
-            prev_month_data = df[df['month'] == (target_month - pd.DateOffset(months=1))]
-            if prev_month_data.empty or prev_month_data.iloc[0]['total_storage_cost'] == 0:
-                mom_change = 0 if current_cost == 0 else 100
-            else:
-                mom_change = ((current_cost - prev_month_data.iloc[0]['total_storage_cost']) / 
-                             prev_month_data.iloc[0]['total_storage_cost'] * 100)
-            
-            # YoY 변화율 계산
-            prev_year_data = df[df['month'] == (target_month - pd.DateOffset(years=1))]
-            if prev_year_data.empty or prev_year_data.iloc[0]['total_storage_cost'] == 0:
-                yoy_change = 0 if current_cost == 0 else 100
-            else:
-                prev_year_cost = prev_year_data.iloc[0]['total_storage_cost']
-                yoy_change = ((current_cost - prev_year_cost) / prev_year_cost * 100)
-            
-            # 모든 테이블의 MoM, YoY 변화율 수집
-            tables = [f'table{i}' for i in range(1, 12)]
-            all_mom_changes = []
-            all_yoy_changes = []
-            
-            for table in tables:
-                df = self.storage_utils.get_monthly_storage_data(table)
-                if not df.empty:
-                    current_data = df[df['month'] == target_month]
-                    if not current_data.empty:
-                        current_cost = current_data.iloc[0]['total_storage_cost']
-                        
-                        # MoM 변화율 계산
-                        prev_month_data = df[df['month'] == (target_month - pd.DateOffset(months=1))]
-                        if prev_month_data.empty or prev_month_data.iloc[0]['total_storage_cost'] == 0:
-                            mom_change_temp = 0 if current_cost == 0 else 100
-                        else:
-                            mom_change_temp = ((current_cost - prev_month_data.iloc[0]['total_storage_cost']) / 
-                                        prev_month_data.iloc[0]['total_storage_cost'] * 100)
-                        all_mom_changes.append(mom_change_temp)
-                        
-                        # YoY 변화율 계산
-                        prev_year_data = df[df['month'] == (target_month - pd.DateOffset(years=1))]
-                        if prev_year_data.empty or prev_year_data.iloc[0]['total_storage_cost'] == 0:
-                            yoy_change_temp = 0 if current_cost == 0 else 100
-                        else:
-                            yoy_change_temp = ((current_cost - prev_year_data.iloc[0]['total_storage_cost']) / 
-                                        prev_year_data.iloc[0]['total_storage_cost'] * 100)
-                        all_yoy_changes.append(yoy_change_temp)
-            
-            # 점수 계산
-            mom_score = self._calculate_mom_score(mom_change, all_mom_changes)
-            yoy_score = self._calculate_yoy_score(yoy_change, all_yoy_changes)
-            cost_per_container_data = self.calculate_cost_per_container_rank(target_month)
-            trend_score = self.calculate_trend_score(table_name, target_month)
-            
-            # 컨테이너 수 데이터 가져오기
-            container_df = self.storage_utils.get_kpi_container_count(table_name)
-            current_month_data = container_df[container_df['month'] == target_month]
-            
-            if not current_month_data.empty:
-                container_count = current_month_data.iloc[0]['container_count']
-            else:
-                container_count = 0
-                
-            
-            
-            # 컨테이너 수에 따른 가산점 계산
-            container_bonus = self.calculate_container_bonus(container_count)
-            
-            # 총점에 가산점 추가
-            total_score = (mom_score + yoy_score + 
-                          cost_per_container_data.get(table_name, {}).get('score', 0) + 
-                          trend_score + container_bonus)
-            
-            return {
-                'total_score': total_score,
-                'grade': self._calculate_grade(total_score),
-                'mom_change': float(mom_change),
-                'mom_score': mom_score,
-                'yoy_change': float(yoy_change),
-                'yoy_score': yoy_score,
-                'cost_per_container_score': cost_per_container_data.get(table_name, {}).get('score', 0),
-                'trend_score': trend_score,
-                'current_cost': float(current_cost),
-                'cost_per_container_rank': cost_per_container_data.get(table_name, {}).get('rank', 0),
-                'cost_per_container': float(cost_per_container_data.get(table_name, {}).get('cost_per_container', 0)),
-                'container_count': int(container_count),
-                'container_bonus': container_bonus
-            }
-                
         except Exception as e:
             
             return None
 
     def calculate_cost_per_container_rank(self, target_month):
         try:
-            tables = [f'table{i}' for i in range(1, 12)]
-            division_costs = []
+            frame = self._monthly_frame()
+            if target_month not in frame.index.get_level_values('month'):
+                return {}
 
-            # 데이터 수집
-            for table in tables:
-                df = self.storage_utils.get_monthly_storage_data(table)
-                if not df.empty:
-                    current_data = df[df['month'] == target_month]
-                    if not current_data.empty:
-                        cost = current_data.iloc[0]['total_storage_cost']
-                        count = current_data.iloc[0]['container_count']
-                        if count > 0:
-                            cost_per_container = cost / count
-                            division_costs.append((table, cost_per_container))
-
-            # 비용 기준으로 정렬
-            division_costs.sort(key=lambda x: x[1])
-            
-            # 동점자 처리를 위한 순위 및 점수 계산
-            results = {}
-            current_rank = 1
-            prev_cost = None
-            rank_scores = {1: 25, 2: 22.5, 3: 20, 4: 17.5, 5: 15, 6: 12.5, 7: 10, 8: 7.5, 9: 5, 10: 2.5}
-            
-            for i, (division, cost) in enumerate(division_costs):
-                # 이전 비용과 같으면 같은 순위 부여
-                if prev_cost is not None and cost != prev_cost:
-                    current_rank = i + 1
-                
-                score = rank_scores.get(current_rank, 0)
-                results[division] = {
-                    'rank': current_rank,
-                    'score': score,
-                    'cost_per_container': cost
-                }
-                prev_cost = cost
-                
-            return results
+            # target_month의 디비전별 컨테이너당 비용 (컨테이너가 있는 디비전만)
+            current = frame.xs(target_month, level='month')
+            current = current[current['container_count'] > 0]
+
+            # 1등 25점부터 순위마다 2.5점씩 감소 (동점은 같은 순위, 11등 이하 0점)
+            rank, score = self.rank_score(current['cost_per_container'].to_numpy(), 25, step=2.5)
+
+            return {
+                division: {'rank': int(r), 'score': float(s), 'cost_per_container': cost}
+                for division, r, s, cost in zip(current.index, rank, score, current['cost_per_container'])
+            }
                 
         except Exception as e:
             print(f"Error calculating cost per container rank: {str(e)}")
@@ -327,109 +519,38 @@ class KPICalculator:
     def calculate_trend_score(self, table_name, target_month):
         """추세 분석 점수 계산"""
         try:
-            # 12개월 데이터 가져오기 시도
-            end_date = target_month
-            start_date = end_date - pd.DateOffset(months=11)
-            
-            df = self.storage_utils.get_monthly_storage_data(table_name)
-            df = df[(df['month'] >= start_date) & (df['month'] <= end_date)]
-            
-            if len(df) < 2:  # 최소 2개월 이상의 데이터가 필요
-                return 5     # 비교 불가능한 경우 0점
-            
-            # 가용 데이터 내에서 증가 횟수 계산
-            increases = 0
-            for i in range(1, len(df)):
-                if df.iloc[i]['total_storage_cost'] > df.iloc[i-1]['total_storage_cost']:
-                    increases += 1
-            
-            # 동일한 점수 매핑 로직 적용
-            if increases <= 3:     # 0~3회 증가
-                return 15
-            elif increases >= 11:  # 11회 이상 증가
-                return 7
-            else:
-                # 4~10회 증가에 대한 점수 매핑
-                score_mapping = {
-                    4: 14,   
-                    5: 13,   
-                    6: 12,   
-                    7: 11,   
-                    8: 10,   
-                    9: 9,   
-                    10: 8,  
-                }
-                return score_mapping.get(increases, 0)
+            history = self.calculate_trend_history(target_month, target_month)
+            if (table_name, target_month) not in history.index:
+                return 5
+            return float(history.at[(table_name, target_month), 'trend_score'])
                 
         except Exception as e:
             print(f"Error calculating trend score: {str(e)}")
             return 0
             
-    def _calculate_mom_score(self, change_percent, all_changes):
-        """MoM 변화율에 따른 점수 계산 (35점 만점)"""
-        if not all_changes:
-            return 17.5  # 비교 데이터가 없는 경우 중간 점수
-        
-        # 현재 change_percent를 all_changes에 추가
-        if change_percent not in all_changes:
-            all_changes.append(change_percent)
-        
-        # 변화율 오름차순 정렬 (-100%가 가장 앞에 오도록)
-        sorted_changes = sorted(all_changes)  # reverse=True 제거
-        total_divisions = len(sorted_changes)
-        
-        if total_divisions == 1:
-            return 35  # 단일 부서인 경우 만점
-        
-        # 동점자 처리를 위한 순위 및 점수 계산
-        rank_scores = {}  # 각 변화율에 대한 점수를 저장할 딕셔너리
-        current_rank = 1
-        prev_change = None
-        
-        for i, change in enumerate(sorted_changes):
-            # 이전 값과 다른 경우에만 순위 증가
-            if prev_change is not None and change != prev_change:
-                current_rank = i + 1
-                
-            # 점수 계산 (1등: 35점, 꼴등: 17.5점)
-            score = 35 - ((current_rank - 1) * (17.5 / (total_divisions - 1)))
-            rank_scores[change] = score
-            prev_change = change
-        
-        return rank_scores[change_percent]
-
-    def _calculate_yoy_score(self, change_percent, all_changes):
-        """YoY 변화율에 따른 점수 계산 (25점 만점)"""
-        if not all_changes:
-            return 12.5  # 비교 데이터가 없는 경우 중간 점수
-        
-        # 현재 change_percent를 all_changes에 추가
-        if change_percent not in all_changes:
-            all_changes.append(change_percent)
-        
-        # 변화율 오름차순 정렬 (-100%가 가장 앞에 오도록)
-        sorted_changes = sorted(all_changes)  # reverse=True 제거
-        total_divisions = len(sorted_changes)
-        
-        if total_divisions == 1:
-            return 25  # 단일 부서인 경우 만점
-        
-        # 동점자 처리를 위한 순위 및 점수 계산
-        rank_scores = {}  # 각 변화율에 대한 점수를 저장할 딕셔너리
-        current_rank = 1
-        prev_change = None
-        
-        for i, change in enumerate(sorted_changes):
-            # 이전 값과 다른 경우에만 순위 증가
-            if prev_change is not None and change != prev_change:
-                current_rank = i + 1
-                
-            # 점수 계산 (1등: 25점, 꼴등: 12.5점)
-            score = 25 - ((current_rank - 1) * (12.5 / (total_divisions - 1)))
-            rank_scores[change] = score
-            prev_change = change
-        
-        return rank_scores[change_percent]
+    @staticmethod
+    def rank_score(values, best, worst=None, step=None, mask=None):
+        """
+        값 오름차순 최소 순위 (동점은 같은 순위)를 선형 점수로 바꾸는 공통 커널
+        worst: 1등 best ~ 꼴등 worst를 순위에 따라 균등 배분 (대상이 하나면 best)
+        step: 순위가 하나 내려갈 때마다 step씩 감소 (0 미만은 0)
+        values가 2차원이면 열(월)마다 따로 순위를 매기고, mask 밖 (기본: NaN) 칸의 순위 / 점수는 NaN
+        반환값: (rank, score) 배열
+        """
+        values = np.asarray(values, dtype='float64')
+        matrix = values.reshape(len(values), -1)
+        mask = ~np.isnan(matrix) if mask is None else np.asarray(mask).reshape(matrix.shape)
+
+        rank = pd.DataFrame(np.where(mask, matrix, np.nan)).rank(axis=0, method='min').to_numpy()
+        if step is None:
+            total = mask.sum(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                score = best - (rank - 1) * ((best - worst) / (total - 1))
+            score = np.where(total == 1, float(best), score)
+        else:
+            score = np.maximum(best - (rank - 1) * step, 0)
+        score = np.where(mask, score, np.nan)
+        return rank.reshape(values.shape), score.reshape(values.shape)
 
     def _calculate_grade(self, total_score):
         """점수에 따른 등급 계산"""
@@ -444,6 +565,252 @@ class KPICalculator:
         else:
             return 'F'
 
+class KPIWhatIf:
+    """
+    가상의 체류일수 / 컨테이너 수 변경을 적용했을 때의 KPI를 계산하는 시뮬레이터 (DB는 변경하지 않음)
+    변경 항목 dict 키:
+      division, month: 대상 디비전 (table 이름) / 월 (해당 월 데이터가 있어야 함)
+      containers, days_earlier: containers개가 days_earlier일 먼저 반출됐다면 (비용 = 개수 * 일수 * daily_rate 감소)
+      daily_rate: 위 계산의 일별 요금 (기본: 기본 요금 규칙의 daily_rate)
+      count_change, cost_change: 컨테이너 수 / 스토리지 비용 직접 증감
+    체류일수 변경은 월별 집계 기준 근사치 (무료 기간 안으로 들어가 base_fee가 빠지는 경우는 cost_change로 지정)
+    """
+    def __init__(self, calculator, start_month, end_month):
+        self.calculator = calculator
+        self.default_daily_rate = TariffRules.DEFAULT_RULES[0][6]
+        self.start_month = start_month
+        self.end_month = end_month
+
+        frame = calculator._monthly_frame()
+        if frame.empty:
+            raise ValueError("No monthly storage data for KPI what-if")
+        self.divisions, self.first, self.matrices = calculator._month_matrices(frame, start_month, end_month)
+
+        # 변경이 없을 때의 점수 행렬 (시나리오마다 복사해서 바뀐 열 / 행만 덮어씀)
+        self.scores = calculator._score_matrices(self.matrices)
+        self.scores['trend_score'], _, _ = calculator._trend_matrix(
+            self.matrices['total_storage_cost'], self.matrices['present'])
+        self.baseline = calculator._kpi_frame(self.divisions, self.first, self.scores, start_month, end_month)
+
+    def _cell(self, division, month):
+        """(division, month)의 행렬 위치, 데이터가 없는 칸이면 ValueError"""
+        rows = np.flatnonzero(self.divisions == division)
+        month = pd.Timestamp(month)
+        col = month.year * 12 + month.month - 1 - self.first
+        if len(rows) == 0 or not 0 <= col < self.matrices['present'].shape[1] or not self.matrices['present'][rows[0], col]:
+            raise ValueError(f"No KPI data for {division} {month.strftime('%Y-%m')}")
+        return rows[0], col
+
+    def simulate(self, changes):
+        """
+        변경 목록을 적용한 조회 범위의 KPI 표 (KPI_COLUMNS + base_total_score, base_grade, score_change)
+        비용이 바뀐 월의 순위 (해당 월), MoM (다음 달), YoY (12개월 뒤) 열과 바뀐 디비전의 추세 점수만 다시 계산
+        """
+        matrices = {name: matrix.copy() for name, matrix in self.matrices.items()}
+        cost = matrices['total_storage_cost']
+        container_count = matrices['container_count']
+
+        cells = set()
+        for change in changes:
+            row, col = self._cell(change['division'], change['month'])
+            saved = (change.get('containers', 0) * change.get('days_earlier', 0) *
+                     change.get('daily_rate', self.default_daily_rate))
+            cost[row, col] = max(cost[row, col] + change.get('cost_change', 0) - saved, 0.0)
+            container_count[row, col] = max(container_count[row, col] + change.get('count_change', 0), 0)
+            cells.add((row, col))
+
+        scores = {name: matrix.copy() for name, matrix in self.scores.items()}
+        if cells:
+            rows, cols = map(np.array, zip(*cells))
+            count = container_count[rows, cols]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                matrices['cost_per_container'][rows, cols] = np.where(count > 0, cost[rows, cols] / count, 0.0)
+
+            # 월 열마다 독립인 순위 / 변화율은 영향받는 열만 다시 계산
+            affected = np.unique(np.concatenate([cols, cols + 1, cols + 12]))
+            affected = affected[affected < cost.shape[1]]
+            for name, matrix in self.calculator._score_matrices(matrices, affected).items():
+                scores[name][:, affected] = matrix
+
+            # 추세 점수는 비용이 바뀐 디비전 행만
+            rows = np.unique(rows)
+            scores['trend_score'][rows], _, _ = self.calculator._trend_matrix(cost[rows], matrices['present'][rows])
+
+        kpi = self.calculator._kpi_frame(self.divisions, self.first, scores, self.start_month, self.end_month)
+        kpi['base_total_score'] = self.baseline['total_score']
+        kpi['base_grade'] = self.baseline['grade']
+        kpi['score_change'] = kpi['total_score'] - kpi['base_total_score']
+        return kpi
+
+    def compare(self, scenarios, month=None):
+        """
+        여러 시나리오 ({이름: 변경 목록})의 month (기본: 조회 마지막 월) 총점 / 등급 비교
+        반환값: (scenario, division) 인덱스, total_score, grade, score_change 컬럼 ('baseline' 시나리오 포함)
+        """
+        month = pd.Timestamp(month or self.end_month)
+        results = {'baseline': []}
+        results.update(scenarios)
+        frames = {name: self.simulate(changes).xs(month, level='month')[['total_score', 'grade', 'score_change']]
+                  for name, changes in results.items()}
+        return pd.concat(frames, names=['scenario', 'division'])
+
+
+class KPISnapshot:
+    """
+    지난 월의 KPI 결과를 kpi_snapshot 테이블에 저장해 두고 다시 읽는 클래스
+    월별 data_version: 그 달 KPI에 쓰이는 모든 디비전의 월별 데이터 (해당 월 포함 13개월) 해시
+    (재업로드나 요금 규칙 변경으로 데이터가 바뀐 월만 다시 계산)
+    """
+    # KPICalculator.KPI_COLUMNS 컬럼 타입
+    COLUMN_TYPES = {
+        'total_score': 'REAL', 'grade': 'TEXT', 'mom_change': 'REAL', 'mom_score': 'REAL',
+        'yoy_change': 'REAL', 'yoy_score': 'REAL', 'cost_per_container_score': 'REAL', 'trend_score': 'REAL',
+        'current_cost': 'REAL', 'cost_per_container_rank': 'INTEGER', 'cost_per_container': 'REAL',
+        'container_count': 'INTEGER', 'container_bonus': 'INTEGER'
+    }
+
+    @staticmethod
+    def ensure(conn):
+        """kpi_snapshot 테이블 생성 (commit은 호출자가 수행)"""
+        columns = ',\n'.join(f"{name} {KPISnapshot.COLUMN_TYPES[name]}" for name in KPICalculator.KPI_COLUMNS)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS kpi_snapshot (
+                division TEXT NOT NULL,
+                month TEXT NOT NULL,
+                {columns},
+                computed_at TEXT NOT NULL,
+                data_version TEXT NOT NULL,
+                PRIMARY KEY (division, month)
+            )
+        """)
+
+    @staticmethod
+    def month_versions(frame, months):
+        """months 각 월의 data_version (그 달과 이전 12개월의 모든 디비전 월별 데이터 해시)"""
+        frame_months = frame.index.get_level_values('month')
+        versions = {}
+        for month in months:
+            window = frame[(frame_months >= month - pd.DateOffset(months=12)) & (frame_months <= month)]
+            hashed = pd.util.hash_pandas_object(window, index=True).to_numpy()
+            versions[month] = hashlib.sha1(hashed.tobytes()).hexdigest()
+        return versions
+
+    @staticmethod
+    def stored_versions(conn):
+        """저장된 스냅샷의 월별 data_version ('YYYY-MM': data_version)"""
+        return dict(conn.execute("SELECT DISTINCT month, data_version FROM kpi_snapshot").fetchall())
+
+    @staticmethod
+    def backfill(conn, tab_info=None, before_month=None):
+        """
+        before_month (기본: 이번 달) 이전의 (데이터가 있는) 모든 월 중 스냅샷이 없거나 data_version이 달라진 월만
+        다시 계산해 저장 (월별 데이터는 복제본이 아닌 conn에서 읽어 data_version이 저장하는 DB 기준이 되도록 함)
+        반환값: 다시 계산한 월 수 (commit은 호출자가 수행)
+        """
+        if before_month is None:
+            before_month = pd.Timestamp(datetime.now().strftime('%Y-%m-01'))
+        KPISnapshot.ensure(conn)
+        calculator = KPICalculator(tab_info=tab_info)
+        per_division, _ = StorageUtils._read_divisions_monthly(conn, calculator._tables())
+        calculator.frame = frame = StorageUtils._division_month_frame(per_division)
+        months = sorted(m for m in frame.index.get_level_values('month').unique() if m < before_month)
+        versions = KPISnapshot.month_versions(frame, months)
+
+        stored = KPISnapshot.stored_versions(conn)
+        stale = [m for m in months if stored.get(m.strftime('%Y-%m')) != versions[m]]
+
+        # 데이터가 없어진 월의 스냅샷은 삭제
+        cursor = conn.cursor()
+        removed = set(stored) - {m.strftime('%Y-%m') for m in months}
+        cursor.executemany("DELETE FROM kpi_snapshot WHERE month = ?", [(month,) for month in removed])
+        if not stale:
+            return 0
+
+        # 바뀐 월 범위를 한 번에 계산한 뒤 바뀐 월만 교체
+        kpi = calculator.calculate_kpi_range(stale[0], stale[-1]).reset_index()
+        kpi = kpi[kpi['month'].isin(stale)]
+        computed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.executemany("DELETE FROM kpi_snapshot WHERE month = ?", [(m.strftime('%Y-%m'),) for m in stale])
+        columns = ['division', 'month'] + KPICalculator.KPI_COLUMNS + ['computed_at', 'data_version']
+        rows = [
+            (record['division'], record['month'].strftime('%Y-%m'),
+             *[record[name] for name in KPICalculator.KPI_COLUMNS],
+             computed_at, versions[record['month']])
+            for record in kpi.to_dict('records')
+        ]
+        cursor.executemany(f"""
+            INSERT INTO kpi_snapshot ({', '.join(columns)})
+            VALUES ({', '.join(['?'] * len(columns))})
+        """, rows)
+        return len(stale)
+
+    @staticmethod
+    def load(conn, start_month, end_month):
+        """start_month ~ end_month 스냅샷을 calculate_kpi_range와 같은 형태로 읽음"""
+        kpi = pd.read_sql(f"""
+            SELECT division, month, {', '.join(KPICalculator.KPI_COLUMNS)}
+            FROM kpi_snapshot
+            WHERE month BETWEEN ? AND ?
+        """, conn, params=[start_month.strftime('%Y-%m'), end_month.strftime('%Y-%m')])
+        kpi['month'] = pd.to_datetime(kpi['month'], format='%Y-%m')
+        for name, column_type in KPISnapshot.COLUMN_TYPES.items():
+            if column_type == 'INTEGER':
+                kpi[name] = kpi[name].astype(int)
+        return kpi.set_index(['division', 'month']).sort_index()[KPICalculator.KPI_COLUMNS]
+
+
+class KPIWorker(QThread):
+    """
+    KPI 계산을 GUI 스레드 밖에서 실행하고 디비전별 결과를 하나씩 보내는 작업자 스레드
+    average=False: start_month 한 달의 디비전별 KPI, average=True: start_month ~ end_month 디비전별 평균 점수
+    requestInterruption()으로 취소하면 다음 단계에서 멈춤
+    """
+    division_ready = pyqtSignal(str, dict)
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    AVERAGE_COLUMNS = ['total_score', 'mom_score', 'yoy_score', 'cost_per_container_score', 'trend_score']
+
+    def __init__(self, calculator, divisions, start_month, end_month=None, average=False, parent=None):
+        super().__init__(parent)
+        self.calculator = calculator
+        self.divisions = divisions
+        self.start_month = start_month
+        self.end_month = end_month if end_month is not None else start_month
+        self.average = average
+
+    def run(self):
+        try:
+            self.progress.emit(0)
+
+            # 1. 기간 전체 KPI 계산 (50%)
+            kpi = self.calculator.get_kpi_range(self.start_month, self.end_month)
+            if self.isInterruptionRequested():
+                return
+            if self.average:
+                kpi = kpi.groupby(level='division')[self.AVERAGE_COLUMNS].mean()
+            else:
+                kpi = kpi.droplevel('month')
+            results = dict(zip(kpi.index, kpi.to_dict('records')))
+            self.progress.emit(50)
+
+            # 2. 디비전별 결과 전달 (50%)
+            for i, division in enumerate(self.divisions):
+                if self.isInterruptionRequested():
+                    return
+                if division in results:
+                    self.division_ready.emit(division, results[division])
+                self.progress.emit(50 + 50 * (i + 1) // len(self.divisions))
+            self.progress.emit(100)
+
+        except Exception as e:
+            print(f"Error in KPI worker thread: {str(e)}")
+            self.failed.emit(str(e))
+        finally:
+            # 작업자 스레드 전용 연결은 스레드와 함께 정리
+            ConnectionManager.close_current()
+
+
 class CustomTableWidgetItem(QTableWidgetItem):
     def __init__(self, value):
         super().__init__(str(value))
@@ -469,6 +836,12 @@ class KPIWindow(QDialog):
         
         # KPI 계산기 초기화 시 tab_info 전달
         self.kpi_calculator = KPICalculator(tab_info=self.tab_info)
+
+        # 백그라운드 KPI 작업자 (취소된 작업자는 끝날 때까지 참조 유지)
+        self.kpi_worker = None
+        self.avg_worker = None
+        self.kpi_rows = {}
+        self._stopped_workers = []
         
         # 날짜 설정 초기화
         self._init_date_selectors()
@@ -520,6 +893,13 @@ class KPIWindow(QDialog):
         kpi_run_btn = QPushButton("Run")
         kpi_run_btn.clicked.connect(self.update_kpi_table_only)
         month_control.addWidget(kpi_run_btn)
+
+        # KPI 계산 진행률 (계산 중에만 표시)
+        self.kpi_progress = self._create_progress_bar()
+        month_control.addWidget(self.kpi_progress)
+
+        # 계산 중에 월을 바꾸면 진행 중인 계산을 취소하고 새 월로 다시 계산
+        self.month_selector.dateChanged.connect(self._on_kpi_month_changed)
         
         # 월 선택 컨트롤을 헤더 레이아웃에 추가
         kpi_header_layout.addLayout(month_control)
@@ -576,6 +956,19 @@ class KPIWindow(QDialog):
         calculate_avg_btn = QPushButton("Calculate Average")
         calculate_avg_btn.clicked.connect(self.update_monthly_averages)
         range_control.addWidget(calculate_avg_btn)
+
+        # 평균 계산 진행률 (계산 중에만 표시)
+        self.avg_progress = self._create_progress_bar()
+        range_control.addWidget(self.avg_progress)
+
+        # 계산 중에 기간을 바꾸면 진행 중인 계산을 취소하고 새 기간으로 다시 계산
+        self.start_month_selector.dateChanged.connect(self._on_average_range_changed)
+        self.end_month_selector.dateChanged.connect(self._on_average_range_changed)
+
+        # Trend History 버튼 (선택 기간의 디비전별 추세 점수 차트)
+        trend_history_btn = QPushButton("Trend History")
+        trend_history_btn.clicked.connect(self.show_trend_history)
+        range_control.addWidget(trend_history_btn)
         
         # 기간 선택 컨트롤을 헤더 레이아웃에 추가
         avg_header_layout.addLayout(range_control)
@@ -641,149 +1034,230 @@ class KPIWindow(QDialog):
         """Division KPI 테이블만 업데이트"""
         self.update_kpi_table()
 
+    def _create_progress_bar(self):
+        progress = QProgressBar()
+        progress.setRange(0, 100)
+        progress.setMaximumWidth(150)
+        progress.setVisible(False)
+        return progress
+
+    def _kpi_divisions(self):
+        """KPI 대상 디비전 목록"""
+        if self.tab_info:
+            return list(self.tab_info.values())
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")
+            divisions = [table[0] for table in cursor.fetchall()]
+        return divisions
+
+    def _stop_worker(self, worker):
+        """진행 중인 작업자를 취소 (이후 결과는 무시, 스레드가 끝날 때까지 참조 유지)"""
+        if worker is None:
+            return
+        for signal in (worker.division_ready, worker.progress, worker.failed, worker.finished):
+            try:
+                signal.disconnect()
+            except TypeError:
+                pass
+        worker.requestInterruption()
+        self._stopped_workers = [w for w in self._stopped_workers if w.isRunning()]
+        if worker.isRunning():
+            self._stopped_workers.append(worker)
+
+    def _on_kpi_month_changed(self):
+        if self.kpi_worker is not None and self.kpi_worker.isRunning():
+            self.update_kpi_table()
+
+    def _on_average_range_changed(self):
+        if self.avg_worker is not None and self.avg_worker.isRunning():
+            self.update_monthly_averages()
+
+    def closeEvent(self, event):
+        # 창을 닫으면 진행 중인 계산을 취소하고 스레드 종료를 기다림
+        for worker in [self.kpi_worker, self.avg_worker]:
+            self._stop_worker(worker)
+        for worker in self._stopped_workers:
+            worker.wait()
+        super().closeEvent(event)
+
     def update_monthly_averages(self):
         try:
             start_date = pd.to_datetime(f"{self.start_month_selector.date().year()}-{self.start_month_selector.date().month():02d}-01")
             end_date = pd.to_datetime(f"{self.end_month_selector.date().year()}-{self.end_month_selector.date().month():02d}-01")
             
-            months = pd.date_range(start_date, end_date, freq='MS')
-            
             # 디비전 목록 가져오기
-            if self.tab_info:
-                divisions = list(self.tab_info.values())
-            else:
-                conn = connect_db()
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                divisions = [table[0] for table in cursor.fetchall()]
-                conn.close()
-            
-            # 각 디비전별 평균 계산
-            division_averages = []
-            for division in divisions:
-                scores = {
-                    'total_score': [],
-                    'mom_score': [],
-                    'yoy_score': [],
-                    'cost_per_container_score': [],
-                    'trend_score': []
-                }
-                
-                for month in months:
-                    kpi_data = self.kpi_calculator.calculate_division_kpi(division, month)
-                    if kpi_data:
-                        scores['total_score'].append(kpi_data['total_score'])
-                        scores['mom_score'].append(kpi_data['mom_score'])
-                        scores['yoy_score'].append(kpi_data['yoy_score'])
-                        scores['cost_per_container_score'].append(kpi_data['cost_per_container_score'])
-                        scores['trend_score'].append(kpi_data['trend_score'])
-                
-                if scores['total_score']:  # 점수가 있는 경우에만 평균 계산
-                    avg_scores = {
-                        'division': self.table_to_tab.get(division, division),
-                        'total_score': sum(scores['total_score']) / len(scores['total_score']),
-                        'mom_score': sum(scores['mom_score']) / len(scores['mom_score']),
-                        'yoy_score': sum(scores['yoy_score']) / len(scores['yoy_score']),
-                        'cost_score': sum(scores['cost_per_container_score']) / len(scores['cost_per_container_score']),
-                        'trend_score': sum(scores['trend_score']) / len(scores['trend_score'])
-                    }
-                    division_averages.append(avg_scores)
-            
-            # 테이블 업데이트
+            divisions = self._kpi_divisions()
+
+            # 이전 계산 취소 후 테이블 초기화 (결과가 오는 대로 한 행씩 추가)
+            self._stop_worker(self.avg_worker)
             self.monthly_avg_table.setSortingEnabled(False)  # 정렬 임시 비활성화
-            self.monthly_avg_table.setRowCount(len(division_averages))
-            
-            for row, avg_scores in enumerate(division_averages):
-                # Division 열
-                division_item = CustomTableWidgetItem(avg_scores['division'])
-                division_item.setTextAlignment(Qt.AlignCenter)
-                self.monthly_avg_table.setItem(row, 0, division_item)
-                
-                # 점수 열들
-                scores = [
-                    avg_scores['total_score'],
-                    avg_scores['mom_score'],
-                    avg_scores['yoy_score'],
-                    avg_scores['cost_score'],
-                    avg_scores['trend_score']
-                ]
-                
-                for col, score in enumerate(scores, 1):
-                    item = CustomTableWidgetItem(score)
-                    item.setData(Qt.DisplayRole, f"{score:.1f}")
-                    item.setTextAlignment(Qt.AlignCenter)
-                    self.monthly_avg_table.setItem(row, col, item)
-            
-            self.monthly_avg_table.setSortingEnabled(True)  # 정렬 다시 활성화
-            self.monthly_avg_table.resizeColumnsToContents()
+            self.monthly_avg_table.setRowCount(0)
+            self.avg_progress.setValue(0)
+            self.avg_progress.setVisible(True)
+
+            # 기간 전체의 디비전 x 월 KPI를 백그라운드에서 계산해 디비전별 평균 (지난 월은 스냅샷)
+            self.avg_worker = KPIWorker(self.kpi_calculator, divisions, start_date, end_date, average=True)
+            self.avg_worker.division_ready.connect(self._add_average_row)
+            self.avg_worker.progress.connect(self.avg_progress.setValue)
+            self.avg_worker.failed.connect(self._on_average_failed)
+            self.avg_worker.finished.connect(self._on_average_finished)
+            self.avg_worker.start()
             
         except Exception as e:
             print(f"Debug - Error in update_monthly_averages: {str(e)}")
             QMessageBox.critical(self, "Error", f"Failed to update monthly averages: {str(e)}")
 
+    def _add_average_row(self, division, avg):
+        """디비전 평균 점수 한 행 추가"""
+        row = self.monthly_avg_table.rowCount()
+        self.monthly_avg_table.insertRow(row)
+
+        # Division 열
+        division_item = CustomTableWidgetItem(self.table_to_tab.get(division, division))
+        division_item.setTextAlignment(Qt.AlignCenter)
+        self.monthly_avg_table.setItem(row, 0, division_item)
+        
+        # 점수 열들
+        scores = [
+            float(avg['total_score']),
+            float(avg['mom_score']),
+            float(avg['yoy_score']),
+            float(avg['cost_per_container_score']),
+            float(avg['trend_score'])
+        ]
+        
+        for col, score in enumerate(scores, 1):
+            item = CustomTableWidgetItem(score)
+            item.setData(Qt.DisplayRole, f"{score:.1f}")
+            item.setTextAlignment(Qt.AlignCenter)
+            self.monthly_avg_table.setItem(row, col, item)
+
+    def _on_average_finished(self):
+        self.avg_progress.setVisible(False)
+        self.monthly_avg_table.setSortingEnabled(True)  # 정렬 다시 활성화
+        self.monthly_avg_table.resizeColumnsToContents()
+
+    def _on_average_failed(self, message):
+        print(f"Debug - Error in update_monthly_averages: {message}")
+        QMessageBox.critical(self, "Error", f"Failed to update monthly averages: {message}")
+
+    def show_trend_history(self):
+        """선택한 기간의 디비전별 월별 추세 점수 차트 표시"""
+        try:
+            start_date = pd.to_datetime(f"{self.start_month_selector.date().year()}-{self.start_month_selector.date().month():02d}-01")
+            end_date = pd.to_datetime(f"{self.end_month_selector.date().year()}-{self.end_month_selector.date().month():02d}-01")
+
+            history = self.kpi_calculator.calculate_trend_history(start_date, end_date).reset_index()
+            if history.empty:
+                QMessageBox.warning(self, "Warning", "No trend data for the selected period.")
+                return
+            history['division'] = history['division'].map(lambda name: self.table_to_tab.get(name, name))
+            scores = history.pivot(index='month', columns='division', values='trend_score')
+
+            dialog = QDialog(self)
+            dialog.setWindowTitle("Trend Score History")
+            dialog.setGeometry(150, 150, 1000, 600)
+            layout = QVBoxLayout()
+
+            figure = Figure(figsize=(10, 6))
+            canvas = FigureCanvas(figure)
+            ax = figure.add_subplot(111)
+            for division in scores.columns:
+                ax.plot(scores.index, scores[division], marker='o', label=str(division))
+
+            ax.set_title(f"Trend Score(15) {start_date.strftime('%Y-%m')} ~ {end_date.strftime('%Y-%m')}", color='white')
+            ax.set_xlabel('Month', color='white')
+            ax.set_ylabel('Trend Score', color='white')
+            ax.set_ylim(4, 16)
+            ax.tick_params(colors='white')
+            ax.legend(loc='upper left', fontsize=8, ncol=2)
+            figure.patch.set_facecolor('#19232D')
+            ax.set_facecolor('#19232D')
+            figure.autofmt_xdate()
+            figure.tight_layout()
+
+            layout.addWidget(canvas)
+            dialog.setLayout(layout)
+            dialog.show()
+
+        except Exception as e:
+            print(f"Debug - Error in show_trend_history: {str(e)}")
+            QMessageBox.critical(self, "Error", f"Failed to show trend history: {str(e)}")
+
     def update_kpi_table(self):
         try:
             selected_date = self.month_selector.date()
             selected_month = pd.to_datetime(f"{selected_date.year()}-{selected_date.month():02d}-01")
         
-            if self.tab_info:
-                divisions = list(self.tab_info.values())
-            else:
-                conn = connect_db()
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                divisions = [table[0] for table in cursor.fetchall()]
-                conn.close()
-        
-            self.kpi_table.setRowCount(len(divisions))
-        
-            # 정렬 기능 임시 비활성화 (데이터 입력 중 자동 정렬 방지)
-            self.kpi_table.setSortingEnabled(False)
-            
-            for row, division in enumerate(divisions):
-                kpi_data = self.kpi_calculator.calculate_division_kpi(division, selected_month)
-                
-                if kpi_data:
+            divisions = self._kpi_divisions()
 
-                    
-                    # Division 열
-                    display_name = self.table_to_tab.get(division, division)
-                    self.kpi_table.setItem(row, 0, CustomTableWidgetItem(display_name))
-                    
-                    # 숫자 데이터 처리
-                    numeric_items = [
-                        (1, kpi_data['total_score']),
-                        (2, kpi_data['grade']),
-                        (3, kpi_data['mom_change']),
-                        (4, kpi_data['mom_score']),
-                        (5, kpi_data['yoy_change']),
-                        (6, kpi_data['yoy_score']),
-                        (7, kpi_data['cost_per_container']),
-                        (8, kpi_data['cost_per_container_rank']),
-                        (9, kpi_data['cost_per_container_score']),
-                        (10, kpi_data['trend_score']),
-                        (11, kpi_data['container_count']),  # 추가
-                        (12, kpi_data['container_bonus'])   # 추가
-                    ]
-                    
-                    for col, value in numeric_items:
-                        if isinstance(value, (int, float)):
-                            formatted_value = f"{value:,.2f}" if col not in [2, 8] else str(value)
-                            item = CustomTableWidgetItem(value)
-                            item.setData(Qt.DisplayRole, formatted_value)
-                        else:
-                            item = CustomTableWidgetItem(value)
-                        item.setTextAlignment(Qt.AlignCenter)
-                        self.kpi_table.setItem(row, col, item)
-            
-            # 정렬 기능 다시 활성화
-            self.kpi_table.setSortingEnabled(True)
-            self.kpi_table.resizeColumnsToContents()
+            # 이전 계산 취소 후 테이블 초기화 (디비전마다 자리를 잡아 두고 결과가 오는 대로 채움)
+            self._stop_worker(self.kpi_worker)
+            self.kpi_table.setSortingEnabled(False)  # 데이터 입력 중 자동 정렬 방지
+            self.kpi_table.clearContents()
+            self.kpi_table.setRowCount(len(divisions))
+            self.kpi_rows = {division: row for row, division in enumerate(divisions)}
+            self.kpi_progress.setValue(0)
+            self.kpi_progress.setVisible(True)
+
+            # 모든 디비전의 KPI를 백그라운드에서 계산
+            self.kpi_worker = KPIWorker(self.kpi_calculator, divisions, selected_month)
+            self.kpi_worker.division_ready.connect(self._fill_kpi_row)
+            self.kpi_worker.progress.connect(self.kpi_progress.setValue)
+            self.kpi_worker.failed.connect(self._on_kpi_failed)
+            self.kpi_worker.finished.connect(self._on_kpi_finished)
+            self.kpi_worker.start()
             
         except Exception as e:
             print(f"Debug - Error in update_kpi_table: {str(e)}")
             QMessageBox.critical(self, "Error", f"Failed to update KPI table: {str(e)}")
 
+    def _fill_kpi_row(self, division, kpi_data):
+        """디비전 KPI 한 행 채우기"""
+        row = self.kpi_rows[division]
+
+        # Division 열
+        display_name = self.table_to_tab.get(division, division)
+        self.kpi_table.setItem(row, 0, CustomTableWidgetItem(display_name))
+        
+        # 숫자 데이터 처리
+        numeric_items = [
+            (1, kpi_data['total_score']),
+            (2, kpi_data['grade']),
+            (3, kpi_data['mom_change']),
+            (4, kpi_data['mom_score']),
+            (5, kpi_data['yoy_change']),
+            (6, kpi_data['yoy_score']),
+            (7, kpi_data['cost_per_container']),
+            (8, kpi_data['cost_per_container_rank']),
+            (9, kpi_data['cost_per_container_score']),
+            (10, kpi_data['trend_score']),
+            (11, kpi_data['container_count']),  # 추가
+            (12, kpi_data['container_bonus'])   # 추가
+        ]
+        
+        for col, value in numeric_items:
+            if isinstance(value, (int, float)):
+                formatted_value = f"{value:,.2f}" if col not in [2, 8] else str(value)
+                item = CustomTableWidgetItem(value)
+                item.setData(Qt.DisplayRole, formatted_value)
+            else:
+                item = CustomTableWidgetItem(value)
+            item.setTextAlignment(Qt.AlignCenter)
+            self.kpi_table.setItem(row, col, item)
+
+    def _on_kpi_finished(self):
+        self.kpi_progress.setVisible(False)
+
+        # 정렬 기능 다시 활성화
+        self.kpi_table.setSortingEnabled(True)
+        self.kpi_table.resizeColumnsToContents()
+
+    def _on_kpi_failed(self, message):
+        print(f"Debug - Error in update_kpi_table: {message}")
+        QMessageBox.critical(self, "Error", f"Failed to update KPI table: {message}")
+
     def _calculate_change_score(self, change_percent):
         if change_percent <= 0:  # 감소
             return 50
@@ -923,10 +1397,54 @@ class KPIPasswordDialog(QDialog):
 
 
 
+class StorageCostWorker(QThread):
+    """
+    2024년 이후 비용이 발생한 컨테이너의 예상 스토리지 비용을 GUI 스레드 밖에서 반출월 순서로 읽어 한 달씩 보내는 작업자 스레드
+    requestInterruption()으로 취소하면 다음 월에서 멈추고 조회 연결을 닫음
+    """
+    month_ready = pyqtSignal(str, object)
+    no_data = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, table_name, columns, source_columns, parent=None):
+        super().__init__(parent)
+        self.table_name = table_name
+        self.columns = columns
+        self.source_columns = source_columns
+
+    def run(self):
+        try:
+            monthly_data = StorageUtils.iter_individual_storage_data(
+                self.table_name,
+                columns=self.source_columns,
+                min_year=2024,
+                charged_only=True
+            )
+            month_count = 0
+            try:
+                for month, df in monthly_data:
+                    if self.isInterruptionRequested():
+                        return
+                    self.month_ready.emit(str(month), df[self.columns])
+                    month_count += 1
+            finally:
+                # 취소된 경우에도 제너레이터의 with db_connection 블록을 바로 종료
+                monthly_data.close()
+            if month_count == 0:
+                self.no_data.emit()
+
+        except Exception as e:
+            print(f"Error in storage cost worker thread: {str(e)}")
+            self.failed.emit(str(e))
+        finally:
+            # 작업자 스레드 전용 연결은 스레드와 함께 정리
+            ConnectionManager.close_current()
+
+
 # 월별 데이터 표시용 창 클래스
 class MonthlyDataWindow(QDialog):
 
-    def __init__(self, monthly_data, parent=None):
+    def __init__(self, monthly_data=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("월별 예상 스토리지 비용")
         self.setGeometry(100, 100, 1200, 800)
@@ -934,347 +1452,1546 @@ class MonthlyDataWindow(QDialog):
         # 탭 위젯 생성
         self.tabs = QTabWidget(self)
 
-        # 각 월별 데이터 추가
-        for month, df in monthly_data.items():
-            tab = QWidget()
-            layout = QVBoxLayout()
-            table_widget = QTableWidget()
-            
-            # 테이블 설정 추가
-            table_widget.setSelectionMode(QAbstractItemView.ContiguousSelection)  # 연속 선택 가능
-            table_widget.setContextMenuPolicy(Qt.ActionsContextMenu)  # 컨텍스트 메뉴 활성화
-            
-            # 복사 액션 추가
-            copy_action = QAction("Copy", table_widget)
-            copy_action.setShortcut(QKeySequence.Copy)
-            copy_action.triggered.connect(lambda: self.copy_selection(table_widget))
-            table_widget.addAction(copy_action)
-            
-            layout.addWidget(table_widget)
-            tab.setLayout(layout)
-
-            # 테이블에 월별 데이터 표시
-            self.display_data(df, table_widget)
-            
-            self.tabs.addTab(tab, month)
+        # 각 월별 데이터 추가 (스트리밍 조회 시에는 add_month로 한 달씩 추가)
+        for month, df in (monthly_data or {}).items():
+            self.add_month(month, df)
 
         # 레이아웃 설정
         layout = QVBoxLayout(self)
         layout.addWidget(self.tabs)
         self.setLayout(layout)
 
+    def add_month(self, month, df):
+        """월별 탭 하나를 추가"""
+        tab = QWidget()
+        layout = QVBoxLayout()
+        table_widget = QTableWidget()
+        
+        # 테이블 설정 추가
+        table_widget.setSelectionMode(QAbstractItemView.ContiguousSelection)  # 연속 선택 가능
+        table_widget.setContextMenuPolicy(Qt.ActionsContextMenu)  # 컨텍스트 메뉴 활성화
+        
+        # 복사 액션 추가
+        copy_action = QAction("Copy", table_widget)
+        copy_action.setShortcut(QKeySequence.Copy)
+        copy_action.triggered.connect(lambda: self.copy_selection(table_widget))
+        table_widget.addAction(copy_action)
+        
+        layout.addWidget(table_widget)
+        tab.setLayout(layout)
+
+        # 테이블에 월별 데이터 표시
+        self.display_data(df, table_widget)
+        
+        self.tabs.addTab(tab, month)
+
     def display_data(self, df, table_widget):
         table_widget.setColumnCount(len(df.columns))
         table_widget.setRowCount(len(df.index))
         table_widget.setHorizontalHeaderLabels(df.columns)
 
-        for i in range(len(df.index)):
-            for j in range(len(df.columns)):
-                item = QTableWidgetItem(str(df.iloc[i, j]))
-                item.setFont(QFont("Arial", 10))
-                table_widget.setItem(i, j, item)
+        for i in range(len(df.index)):
+            for j in range(len(df.columns)):
+                item = QTableWidgetItem(str(df.iloc[i, j]))
+                item.setFont(QFont("Arial", 10))
+                table_widget.setItem(i, j, item)
+
+        # 테이블 크기 조정
+        table_widget.resizeColumnsToContents()
+        table_widget.resizeRowsToContents()
+
+    def copy_selection(self, table_widget):
+        selected = table_widget.selectedRanges()
+        if not selected:
+            return
+        
+        text = []
+        for r in selected:
+            for row in range(r.topRow(), r.bottomRow() + 1):
+                row_data = []
+                for col in range(r.leftColumn(), r.rightColumn() + 1):
+                    item = table_widget.item(row, col)
+                    if item is not None:
+                        row_data.append(item.text())
+                    else:
+                        row_data.append('')
+                text.append('\t'.join(row_data))
+        
+        QApplication.clipboard().setText('\n'.join(text))
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            current_tab = self.tabs.currentWidget()
+            if current_tab:
+                table_widget = current_tab.findChild(QTableWidget)
+                if table_widget:
+                    self.copy_selection(table_widget)
+        else:
+            super().keyPressEvent(event)
+
+class DateNormalizer:
+    """
+    업로드 시 날짜 컬럼을 한 번만 파싱해 ISO 날짜(<접두어>_date)와 정수 일련번호(<접두어>_day) 컬럼으로 저장하는 클래스
+    """
+    # 접두어: (원본 컬럼, 원본 값을 ISO 날짜 문자열로 바꾸는 SQL 표현식)
+    SOURCES = {
+        'unload': ('unloadingterminal', """
+            CASE
+                WHEN [unloadingterminal] LIKE '%/%'
+                THEN substr([unloadingterminal], 7, 4) || '-' ||
+                     substr([unloadingterminal], 4, 2) || '-' ||
+                     substr([unloadingterminal], 1, 2)
+                ELSE [unloadingterminal]
+            END"""),
+        'appt': ('terminalappointment', "[terminalappointment]"),
+        'etaport': ('etaport', "[etaport]"),
+        'initialeta': ('initialeta', "[initialeta]"),
+        'shippingdate': ('shippingdate', "[shippingdate]"),
+        'eta': ('eta', "[eta]"),
+    }
+    # 조회 조건에 자주 쓰이는 일련번호 컬럼에만 인덱스 생성
+    INDEXED = ('appt', 'etaport')
+    # 1970-01-01의 일련번호 (CAST(julianday('1970-01-01') AS INTEGER))
+    EPOCH_DAY = 2440587
+
+    @staticmethod
+    def month_day_range(month):
+        """'YYYY-MM' 월의 첫날 / 마지막날 일련번호"""
+        first = pd.Timestamp(f"{month}-01")
+        last = first + pd.offsets.MonthEnd(0)
+        epoch = pd.Timestamp('1970-01-01')
+        return (first - epoch).days + DateNormalizer.EPOCH_DAY, (last - epoch).days + DateNormalizer.EPOCH_DAY
+
+    @staticmethod
+    def columns():
+        """정규화 컬럼 이름 목록"""
+        return [f"{prefix}_{kind}" for prefix in DateNormalizer.SOURCES for kind in ('date', 'day')]
+
+    @staticmethod
+    def drop_columns(df):
+        """화면 표시 / 엑셀 추출용으로 정규화 컬럼을 제거한 DataFrame 반환"""
+        return df.drop(columns=[col for col in DateNormalizer.columns() if col in df.columns])
+
+    @staticmethod
+    def normalize(conn, table_name, after_rowid=None):
+        """
+        테이블의 정규화 날짜 컬럼을 추가하고 값을 계산하는 메서드 (commit은 호출자가 수행)
+        after_rowid를 지정하면 그 뒤에 추가된 행만 계산 (컬럼을 새로 추가한 경우는 모든 행 계산)
+        반환값: 컬럼을 새로 추가했는지 여부
+        """
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        existing = [info[1] for info in cursor.fetchall()]
+        # containers로 마이그레이션된 디비전은 뷰 대신 containers의 해당 디비전 행을 갱신
+        target, where, params = ContainerStore.target(conn, table_name)
+
+        assignments = []
+        added = False
+        for prefix, (source, expr) in DateNormalizer.SOURCES.items():
+            if source not in existing:
+                continue
+            if target != table_name:
+                if f"{prefix}_day" in existing:
+                    assignments.append(f"[{prefix}_date] = date({expr})")
+                    assignments.append(f"[{prefix}_day] = CAST(julianday(date({expr})) AS INTEGER)")
+                continue
+            if f"{prefix}_date" not in existing:
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN [{prefix}_date] TEXT")
+                added = True
+            if f"{prefix}_day" not in existing:
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN [{prefix}_day] INTEGER")
+                added = True
+            assignments.append(f"[{prefix}_date] = date({expr})")
+            assignments.append(f"[{prefix}_day] = CAST(julianday(date({expr})) AS INTEGER)")
+            if prefix in DateNormalizer.INDEXED:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS [idx_{table_name}_{prefix}_day] ON {table_name} ([{prefix}_day])"
+                )
+
+        if assignments:
+            params = list(params)
+            if after_rowid is not None and not added:
+                where += " AND rowid > ?"
+                params.append(after_rowid)
+            cursor.execute(f"UPDATE {target} SET {', '.join(assignments)} WHERE {where}", params)
+        return added
+
+    @staticmethod
+    def ensure(conn, tables):
+        """정규화 컬럼이 아직 없는 테이블만 정규화하는 메서드 (기존 DB 호환용)"""
+        cursor = conn.cursor()
+        for table_name in tables:
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            existing = {info[1] for info in cursor.fetchall()}
+            if not existing:
+                continue
+            missing = [
+                prefix for prefix, (source, _) in DateNormalizer.SOURCES.items()
+                if source in existing and f"{prefix}_day" not in existing
+            ]
+            if missing:
+                DateNormalizer.normalize(conn, table_name)
+
+    @staticmethod
+    def sql(conn, table_name, existing=None):
+        """
+        접두어별 날짜 / 일련번호 SQL 표현식을 반환 (dates, days)
+        정규화 컬럼이 있으면 저장된 컬럼을, 없으면 원본 컬럼을 파싱하는 표현식을 사용
+        (existing: 이미 조회한 테이블 컬럼 목록이 있으면 전달)
+        """
+        if existing is None:
+            cursor = conn.cursor()
+            cursor.execute(f"PRAGMA table_info({table_name})")
+            existing = {info[1] for info in cursor.fetchall()}
+
+        dates, days = {}, {}
+        for prefix, (_, expr) in DateNormalizer.SOURCES.items():
+            if f"{prefix}_day" in existing:
+                dates[prefix] = f"[{prefix}_date]"
+                days[prefix] = f"[{prefix}_day]"
+            else:
+                dates[prefix] = f"date({expr})"
+                days[prefix] = f"CAST(julianday(date({expr})) AS INTEGER)"
+        return dates, days
+
+
+class ContainerStore:
+    """
+    선사별 테이블 (table1~table11)을 table_name 컬럼이 있는 containers 테이블 하나로 합치는 마이그레이션과
+    여러 디비전을 한 번에 조회하는 메서드 (기존 테이블 이름은 같은 컬럼 순서의 뷰로 유지)
+    마이그레이션 전 DB에서는 기존 테이블을 하나씩 조회
+    """
+    TABLE = 'containers'
+    # 원래 테이블 이름을 저장하는 컬럼 (데이터에 이미 division 컬럼이 있어 monthly_storage_agg와 같은 이름 사용)
+    KEY = 'table_name'
+    # 여러 디비전 조회 / 디비전별 날짜 조건에 쓰는 인덱스 (컬럼이 있을 때만 생성)
+    INDEXES = {
+        'table_name': (KEY,),
+        'appt_day': ('appt_day', KEY),
+        'etaport_day': ('etaport_day', KEY),
+        'unload_day': ('unload_day', KEY),
+    }
+
+    @staticmethod
+    def migrated(conn):
+        cursor = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (ContainerStore.TABLE,))
+        return cursor.fetchone() is not None
+
+    @staticmethod
+    def division_tables(conn):
+        """선사별 테이블 / 뷰 이름 목록 (table%)"""
+        cursor = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name LIKE 'table%' ORDER BY name")
+        return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def target(conn, table_name):
+        """
+        table_name 행을 수정 / 삭제할 실제 테이블과 조건 (쓰기용)
+        반환값: (테이블, WHERE 조건, 파라미터) - 마이그레이션된 디비전이면 (containers, table_name = ?, (table_name,))
+        """
+        cursor = conn.execute("SELECT type FROM sqlite_master WHERE name=?", (table_name,))
+        row = cursor.fetchone()
+        if row and row[0] == 'view' and ContainerStore.migrated(conn):
+            return ContainerStore.TABLE, f"[{ContainerStore.KEY}] = ?", (table_name,)
+        return table_name, "1", ()
+
+    @staticmethod
+    def sources(conn, tables):
+        """
+        여러 디비전을 조회할 (테이블, WHERE 조건, 파라미터) 목록
+        마이그레이션된 DB는 containers 한 번 (table_name IN ...), 아니면 테이블마다 하나
+        """
+        tables = list(tables)
+        if ContainerStore.migrated(conn):
+            placeholders = ','.join(['?'] * len(tables))
+            return [(ContainerStore.TABLE, f"[{ContainerStore.KEY}] IN ({placeholders})", tables)]
+        return [(table, "1", []) for table in tables]
+
+    @staticmethod
+    def distinct(conn, column, tables, where="", params=()):
+        """
+        여러 디비전의 column 고유값 목록 (NULL / 빈 값 제외)
+        where / params: 디비전마다 같은 추가 조건 (예: "origin = ?")
+        """
+        condition = f" AND {where}" if where else ""
+        queries, query_params = [], []
+        for source, source_where, source_params in ContainerStore.sources(conn, tables):
+            queries.append(f"SELECT DISTINCT [{column}] FROM [{source}] WHERE {source_where}{condition}")
+            query_params += list(source_params) + list(params)
+        cursor = conn.execute(" UNION ".join(queries), query_params)
+        return [row[0] for row in cursor.fetchall() if row[0]]
+
+    @staticmethod
+    def read_divisions(conn, tables, where="", params=()):
+        """
+        여러 디비전의 행을 {테이블: DataFrame}으로 조회 (각 DataFrame 컬럼은 해당 테이블 / 뷰의 컬럼 순서)
+        마이그레이션된 DB는 containers 한 번 조회로 읽고 디비전별로 나눔
+        """
+        condition = f" AND {where}" if where else ""
+        if not ContainerStore.migrated(conn):
+            return {
+                table: pd.read_sql(f"SELECT * FROM [{table}] WHERE 1{condition}", conn, params=list(params))
+                for table in tables
+            }
+
+        placeholders = ','.join(['?'] * len(tables))
+        df = pd.read_sql(f"""
+            SELECT * FROM {ContainerStore.TABLE}
+            WHERE [{ContainerStore.KEY}] IN ({placeholders}){condition}
+            ORDER BY rowid
+        """, conn, params=list(tables) + list(params))
+        groups = dict(tuple(df.groupby(ContainerStore.KEY, sort=False)))
+        result = {}
+        for table in tables:
+            columns = [info[1] for info in conn.execute(f"PRAGMA table_info([{table}])").fetchall()]
+            group = groups.get(table, df.iloc[0:0])
+            result[table] = group[columns].reset_index(drop=True)
+        return result
+
+    @staticmethod
+    def _column_type(types):
+        """같은 컬럼의 테이블별 선언 타입을 하나로 (모두 같으면 그 타입, 정수 / 실수 혼합은 REAL, 그 밖은 TEXT)"""
+        types = {t.upper() for t in types if t}
+        if len(types) == 1:
+            return types.pop()
+        if types and types <= {'INTEGER', 'REAL'}:
+            return 'REAL'
+        return 'TEXT'
+
+    @staticmethod
+    def migrate(conn, tables):
+        """
+        선사별 테이블을 containers 테이블로 옮기고 같은 이름 / 컬럼 순서의 뷰를 만드는 메서드
+        하나의 트랜잭션으로 실행하며 실패하면 롤백 (commit은 호출자가 수행)
+        반환값: 옮긴 테이블 목록 (이미 마이그레이션된 DB면 빈 목록)
+        """
+        if ContainerStore.migrated(conn):
+            return []
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT name FROM sqlite_master
+            WHERE type='table' AND name IN ({','.join(['?'] * len(tables))})
+        """, list(tables))
+        existing = {row[0] for row in cursor.fetchall()}
+        tables = [t for t in tables if t in existing]
+        if not tables:
+            return []
+
+        # 정규화 날짜 컬럼을 먼저 만들어 두고 합침
+        DateNormalizer.ensure(conn, tables)
+
+        table_columns = {}
+        column_types = OrderedDict()
+        for table in tables:
+            cursor.execute(f"PRAGMA table_info([{table}])")
+            info = cursor.fetchall()
+            table_columns[table] = [column[1] for column in info]
+            for column in info:
+                column_types.setdefault(column[1], []).append(column[2])
+
+        if not conn.in_transaction:
+            cursor.execute("BEGIN")
+        try:
+            definitions = ', '.join(
+                f"[{column}] {ContainerStore._column_type(types)}" for column, types in column_types.items())
+            cursor.execute(f"CREATE TABLE {ContainerStore.TABLE} ([{ContainerStore.KEY}] TEXT NOT NULL, {definitions})")
+
+            for table in tables:
+                column_sql = ', '.join(f'[{column}]' for column in table_columns[table])
+                cursor.execute(f"""
+                    INSERT INTO {ContainerStore.TABLE} ([{ContainerStore.KEY}], {column_sql})
+                    SELECT ?, {column_sql} FROM [{table}] ORDER BY rowid
+                """, (table,))
+                cursor.execute(f"DROP TABLE [{table}]")
+                # 뷰에 ORDER BY를 두면 COUNT 등 집계 쿼리에서 뷰가 평탄화되지 않아 커버링 인덱스를 못 씀
+                # (table_name으로 시작하는 인덱스는 table_name 하나뿐이라 조건 없는 조회는 기존 테이블과 같은 rowid 순서)
+                cursor.execute(f"""
+                    CREATE VIEW [{table}] AS
+                    SELECT {column_sql} FROM {ContainerStore.TABLE} WHERE [{ContainerStore.KEY}] = '{table}'
+                """)
+
+            for name, columns in ContainerStore.INDEXES.items():
+                if all(column == ContainerStore.KEY or column in column_types for column in columns):
+                    cursor.execute(f"""
+                        CREATE INDEX IF NOT EXISTS [idx_{ContainerStore.TABLE}_{name}]
+                        ON {ContainerStore.TABLE} ({', '.join(f'[{column}]' for column in columns)})
+                    """)
+            # 조회 조건용 인덱스 (모든 디비전 뷰가 containers 인덱스를 같이 사용)
+            QueryIndexes.ensure(conn, tables[:1])
+        except Exception:
+            conn.rollback()
+            raise
+        return tables
+
+
+class QueryIndexes:
+    """
+    화면 조회 쿼리가 자주 쓰는 조건 (modality / destinationport / 날짜, f.dest, origin / shippingline)에 맞춘
+    커버링 / 표현식 인덱스를 만들고, 대표 쿼리의 EXPLAIN QUERY PLAN으로 전체 스캔을 찾는 클래스
+    (to_sql replace로 테이블을 새로 만들면 인덱스가 사라지므로 테이블을 새로 만들거나 컬럼을 추가한 업로드 후 ensure 호출)
+    """
+    # 이름: (컬럼 / 표현식, 디비전별 여부)
+    # 표현식은 쿼리와 같은 모양이어야 사용됨 (예: date([etaport]) > ?)
+    # 디비전별 인덱스는 containers에서 table_name을 뒤에 붙이고 (커버링 유지), 여러 디비전 조회용은 그대로 생성
+    INDEXES = {
+        # 도넛 차트 / 목록: modality + destinationport + 입항일 / 반출일 (COUNT는 인덱스만 읽음)
+        'modality_port_etaport': (('[modality]', '[destinationport]', 'date([etaport])', '[etaport]'), True),
+        'modality_port_appt': (('[modality]', '[destinationport]', 'date([terminalappointment])', '[terminalappointment]'), True),
+        # CEDROS 긴급 / 입고 예정
+        'fdest_eta': (('[f.dest]', 'date([eta])', '[eta]', '[urgentcargo]', '[etaport]'), True),
+        # 입항일 기간 조회 (Origin 분석)
+        'etaport_date': (('date([etaport])',), True),
+        # 출발지 / 선사 / 목적항 목록과 필터 (여러 디비전 조회)
+        'origin_shippingline': (('[origin]', '[shippingline]'), False),
+        'destinationport': (('[destinationport]',), False),
+    }
+
+    # 앱의 대표 쿼리 (이름, SQL, 파라미터, 전체 스캔이 정상인지) - {table}은 디비전 테이블 / 뷰 이름
+    DIVISION_QUERIES = [
+        ('cedros_urgent', """
+            SELECT COUNT(*) FROM {table}
+            WHERE ([urgentcargo] LIKE '%y%' OR [urgentcargo] LIKE '%Y%')
+            AND [f.dest] = 'CEDROS'
+            AND ((date([eta]) >= ? AND [eta] IS NOT NULL) OR ([eta] IS NULL AND date([etaport]) >= ?))
+        """, ('2024-01-01', '2024-01-01'), False),
+        ('cedros_eta_day', """
+            SELECT COUNT(*) FROM {table}
+            WHERE (date([eta]) = ?) AND [eta] IS NOT NULL AND [f.dest] = 'CEDROS'
+        """, ('2024-01-01',), False),
+        ('modality_port', """
+            SELECT COUNT(*) FROM {table} WHERE [modality] = ? AND [destinationport] = ?
+        """, ('RAIL', 'LZO'), False),
+        ('modality_pre_arrival', """
+            SELECT COUNT(*) FROM {table}
+            WHERE [modality] = ? AND [destinationport] = ?
+            AND [etaport] IS NOT NULL AND [etaport] != '' AND date([etaport]) > ?
+        """, ('RAIL', 'LZO', '2024-01-01'), False),
+        ('modality_appt', """
+            SELECT COUNT(*) FROM {table}
+            WHERE [modality] = ? AND [destinationport] = ?
+            AND [terminalappointment] IS NOT NULL AND [terminalappointment] != '' AND date([terminalappointment]) > ?
+        """, ('RAIL', 'LZO', '2024-01-01'), False),
+        ('origin_etaport_range', """
+            SELECT [origin], [etaport], [container], [shippingline] FROM {table}
+            WHERE date([etaport]) BETWEEN ? AND ? AND [origin] IN (?) AND [shippingline] IN (?)
+            ORDER BY [etaport]
+        """, ('2024-01-01', '2024-03-31', 'COREA', 'MSC'), False),
+        # 스토리지 엔진 입력: 모든 행을 읽으므로 전체 스캔이 정상
+        ('storage_source', """
+            SELECT * FROM {table} WHERE container IS NOT NULL
+        """, (), True),
+    ]
+
+    @staticmethod
+    def _columns(expressions):
+        """인덱스 표현식이 참조하는 컬럼 이름 목록"""
+        return {name for expression in expressions for name in re.findall(r"\[([^\]]+)\]", expression)}
+
+    @staticmethod
+    def ensure(conn, tables):
+        """
+        디비전 테이블 (또는 마이그레이션된 containers)에 인덱스를 만들고 통계를 갱신하는 메서드
+        이미 있는 인덱스는 건너뜀, 필요한 컬럼이 없는 테이블은 해당 인덱스 생략 (commit은 호출자가 수행)
+        반환값: 새로 만든 인덱스 이름 목록
+        """
+        cursor = conn.cursor()
+        created = []
+        done = set()
+        for table_name in tables:
+            target, _, _ = ContainerStore.target(conn, table_name)
+            if target in done:
+                continue
+            done.add(target)
+            cursor.execute(f"PRAGMA table_info([{target}])")
+            existing = {info[1] for info in cursor.fetchall()}
+            if not existing:
+                continue
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=?", (target,))
+            indexes = {row[0] for row in cursor.fetchall()}
+
+            for name, (expressions, per_division) in QueryIndexes.INDEXES.items():
+                if not QueryIndexes._columns(expressions) <= existing:
+                    continue
+                if target == ContainerStore.TABLE and per_division:
+                    expressions = expressions + (f"[{ContainerStore.KEY}]",)
+                index_name = f"idx_{target}_{name}"
+                if index_name in indexes:
+                    continue
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS [{index_name}] ON [{target}] ({', '.join(expressions)})")
+                created.append(index_name)
+
+        # 새 인덱스 / 바뀐 데이터의 통계만 갱신 (필요할 때만 ANALYZE 실행)
+        cursor.execute("PRAGMA optimize")
+        return created
+
+    @staticmethod
+    def _plan(conn, sql, params):
+        """EXPLAIN QUERY PLAN 결과의 detail 목록"""
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", list(params)).fetchall()]
+
+    @staticmethod
+    def _full_scans(details):
+        """인덱스 없이 테이블 전체를 읽는 단계 (SCAN ... 중 USING INDEX가 없는 것)"""
+        return [detail for detail in details if detail.startswith('SCAN') and 'INDEX' not in detail]
+
+    @staticmethod
+    def explain(conn, tables):
+        """
+        대표 쿼리의 실행 계획을 조사하는 메서드
+        반환값: DataFrame (query, table, plan, full_scan, expected) - full_scan은 전체 스캔 여부
+        """
+        tables = list(tables)
+        records = []
+        for table in tables:
+            for name, sql, params, expected in QueryIndexes.DIVISION_QUERIES:
+                try:
+                    details = QueryIndexes._plan(conn, sql.format(table=f"[{table}]"), params)
+                except sqlite3.OperationalError as e:
+                    # 컬럼이 없는 테이블 등
+                    details = [f"ERROR: {e}"]
+                records.append((name, table, ' | '.join(details), bool(QueryIndexes._full_scans(details)), expected))
+
+        # 여러 디비전 조회 (ContainerStore와 같은 쿼리 모양)
+        cross_queries = [
+            ('distinct_origin', 'origin', "", ()),
+            ('shippinglines_for_origin', 'shippingline', "origin = ?", ('COREA',)),
+            ('distinct_destinationport', 'destinationport', "", ()),
+        ]
+        for source, source_where, source_params in ContainerStore.sources(conn, tables):
+            for name, column, where, params in cross_queries:
+                condition = f" AND {where}" if where else ""
+                sql = f"SELECT DISTINCT [{column}] FROM [{source}] WHERE {source_where}{condition}"
+                try:
+                    details = QueryIndexes._plan(conn, sql, list(source_params) + list(params))
+                except sqlite3.OperationalError as e:
+                    details = [f"ERROR: {e}"]
+                records.append((name, source, ' | '.join(details), bool(QueryIndexes._full_scans(details)), False))
+
+        return pd.DataFrame(records, columns=['query', 'table', 'plan', 'full_scan', 'expected'])
+
+
+class TariffRules:
+    """
+    tariff_rules 테이블의 항구 / 터미널 / 적용기간별 요금 규칙을 읽어
+    컨테이너별 적용 규칙 번호 배열로 컴파일하는 클래스
+    (무료 기간을 넘기면 비용 = base_fee + 초과일수 * daily_rate, NULL 조건은 전체 적용)
+    """
+    COLUMNS = ['destinationport', 'terminal', 'effective_from', 'effective_to', 'free_days', 'base_fee', 'daily_rate']
+
+    # tariff_rules 테이블 생성 시 넣는 기본 규칙 (테이블이 없을 때도 이 규칙으로 계산)
+    DEFAULT_RULES = [
+        (None, None, None, None, 7, 4356.42, 2194.43),
+        ('LZO', None, None, None, 10, 0.0, 2027.0),
+        ('LAZARO', None, None, None, 10, 0.0, 2027.0),
+        ('Lazaro Cardenas', None, None, None, 10, 0.0, 2027.0),
+        ('LAZARO CARDENAS', None, None, None, 10, 0.0, 2027.0),
+    ]
+
+    def __init__(self, rules):
+        rules = rules[self.COLUMNS].reset_index(drop=True)
+
+        # 구체적인 규칙부터 검사 (항구+터미널 > 항구 > 터미널 > 기본), 같은 수준이면 최근 시작일 우선
+        rules['_specificity'] = rules['destinationport'].notna() * 2 + rules['terminal'].notna()
+        rules['_from'] = pd.to_datetime(rules['effective_from'], errors='coerce')
+        rules['_to'] = pd.to_datetime(rules['effective_to'], errors='coerce')
+        rules = rules.sort_values(['_specificity', '_from'], ascending=False, na_position='last', kind='stable')
+        self.rules = rules.reset_index(drop=True)
+
+        # 적용기간을 julianday 정수 일련번호로 변환 (DateNormalizer의 <접두어>_day와 같은 기준)
+        epoch = pd.Timestamp('1970-01-01')
+        self.start_day = ((self.rules['_from'] - epoch).dt.days + DateNormalizer.EPOCH_DAY).to_numpy(dtype='float64')
+        self.end_day = ((self.rules['_to'] - epoch).dt.days + DateNormalizer.EPOCH_DAY).to_numpy(dtype='float64')
+
+        # 규칙 번호로 조회하는 요금 배열, 마지막 칸은 일치하는 규칙이 없는 경우 (비용 0)
+        self.free_days = np.append(self.rules['free_days'].to_numpy(dtype='float64'), 0.0)
+        self.base_fee = np.append(self.rules['base_fee'].to_numpy(dtype='float64'), 0.0)
+        self.daily_rate = np.append(self.rules['daily_rate'].to_numpy(dtype='float64'), 0.0)
+
+    @classmethod
+    def default(cls):
+        return cls(pd.DataFrame(cls.DEFAULT_RULES, columns=cls.COLUMNS))
+
+    @classmethod
+    def load(cls, conn):
+        """tariff_rules 테이블에서 규칙을 읽음 (테이블이 없거나 비어 있으면 기본 규칙)"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tariff_rules'")
+        if cursor.fetchone():
+            rules = pd.read_sql(f"SELECT {', '.join(cls.COLUMNS)} FROM tariff_rules", conn)
+            if not rules.empty:
+                return cls(rules)
+        return cls.default()
+
+    @staticmethod
+    def ensure(conn):
+        """tariff_rules 테이블을 만들고 비어 있으면 기본 규칙을 넣는 메서드 (commit은 호출자가 수행)"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tariff_rules (
+                rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                destinationport TEXT,
+                terminal TEXT,
+                effective_from TEXT,
+                effective_to TEXT,
+                free_days INTEGER NOT NULL,
+                base_fee REAL NOT NULL,
+                daily_rate REAL NOT NULL
+            )
+        """)
+        cursor.execute("SELECT COUNT(*) FROM tariff_rules")
+        if cursor.fetchone()[0] == 0:
+            TariffRules._insert(cursor, TariffRules.DEFAULT_RULES)
+
+    @staticmethod
+    def _insert(cursor, rules):
+        cursor.executemany(f"""
+            INSERT INTO tariff_rules ({', '.join(TariffRules.COLUMNS)})
+            VALUES ({', '.join(['?'] * len(TariffRules.COLUMNS))})
+        """, rules)
+
+    @staticmethod
+    def read_file(path):
+        """
+        CSV / Excel / JSON 파일의 요금 규칙을 replace에 넘길 튜플 목록으로 읽는 메서드
+        필수 컬럼: TariffRules.COLUMNS (빈 값: 항구 / 터미널 / 적용기간은 전체 적용, base_fee는 0)
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            rules = pd.read_csv(path, dtype=str, keep_default_na=False)
+        elif extension in ('.xlsx', '.xls'):
+            rules = pd.read_excel(path, dtype=str, keep_default_na=False)
+        elif extension == '.json':
+            rules = pd.read_json(path, dtype=False).astype(str)
+        else:
+            raise ValueError(f"Unsupported tariff file type: {extension}")
+
+        rules.columns = [str(column).strip().lower() for column in rules.columns]
+        missing = [column for column in TariffRules.COLUMNS if column not in rules.columns]
+        if missing:
+            raise ValueError(f"Missing tariff columns: {', '.join(missing)}")
+
+        def text(value):
+            value = str(value).strip()
+            return value if value and value.lower() not in ('nan', 'none', 'null') else None
+
+        result = []
+        for number, record in enumerate(rules[TariffRules.COLUMNS].to_dict('records'), start=2):
+            values = {column: text(value) for column, value in record.items()}
+            try:
+                for column in ('effective_from', 'effective_to'):
+                    if values[column] is not None:
+                        values[column] = pd.to_datetime(values[column]).strftime('%Y-%m-%d')
+                free_days = int(float(values['free_days']))
+                base_fee = float(values['base_fee']) if values['base_fee'] is not None else 0.0
+                daily_rate = float(values['daily_rate'])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Invalid tariff rule on line {number}: {str(e)}")
+            result.append((values['destinationport'], values['terminal'], values['effective_from'],
+                           values['effective_to'], free_days, base_fee, daily_rate))
+        if not result:
+            raise ValueError("Tariff file has no rules")
+        return result
+
+    @staticmethod
+    def replace(conn, rules):
+        """
+        요금 규칙 전체를 교체하고 집계된 모든 테이블의 월별 스토리지 집계를 다시 계산하는 메서드
+        rules: TariffRules.COLUMNS 순서의 튜플 목록 (commit은 호출자가 수행)
+        """
+        TariffRules.ensure(conn)
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM tariff_rules")
+        TariffRules._insert(cursor, rules)
+
+        StorageUtils.ensure_monthly_storage_agg(conn)
+        cursor.execute("SELECT DISTINCT table_name FROM monthly_storage_agg")
+        tables = [row[0] for row in cursor.fetchall()]
+        if tables:
+            StorageUtils.rebuild_monthly_storage_agg(conn, tables)
+        StorageResultCache.clear()
+
+    def compile(self, ports, terminals, days):
+        """
+        컨테이너별 적용 규칙 번호 배열을 계산 (규칙마다 전체 컨테이너를 한 번에 비교)
+        days: 반출일 일련번호 (적용기간 비교용)
+        """
+        no_rule = len(self.rules)
+        rule_index = np.full(len(ports), no_rule)
+        unassigned = np.ones(len(ports), dtype=bool)
+
+        for i, rule in enumerate(self.rules.itertuples(index=False)):
+            mask = unassigned.copy()
+            if pd.notna(rule.destinationport):
+                mask &= ports == rule.destinationport
+            if pd.notna(rule.terminal):
+                mask &= terminals == rule.terminal
+            if not np.isnan(self.start_day[i]):
+                mask &= days >= self.start_day[i]
+            if not np.isnan(self.end_day[i]):
+                mask &= days <= self.end_day[i]
+            rule_index[mask] = i
+            unassigned &= ~mask
+
+        return rule_index
+
+
+class StorageCostEngine:
+    """
+    컨테이너별 체류일수 / 초과일수 / 스토리지 비용을 NumPy 배열로 한 번에 계산하는 엔진
+    (SQLite는 날짜 정규화만 담당하고, 요금은 TariffRules 규칙으로 계산)
+    """
+    # 엔진 입력 쿼리: 요청한 컬럼 + 정규화된 하역일 / 반출일 (날짜, 일련번호) / 월
+    SOURCE_QUERY = """
+    SELECT {columns},
+        {unload_date} AS unloading_terminal_date,
+        {appt_date} AS terminal_appointment_date,
+        {unload_day} AS stay_start_day,
+        {appt_day} AS stay_end_day,
+        substr({appt_date}, 1, 7) AS month
+    FROM {table_name}
+    WHERE container IS NOT NULL
+    """
+    # 체류일수 구간 (각 구간의 마지막 일수, 포함) / 구간 이름
+    DWELL_BUCKET_EDGES = (7, 10, 14, 21, 30)
+    DWELL_BUCKET_LABELS = ('0-7', '8-10', '11-14', '15-21', '22-30', '30+')
+
+    def __init__(self, df, tariff=None):
+        self.df = df.reset_index(drop=True)
+        self.tariff = tariff if tariff is not None else TariffRules.default()
+
+        start_day = pd.to_numeric(self.df['stay_start_day'], errors='coerce').to_numpy(dtype='float64')
+        end_day = pd.to_numeric(self.df['stay_end_day'], errors='coerce').to_numpy(dtype='float64')
+        ports = self.df['destinationport'].to_numpy(dtype=object)
+        if 'terminal' in self.df.columns:
+            terminals = self.df['terminal'].to_numpy(dtype=object)
+        else:
+            terminals = np.full(len(self.df), None, dtype=object)
+
+        # 컨테이너별 적용 요금 규칙
+        self.rule_index = self.tariff.compile(ports, terminals, end_day)
+
+        # 체류일수 (하역일과 반출일 포함), 날짜가 없으면 NaN
+        self.total_stay_days = end_day - start_day + 1
+
+        # 무료 기간을 넘긴 일수 (NaN은 비교 결과가 False이므로 0으로 처리)
+        with np.errstate(invalid='ignore'):
+            over = self.total_stay_days - self.tariff.free_days[self.rule_index]
+            self.days_over = np.where(over > 0, over, 0.0)
+
+        # 스토리지 비용: 무료 기간을 넘긴 경우 기본료 + 초과일수 * 일별 요금
+        self.storage_cost = np.where(
+            self.days_over > 0,
+            self.tariff.base_fee[self.rule_index] + self.days_over * self.tariff.daily_rate[self.rule_index],
+            0.0
+        )
+
+    @classmethod
+    def _source_query(cls, conn, table_name, columns, existing=None, months=None, conditions=()):
+        dates, days = DateNormalizer.sql(conn, table_name, existing)
+        query = cls.SOURCE_QUERY.format(
+            columns=columns, table_name=table_name,
+            unload_date=dates['unload'], appt_date=dates['appt'],
+            unload_day=days['unload'], appt_day=days['appt']
+        )
+        if months is not None:
+            # 반출일 일련번호 범위로 필터링 (appt_day 인덱스 사용)
+            ranges = [DateNormalizer.month_day_range(month) for month in months]
+            month_condition = ' OR '.join(f"{days['appt']} BETWEEN {first} AND {last}" for first, last in ranges)
+            query += f"    AND ({month_condition or '0'})\n"
+        for condition in conditions:
+            # 조건 문자열의 {unload_day} / {appt_day}는 테이블별 하역일 / 반출일 일련번호로 치환
+            query += f"    AND {condition.format(unload_day=days['unload'], appt_day=days['appt'])}\n"
+        return query
+
+    @classmethod
+    def from_table(cls, conn, table_name, columns="[destinationport], [terminal], [f.dest]"):
+        """테이블에서 엔진 계산에 필요한 컬럼을 한 번에 읽어 엔진을 생성"""
+        return cls(pd.read_sql(cls._source_query(conn, table_name, columns), conn), TariffRules.load(conn))
+
+    @classmethod
+    def from_tables(cls, conn, tables, schema=None, months=None, extra_columns=()):
+        """
+        여러 테이블을 UNION ALL 한 번의 쿼리로 읽어 엔진을 생성 (table_name 컬럼 포함)
+        (schema: 테이블별 컬럼 목록이 있으면 전달, months: 지정한 반출월만 계산, extra_columns: 추가로 읽을 컬럼)
+        """
+        return cls(cls.read_source(conn, tables, schema, months, extra_columns=extra_columns), TariffRules.load(conn))
+
+    @classmethod
+    def read_source(cls, conn, tables, schema=None, months=None, conditions=(), extra_columns=()):
+        """
+        여러 테이블의 엔진 입력 행을 UNION ALL 한 번의 쿼리로 읽어 DataFrame으로 반환 (table_name 컬럼 포함)
+        extra_columns 중 schema에 없는 컬럼은 NULL로 채움
+        """
+        schema = schema or {}
+        queries = []
+        for table_name in tables:
+            columns = f"'{table_name}' AS table_name, [destinationport], [terminal], [f.dest]"
+            for column in extra_columns:
+                if table_name in schema and column not in schema[table_name]:
+                    columns += f", NULL AS [{column}]"
+                else:
+                    columns += f", [{column}]"
+            queries.append(cls._source_query(conn, table_name, columns, schema.get(table_name), months, conditions))
+        return pd.read_sql("\nUNION ALL\n".join(queries), conn)
+
+    def per_container(self):
+        """컨테이너별 결과 (원본 컬럼 + total_stay_days, days_over, storage_cost)"""
+        df = DateNormalizer.drop_columns(self.df.drop(columns=['stay_start_day', 'stay_end_day']))
+        df['total_stay_days'] = self.total_stay_days
+        df['days_over'] = self.days_over
+        df['storage_cost'] = self.storage_cost
+        return df
+
+    def per_month(self, by=None):
+        """반출월별 결과 (month, total_storage_cost, container_count, dd_count), by 지정 시 해당 컬럼별로 나눠 집계"""
+        keys = [by, 'month'] if by else ['month']
+        df = pd.DataFrame({
+            'month': self.df['month'],
+            'total_storage_cost': self.storage_cost,
+            'container_count': 1,
+            'dd_count': (self.df['f.dest'] == 'DD').to_numpy().astype(int)
+        })
+        if by:
+            df.insert(0, by, self.df[by])
+        df = df.dropna(subset=['month'])
+        return df.groupby(keys, sort=True).sum().reset_index()
+
+    def per_bucket(self, by=('table_name', 'month')):
+        """
+        체류일수 구간별 컨테이너 수 / 스토리지 비용 (by 컬럼 + bucket, container_count, storage_cost)
+        구간 번호는 np.digitize, 그룹 x 구간 합계는 np.bincount 한 번으로 계산 (체류일수가 없는 컨테이너 제외)
+        """
+        by = list(by)
+        columns = by + ['bucket', 'container_count', 'storage_cost']
+        valid = ~np.isnan(self.total_stay_days)
+        if not valid.any():
+            return pd.DataFrame(columns=columns)
+
+        bucket = np.digitize(self.total_stay_days[valid], self.DWELL_BUCKET_EDGES, right=True)
+        bucket_count = len(self.DWELL_BUCKET_LABELS)
+
+        # 그룹 번호 (결측값도 하나의 그룹으로 유지)
+        keys = self.df.loc[valid, by].reset_index(drop=True)
+        group = keys.groupby(by, dropna=False, sort=True).ngroup().to_numpy()
+        group_count = group.max() + 1
+
+        index = group * bucket_count + bucket
+        counts = np.bincount(index, minlength=group_count * bucket_count)
+        costs = np.bincount(index, weights=self.storage_cost[valid], minlength=group_count * bucket_count)
+
+        # 그룹 번호 순서의 대표 키 값
+        group_keys = keys.groupby(group, sort=True).first().reset_index(drop=True)
+        df = group_keys.loc[np.repeat(np.arange(group_count), bucket_count)].reset_index(drop=True)
+        df['bucket'] = np.tile(self.DWELL_BUCKET_LABELS, group_count)
+        df['container_count'] = counts
+        df['storage_cost'] = costs
+        return df[df['container_count'] > 0][columns].reset_index(drop=True)
+
+    def per_day(self, by=None, start_date=None, end_date=None):
+        """
+        일별 비용 발생 곡선 (by, date, containers_over_free: 무료 기간을 넘긴 컨테이너 수, accrued_cost: 그 날 발생한 비용)
+        컨테이너마다 과금 시작일 / 종료일 다음 날에 이벤트를 기록하고 누적합으로 계산 (일자별 쿼리 없음)
+        과금 첫날에는 기본료 + 일별 요금, 이후 반출일까지 일별 요금이 발생 (일별 합계 = storage_cost)
+        """
+        columns = ([by] if by else []) + ['date', 'containers_over_free', 'accrued_cost']
+        charged = self.storage_cost > 0
+        if not charged.any():
+            return pd.DataFrame(columns=columns)
+
+        # 과금 구간 [하역일 + 무료 기간, 반출일] (일련번호)
+        rule_index = self.rule_index[charged]
+        end = pd.to_numeric(self.df['stay_end_day'], errors='coerce').to_numpy(dtype='float64')[charged].astype(np.int64)
+        start = end - self.days_over[charged].astype(np.int64) + 1
+        base_fee = self.tariff.base_fee[rule_index]
+        daily_rate = self.tariff.daily_rate[rule_index]
+
+        epoch = pd.Timestamp('1970-01-01')
+        first = (pd.Timestamp(start_date) - epoch).days + DateNormalizer.EPOCH_DAY if start_date is not None else start.min()
+        last = (pd.Timestamp(end_date) - epoch).days + DateNormalizer.EPOCH_DAY if end_date is not None else end.max()
+        if last < first:
+            return pd.DataFrame(columns=columns)
+        length = last - first + 1
+
+        # 조회 범위와 겹치는 구간만 사용 (범위 밖에서 시작한 구간은 범위 첫날부터)
+        inside = (end >= first) & (start <= last)
+        start, end = start[inside], end[inside]
+        base_fee, daily_rate = base_fee[inside], daily_rate[inside]
+        if by:
+            codes, groups = pd.factorize(self.df[by].to_numpy()[charged][inside])
+        else:
+            codes, groups = np.zeros(len(start), dtype=np.int64), np.array([None])
+
+        # 시작 / 종료 이벤트 배열 (마지막 칸은 범위 밖 종료 이벤트용)
+        count_events = np.zeros((len(groups), length + 1))
+        rate_events = np.zeros((len(groups), length + 1))
+        base_events = np.zeros((len(groups), length + 1))
+        start_index = np.maximum(start, first) - first
+        end_index = np.minimum(end, last) - first + 1
+        np.add.at(count_events, (codes, start_index), 1)
+        np.add.at(count_events, (codes, end_index), -1)
+        np.add.at(rate_events, (codes, start_index), daily_rate)
+        np.add.at(rate_events, (codes, end_index), -daily_rate)
+        # 기본료는 과금 첫날에만 발생 (범위 이전에 시작한 구간은 제외)
+        started = start >= first
+        np.add.at(base_events, (codes[started], start_index[started]), base_fee[started])
+
+        counts = np.cumsum(count_events, axis=1)[:, :length]
+        cost = np.cumsum(rate_events, axis=1)[:, :length] + base_events[:, :length]
+
+        dates = pd.to_datetime(np.arange(first, last + 1) - DateNormalizer.EPOCH_DAY, unit='D')
+        df = pd.DataFrame({
+            'date': np.tile(dates, len(groups)),
+            'containers_over_free': np.rint(counts.ravel()).astype(int),
+            'accrued_cost': cost.ravel()
+        })
+        if by:
+            df.insert(0, by, np.repeat(np.asarray(groups, dtype=object), length))
+        return df[columns]
+
+
+class StorageProjectionEngine:
+    """
+    아직 야드에 있는 (반출되지 않은) 컨테이너의 앞으로 발생할 스토리지 비용을 일별로 누적해 예측하는 엔진
+    (컨테이너 x 일자 배열로 일별 증가분을 계산하고, 요금은 StorageCostEngine과 같은 TariffRules 규칙 사용)
+    """
+    DEFAULT_HORIZON_DAYS = 90
+
+    def __init__(self, df, tariff=None, today=None, horizon_days=DEFAULT_HORIZON_DAYS):
+        self.df = df.reset_index(drop=True)
+        self.tariff = tariff if tariff is not None else TariffRules.default()
+        self.today = pd.Timestamp(today if today is not None else datetime.now()).normalize()
+        self.horizon_days = int(horizon_days)
+        epoch = pd.Timestamp('1970-01-01')
+        self.today_day = (self.today - epoch).days + DateNormalizer.EPOCH_DAY
+
+        start_day = pd.to_numeric(self.df['stay_start_day'], errors='coerce').to_numpy(dtype='float64')
+        end_day = pd.to_numeric(self.df['stay_end_day'], errors='coerce').to_numpy(dtype='float64')
+        ports = self.df['destinationport'].to_numpy(dtype=object)
+        if 'terminal' in self.df.columns:
+            terminals = self.df['terminal'].to_numpy(dtype=object)
+        else:
+            terminals = np.full(len(self.df), None, dtype=object)
+
+        # 반출일이 정해지지 않았으므로 오늘 기준으로 적용 요금 규칙 선택
+        self.rule_index = self.tariff.compile(ports, terminals, np.full(len(self.df), self.today_day))
+        free_days = self.tariff.free_days[self.rule_index][:, None]
+        base_fee = self.tariff.base_fee[self.rule_index][:, None]
+        daily_rate = self.tariff.daily_rate[self.rule_index][:, None]
+
+        # 오늘까지의 체류일수와 이미 발생한 비용
+        self.stay_days_to_date = self.today_day - start_day + 1
+        over = self.stay_days_to_date - free_days[:, 0]
+        self.accrued_cost = np.where(over > 0, base_fee[:, 0] + over * daily_rate[:, 0], 0.0)
+
+        # 예측 기간의 날짜 (내일부터 horizon_days일)와 컨테이너 x 일자 체류일수
+        self.dates = pd.date_range(self.today + pd.Timedelta(days=1), periods=self.horizon_days, freq='D')
+        offsets = np.arange(1, self.horizon_days + 1)
+        stay = self.stay_days_to_date[:, None] + offsets[None, :]
+
+        # 반출 예약일이 있으면 그 날까지만 체류
+        max_stay = np.where(np.isnan(end_day), np.inf, end_day - start_day + 1)[:, None]
+
+        # 일별 증가분: 무료 기간 다음 날은 기본료 + 일별 요금, 그 이후는 일별 요금
+        self.daily_cost = np.where(
+            stay <= max_stay,
+            np.where(stay == free_days + 1, base_fee + daily_rate, np.where(stay > free_days + 1, daily_rate, 0.0)),
+            0.0
+        )
+        # 날짜별 누적 비용 (오늘까지 발생한 비용 포함)
+        self.cumulative_cost = self.accrued_cost[:, None] + np.cumsum(self.daily_cost, axis=1)
+
+    @classmethod
+    def from_tables(cls, conn, tables, schema=None, today=None, horizon_days=DEFAULT_HORIZON_DAYS):
+        """여러 테이블에서 오늘 기준으로 하역되었고 아직 반출되지 않은 컨테이너만 읽어 엔진을 생성"""
+        today = pd.Timestamp(today if today is not None else datetime.now()).normalize()
+        today_day = (today - pd.Timestamp('1970-01-01')).days + DateNormalizer.EPOCH_DAY
+        conditions = (
+            f"{{unload_day}} <= {today_day}",
+            f"({{appt_day}} IS NULL OR {{appt_day}} > {today_day})",
+        )
+        df = StorageCostEngine.read_source(conn, tables, schema, conditions=conditions)
+        return cls(df, TariffRules.load(conn), today, horizon_days)
+
+    def per_container(self):
+        """컨테이너별 결과 (원본 컬럼 + stay_days_to_date, accrued_cost, projected_cost: 예측 기간 마지막 날까지의 누적 비용)"""
+        df = DateNormalizer.drop_columns(self.df.drop(columns=['stay_start_day', 'stay_end_day']))
+        df['stay_days_to_date'] = self.stay_days_to_date
+        df['accrued_cost'] = self.accrued_cost
+        df['projected_cost'] = self.cumulative_cost[:, -1] if self.horizon_days else self.accrued_cost
+        return df
+
+    def per_month(self, by='table_name'):
+        """
+        월별 예측 결과 (by, month, projected_cost: 그 달에 새로 발생할 비용,
+        cumulative_cost: 그 달 말까지의 누적 비용, charged_containers: 그 달에 비용이 발생하는 컨테이너 수)
+        """
+        columns = [by, 'month', 'projected_cost', 'cumulative_cost', 'charged_containers']
+        if self.df.empty or not self.horizon_days:
+            return pd.DataFrame(columns=columns)
+
+        # 일자 -> 월 경계 (날짜가 연속이므로 월이 바뀌는 위치에서 구간 합계)
+        months = self.dates.strftime('%Y-%m')
+        bounds = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        month_cost = np.add.reduceat(self.daily_cost, bounds, axis=1)
+        month_charged = np.add.reduceat(self.daily_cost > 0, bounds, axis=1) > 0
+
+        # 그룹(디비전) 단위 합계는 one-hot 행렬 곱으로 계산
+        codes, groups = pd.factorize(self.df[by])
+        one_hot = np.zeros((len(groups), len(self.df)))
+        one_hot[codes, np.arange(len(self.df))] = 1.0
+        cost = one_hot @ month_cost
+        charged = one_hot @ month_charged
+        cumulative = (one_hot @ self.accrued_cost)[:, None] + np.cumsum(cost, axis=1)
+
+        return pd.DataFrame({
+            by: np.repeat(np.asarray(groups, dtype=object), len(bounds)),
+            'month': np.tile(np.asarray(months[bounds]), len(groups)),
+            'projected_cost': cost.ravel(),
+            'cumulative_cost': cumulative.ravel(),
+            'charged_containers': charged.ravel().astype(int)
+        }, columns=columns).sort_values([by, 'month']).reset_index(drop=True)
+
+
+class StorageResultCache:
+    """
+    StorageUtils 조회 결과를 Log 테이블의 테이블별 updated_at 값을 버전으로 삼아 캐시하는 클래스 (LRU)
+    """
+    MAX_SIZE = 128
+    VERSION_TTL = 2.0  # Log 테이블 재조회 간격 (초)
+
+    _entries = OrderedDict()
+    _versions = {}
+    _versions_checked_at = 0.0
+    _lock = threading.RLock()  # KPI 작업자 스레드와 GUI 스레드가 함께 사용
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def _load_versions(cls):
+        """Log 테이블의 updated_at 행을 읽어 테이블별 버전으로 사용 (TTL 동안 재사용)"""
+        now = time.monotonic()
+        if now - cls._versions_checked_at < cls.VERSION_TTL:
+            return cls._versions
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM Log WHERE field1 = 'updated_at'")
+                row = cursor.fetchone()
+                columns = [desc[0] for desc in cursor.description]
+            cls._versions = dict(zip(columns, row)) if row else {}
+        except Exception:
+            cls._versions = {}
+        cls._versions_checked_at = now
+        return cls._versions
+
+    @classmethod
+    def version(cls, table_name):
+        versions = cls._load_versions()
+        if table_name == "all_tables" or table_name is None:
+            return tuple(sorted((k, str(v)) for k, v in versions.items()))
+        if isinstance(table_name, tuple):
+            return tuple(versions.get(name) for name in table_name)
+        return versions.get(table_name)
+
+    @staticmethod
+    def _copy(result):
+        if isinstance(result, tuple):
+            return tuple(df.copy() for df in result)
+        return result.copy()
+
+    @classmethod
+    def cached(cls, method):
+        """StorageUtils 메서드용 데코레이터: (메서드, table_name, 인자) 단위로 결과를 캐시"""
+        @functools.wraps(method)
+        def wrapper(table_name=None, *args, **kwargs):
+            if isinstance(table_name, list):
+                table_name = tuple(table_name)
+            key = (method.__name__, table_name, args + tuple(sorted(kwargs.items())))
+            with cls._lock:
+                version = cls.version(table_name)
+                entry = cls._entries.get(key)
+                if entry is not None and entry[0] == version:
+                    cls.hits += 1
+                    cls._entries.move_to_end(key)
+                    return cls._copy(entry[1])
+                cls.misses += 1
+
+            # 계산은 잠금 밖에서 수행
+            result = method(table_name, *args, **kwargs)
+            with cls._lock:
+                cls._entries[key] = (version, result)
+                cls._entries.move_to_end(key)
+                while len(cls._entries) > cls.MAX_SIZE:
+                    cls._entries.popitem(last=False)
+            return cls._copy(result)
+        return wrapper
+
+    @classmethod
+    def apply_upload(cls, changed_tables, updated_tables):
+        """
+        업로드 후 캐시 정리: 내용이 바뀐 테이블의 결과는 버리고,
+        시간만 갱신되고 내용은 같은 테이블의 결과는 새 버전으로 옮겨 계속 사용
+        """
+        changed, updated = set(changed_tables), set(updated_tables)
+        with cls._lock:
+            cls._versions_checked_at = 0.0
+            for key in list(cls._entries):
+                table_name = key[1]
+                if table_name == "all_tables" or table_name is None:
+                    names = None
+                else:
+                    names = set(table_name) if isinstance(table_name, tuple) else {table_name}
+                if (changed and names is None) or (names is not None and names & changed):
+                    del cls._entries[key]
+                elif names is None or names & updated:
+                    cls._entries[key] = (cls.version(table_name), cls._entries[key][1])
+
+    @classmethod
+    def clear(cls):
+        """업로드 직후처럼 버전 확인 없이 바로 무효화해야 할 때 사용"""
+        with cls._lock:
+            cls._entries.clear()
+            cls._versions_checked_at = 0.0
+
+    @classmethod
+    def stats(cls):
+        return {'hits': cls.hits, 'misses': cls.misses, 'size': len(cls._entries)}
+
+
+class StorageUtils:
+    # 스토리지 비용 계산에 필요한 원본 컬럼
+    REQUIRED_COLUMNS = {'container', 'destinationport', 'terminal', 'f.dest', 'unloadingterminal', 'terminalappointment'}
+
+    @staticmethod
+    def ensure_monthly_storage_agg(conn, tables=()):
+        """
+        monthly_storage_agg 테이블을 만들고, 아직 집계되지 않은 테이블은 새로 집계하는 메서드
+        """
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS monthly_storage_agg (
+                table_name TEXT NOT NULL,
+                month TEXT NOT NULL,
+                total_storage_cost REAL,
+                container_count INTEGER,
+                dd_count INTEGER,
+                PRIMARY KEY (table_name, month)
+            )
+        """)
+        cursor.execute("SELECT DISTINCT table_name FROM monthly_storage_agg")
+        materialized = {row[0] for row in cursor.fetchall()}
+        for table_name in tables:
+            if table_name not in materialized:
+                StorageUtils.refresh_monthly_storage_agg(conn, table_name)
+
+    @staticmethod
+    def refresh_monthly_storage_agg(conn, table_name, months=None):
+        """
+        업로드된 테이블의 월별 집계 행을 monthly_storage_agg 테이블에 다시 기록하는 메서드
+        months를 지정하면 해당 월의 집계 행만 다시 계산 (commit은 호출자가 수행)
+        """
+        StorageUtils.rebuild_monthly_storage_agg(conn, [table_name], months)
+
+    @staticmethod
+    def rebuild_monthly_storage_agg(conn, tables, months=None):
+        """
+        여러 테이블의 월별 집계를 UNION ALL 한 번으로 다시 계산해 기록하는 메서드 (요금 변경 시 사용, commit은 호출자가 수행)
+        """
+        if months is not None and not months:
+            return
+        StorageUtils.ensure_monthly_storage_agg(conn)
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(tables))
+        delete_query = f"DELETE FROM monthly_storage_agg WHERE table_name IN ({placeholders})"
+        params = list(tables)
+        if months is not None:
+            delete_query += f" AND month IN ({','.join(['?'] * len(months))})"
+            params += list(months)
+        cursor.execute(delete_query, params)
+        monthly = StorageCostEngine.from_tables(conn, tables, months=months).per_month(by='table_name')
+        cursor.executemany("""
+            INSERT INTO monthly_storage_agg (table_name, month, total_storage_cost, container_count, dd_count)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (row.table_name, row.month, float(row.total_storage_cost), int(row.container_count), int(row.dd_count))
+            for row in monthly.itertuples(index=False)
+        ])
+
+    @staticmethod
+    def snapshot_upload_rows(conn, table_name):
+        """
+        업로드로 삭제될 행(Fixed가 아닌 행)을 변경 비교용 임시 테이블에 보관하는 메서드 (삭제 전에 호출)
+        """
+        data_columns = StorageUtils._data_columns(conn, table_name)
+        dates, _ = DateNormalizer.sql(conn, table_name)
+        cursor = conn.cursor()
+        cursor.execute("DROP TABLE IF EXISTS temp.upload_snapshot")
+        cursor.execute(f"""
+            CREATE TEMP TABLE upload_snapshot AS
+            SELECT {', '.join(f'[{col}]' for col in data_columns)}, substr({dates['appt']}, 1, 7) AS _month
+            FROM {table_name}
+            WHERE Fixed IS NULL OR Fixed != 'F'
+        """)
+
+    @staticmethod
+    def record_upload_changes(conn, table_name, last_rowid):
+        """
+        보관한 이전 행과 새로 삽입된 행(rowid > last_rowid, last_rowid는 삭제 직후의 최대 rowid)을 비교해
+        내용이 달라진 행의 반출월을 찾아 monthly_storage_changes 테이블에 기록하는 메서드 (정규화 이후 호출, commit은 호출자가 수행)
+        반환값: (변경 여부, 변경된 월 목록)
+        """
+        data_columns = [
+            col for col in StorageUtils._data_columns(conn, table_name)
+            if col in StorageUtils._data_columns(conn, 'temp.upload_snapshot')
+        ]
+        column_sql = ', '.join(f'[{col}]' for col in data_columns)
+        dates, _ = DateNormalizer.sql(conn, table_name)
+        target, where, params = ContainerStore.target(conn, table_name)
+
+        # 이전 행은 +1, 새 행은 -1로 합산해 0이 아닌 행(추가 / 삭제 / 수정된 행)만 남김
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT DISTINCT _month FROM (
+                SELECT {column_sql}, _month
+                FROM (
+                    SELECT {column_sql}, _month, 1 AS _sign FROM temp.upload_snapshot
+                    UNION ALL
+                    SELECT {column_sql}, substr({dates['appt']}, 1, 7) AS _month, -1 AS _sign
+                    FROM {target}
+                    WHERE {where} AND rowid > ?
+                )
+                GROUP BY {column_sql}, _month
+                HAVING SUM(_sign) != 0
+            )
+        """, params + (last_rowid,))
+        changed_months = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DROP TABLE IF EXISTS temp.upload_snapshot")
+
+        if not changed_months:
+            return False, []
+
+        months = sorted(month for month in changed_months if month is not None)
+        StorageUtils.log_storage_changes(conn, table_name, months or [None])
+        return True, months
+
+    @staticmethod
+    def log_storage_changes(conn, table_name, months):
+        """변경된 (테이블, 월)을 monthly_storage_changes 테이블에 기록 (월이 None이면 월과 무관한 변경)"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS monthly_storage_changes (
+                table_name TEXT NOT NULL,
+                month TEXT,
+                changed_at TEXT NOT NULL
+            )
+        """)
+        changed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.executemany(
+            "INSERT INTO monthly_storage_changes (table_name, month, changed_at) VALUES (?, ?, ?)",
+            [(table_name, month, changed_at) for month in months]
+        )
+
+    @staticmethod
+    def _storage_tables(conn, tables=None):
+        """
+        table% 테이블의 컬럼 정보를 한 번에 조회하고, 스토리지 계산에 필요한 컬럼이 있는 테이블만 골라 반환
+        반환값: (테이블별 컬럼 집합, 대상 테이블 목록 - tables가 없으면 전체)
+        """
+        schema = {}
+        for name, column in conn.execute("""
+            SELECT m.name, p.name
+            FROM sqlite_master m, pragma_table_info(m.name) p
+            WHERE m.type IN ('table', 'view') AND m.name LIKE 'table%'
+        """):
+            schema.setdefault(name, set()).add(column)
+        if tables is None:
+            tables = sorted(schema)
+        tables = [t for t in tables if StorageUtils.REQUIRED_COLUMNS <= schema.get(t, set())]
+        return schema, tables
+
+    @staticmethod
+    def get_projected_storage_cost(tables=None, horizon_days=StorageProjectionEngine.DEFAULT_HORIZON_DAYS):
+        """
+        아직 반출되지 않은 컨테이너의 앞으로 horizon_days일 동안의 월별 예상 스토리지 비용 (tables가 없으면 table% 전체)
+        예측은 날짜가 바뀌면 달라지므로 오늘 날짜를 캐시 키에 포함
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        return StorageUtils._get_projected_storage_cost(tables, horizon_days=horizon_days, today=today)
+
+    @staticmethod
+    @StorageResultCache.cached
+    def _get_projected_storage_cost(tables=None, horizon_days=StorageProjectionEngine.DEFAULT_HORIZON_DAYS, today=None):
+        """get_projected_storage_cost의 캐시되는 본체 (반환값: table_name, month, projected_cost, cumulative_cost, charged_containers)"""
+        with db_connection() as conn:
+            schema, tables = StorageUtils._storage_tables(conn, tables)
+            if tables:
+                engine = StorageProjectionEngine.from_tables(conn, tables, schema, today, horizon_days)
+        if not tables:
+            return pd.DataFrame(columns=['table_name', 'month', 'projected_cost', 'cumulative_cost', 'charged_containers'])
+        return engine.per_month(by='table_name')
+
+    @staticmethod
+    @StorageResultCache.cached
+    def get_daily_storage_accrual(tables=None, start_date=None, end_date=None):
+        """
+        테이블별 일별 비용 발생 곡선 (tables가 없으면 table% 전체)
+        start_date / end_date: 'YYYY-MM-DD' 형식의 조회 범위 (포함, 없으면 전체 과금 기간)
+        반환값: table_name, date, containers_over_free, accrued_cost
+        """
+        with db_connection() as conn:
+            schema, tables = StorageUtils._storage_tables(conn, tables)
+            if tables:
+                engine = StorageCostEngine.from_tables(conn, tables, schema)
+        if not tables:
+            return pd.DataFrame(columns=['table_name', 'date', 'containers_over_free', 'accrued_cost'])
+        return engine.per_day(by='table_name', start_date=start_date, end_date=end_date)
+
+    @staticmethod
+    @StorageResultCache.cached
+    def get_dwell_bucket_data(tables=None, start_month=None, end_month=None):
+        """
+        체류일수 구간별 컨테이너 수 / 스토리지 비용 (tables가 없으면 table% 전체)
+        start_month / end_month: 'YYYY-MM' 형식의 반출월 조회 범위 (포함)
+        반환값: table_name, month, destinationport, modality, bucket, container_count, storage_cost
+        """
+        columns = ['table_name', 'month', 'destinationport', 'modality', 'bucket', 'container_count', 'storage_cost']
+        with db_connection() as conn:
+            schema, tables = StorageUtils._storage_tables(conn, tables)
+            if tables:
+                engine = StorageCostEngine.from_tables(conn, tables, schema, extra_columns=('modality',))
+        if not tables:
+            return pd.DataFrame(columns=columns)
+
+        df = engine.per_bucket(by=('table_name', 'month', 'destinationport', 'modality'))
+        if start_month is not None:
+            df = df[df['month'] >= start_month]
+        if end_month is not None:
+            df = df[df['month'] <= end_month]
+        return df.reset_index(drop=True)
+
+    @staticmethod
+    def _data_columns(conn, table_name):
+        """정규화 컬럼을 제외한 원본 데이터 컬럼 목록"""
+        if table_name.startswith('temp.'):
+            query = f"PRAGMA temp.table_info({table_name[5:]})"
+        else:
+            query = f"PRAGMA table_info({table_name})"
+        normalized = set(DateNormalizer.columns())
+        return [info[1] for info in conn.execute(query).fetchall() if info[1] not in normalized]
+
+    @staticmethod
+    def _read_monthly_agg(conn, table_name):
+        """
+        집계 테이블에서 월별 집계를 읽고, 집계가 없으면 원본 테이블에서 직접 계산하는 메서드
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='monthly_storage_agg'")
+        df = pd.DataFrame()
+        if cursor.fetchone():
+            df = pd.read_sql("""
+                SELECT month, total_storage_cost, container_count, dd_count
+                FROM monthly_storage_agg
+                WHERE table_name = ?
+                ORDER BY month
+            """, conn, params=(table_name,))
+
+        if df.empty:
+            df = StorageCostEngine.from_table(conn, table_name).per_month()
+
+        df['month'] = pd.to_datetime(df['month'], errors='coerce', format='%Y-%m')
+        return df.dropna(subset=['month']).reset_index(drop=True)
+
+    @staticmethod
+    @StorageResultCache.cached
+    def get_all_divisions_monthly_data(tables=None, start_month=None, end_month=None):
+        """
+        여러 테이블의 월별 스토리지 집계를 한 번에 조회하는 메서드 (tables가 없으면 table% 전체)
+        start_month / end_month: 'YYYY-MM' 형식의 조회 범위 (포함)
+        반환값: (테이블별 월별 집계, 전체 월별 합계)
+        """
+        with db_connection() as conn:
+            return StorageUtils._read_divisions_monthly(conn, tables, start_month, end_month)
+
+    @staticmethod
+    def _read_divisions_monthly(conn, tables=None, start_month=None, end_month=None):
+        """get_all_divisions_monthly_data를 주어진 연결에서 조회 (캐시 없음, 쓰기 연결에서 원본 기준으로 읽을 때 사용)"""
+        schema, tables = StorageUtils._storage_tables(conn, tables)
 
-        # 테이블 크기 조정
-        table_widget.resizeColumnsToContents()
-        table_widget.resizeRowsToContents()
+        columns = ['table_name', 'month', 'total_storage_cost', 'container_count', 'dd_count']
+        per_division = pd.DataFrame(columns=columns)
+        if tables:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='monthly_storage_agg'")
+            materialized = set()
+            if cursor.fetchone():
+                cursor.execute("SELECT DISTINCT table_name FROM monthly_storage_agg")
+                materialized = {row[0] for row in cursor.fetchall()}
+
+                placeholders = ','.join(['?'] * len(tables))
+                month_conditions = ""
+                params = list(tables)
+                if start_month is not None:
+                    month_conditions += " AND month >= ?"
+                    params.append(start_month)
+                if end_month is not None:
+                    month_conditions += " AND month <= ?"
+                    params.append(end_month)
+                per_division = pd.read_sql(f"""
+                    SELECT {', '.join(columns)}
+                    FROM monthly_storage_agg
+                    WHERE table_name IN ({placeholders}){month_conditions}
+                """, conn, params=params)
+
+            # 집계가 없는 테이블은 UNION ALL 한 번으로 직접 계산
+            missing = [t for t in tables if t not in materialized]
+            if missing:
+                computed = StorageCostEngine.from_tables(conn, missing, schema).per_month(by='table_name')
+                if start_month is not None:
+                    computed = computed[computed['month'] >= start_month]
+                if end_month is not None:
+                    computed = computed[computed['month'] <= end_month]
+                per_division = pd.concat([per_division, computed], ignore_index=True) if not per_division.empty else computed
+
+        per_division['month'] = pd.to_datetime(per_division['month'], errors='coerce', format='%Y-%m')
+        per_division = per_division.dropna(subset=['month'])
+        per_division = per_division.sort_values(['table_name', 'month']).reset_index(drop=True)
+
+        totals = per_division.groupby('month', sort=True)[
+            ['total_storage_cost', 'container_count', 'dd_count']
+        ].sum().reset_index()
+        return per_division, totals
 
-    def copy_selection(self, table_widget):
-        selected = table_widget.selectedRanges()
-        if not selected:
-            return
-        
-        text = []
-        for r in selected:
-            for row in range(r.topRow(), r.bottomRow() + 1):
-                row_data = []
-                for col in range(r.leftColumn(), r.rightColumn() + 1):
-                    item = table_widget.item(row, col)
-                    if item is not None:
-                        row_data.append(item.text())
-                    else:
-                        row_data.append('')
-                text.append('\t'.join(row_data))
-        
-        QApplication.clipboard().setText('\n'.join(text))
+    @staticmethod
+    @StorageResultCache.cached
+    def get_monthly_storage_data_many(tables=None, start_month=None, end_month=None):
+        """
+        여러 디비전의 월별 스토리지 데이터를 (division, month) 인덱스의 DataFrame 하나로 반환하는 메서드
+        컬럼: total_storage_cost, container_count, dd_count, cost_per_container
+        디비전 간 계산은 이 DataFrame의 groupby / unstack으로 처리
+        """
+        start_month = pd.to_datetime(start_month).strftime('%Y-%m') if start_month is not None else None
+        end_month = pd.to_datetime(end_month).strftime('%Y-%m') if end_month is not None else None
 
-    def keyPressEvent(self, event):
-        if event.matches(QKeySequence.Copy):
-            current_tab = self.tabs.currentWidget()
-            if current_tab:
-                table_widget = current_tab.findChild(QTableWidget)
-                if table_widget:
-                    self.copy_selection(table_widget)
-        else:
-            super().keyPressEvent(event)
+        per_division, _ = StorageUtils.get_all_divisions_monthly_data(tables, start_month, end_month)
+        return StorageUtils._division_month_frame(per_division)
+
+    @staticmethod
+    def _division_month_frame(per_division):
+        """테이블별 월별 집계를 (division, month) 인덱스 + cost_per_container 컬럼 DataFrame으로 변환"""
+        df = per_division.rename(columns={'table_name': 'division'})
+        df['cost_per_container'] = df['total_storage_cost'] / df['container_count'].where(df['container_count'] > 0)
+        return df.set_index(['division', 'month']).sort_index()
 
-class StorageUtils:
     @staticmethod
+    @StorageResultCache.cached
     def get_monthly_storage_data(table_name):
         """
         특정 테이블의 월별 스토리지 비용과 컨테이너 수를 계산하는 유틸리티 메서드
         """
         if table_name == "all_tables":
-            # 모든 테이블의 데이터를 합치는 로직
-            combined_df = pd.DataFrame()
-            conn = connect_db()
-            
-            # 모든 테이블에서 데이터 가져오기
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            
-            for table in tables:
-                table_name = table[0]
-                query = f"""
-                WITH calculated_days AS (
-                    SELECT * ,
-                        date(
-                            CASE
-                                WHEN [unloadingterminal] LIKE '%/%'
-                                THEN substr([unloadingterminal], 7, 4) || '-' ||
-                                     substr([unloadingterminal], 4, 2) || '-' ||
-                                     substr([unloadingterminal], 1, 2)
-                                ELSE [unloadingterminal]
-                            END
-                        ) AS unloading_terminal_date,
-                        date([terminalappointment]) AS terminal_appointment_date
-                    FROM {table_name}
-                    WHERE container IS NOT NULL
-                ),
-                days_over_seven AS (
-                    SELECT *,
-                        julianday(terminal_appointment_date) - julianday(unloading_terminal_date) + 1 AS total_stay_days
-                    FROM calculated_days
-                ),
-                storage_costs AS (
-                    SELECT * ,
-                        CASE
-                            WHEN total_stay_days > 7 THEN 
-                                CASE 
-                                    WHEN destinationport IN ('LZO', 'LAZARO', 'Lazaro Cardenas', 'LAZARO CARDENAS') THEN
-                                        CASE
-                                            WHEN total_stay_days > 10 THEN (total_stay_days - 10) * 2027
-                                            ELSE 0
-                                        END
-                                    ELSE 4356.42 + (total_stay_days - 7) * 2194.43
-                                END
-                            ELSE 0
-                        END AS storage_cost,
-                        strftime('%Y-%m', date([terminalappointment])) AS month
-                    FROM days_over_seven
-                )
-                SELECT 
-                    month, 
-                    SUM(storage_cost) as total_storage_cost,
-                    COUNT(*) as container_count
-                FROM storage_costs
-                GROUP BY month
-                """
-                try:
-                    df = pd.read_sql(query, conn)
-                    combined_df = pd.concat([combined_df, df], ignore_index=True)
-                except:
-                    continue
-            
-            conn.close()
-            
-            # 월별로 데이터 합치기
-            if not combined_df.empty:
-                combined_df = combined_df.groupby('month').agg({
-                    'total_storage_cost': 'sum',
-                    'container_count': 'sum'
-                }).reset_index()
-                
-                # 날짜 형식 변환
-                combined_df['month'] = pd.to_datetime(combined_df['month'], format='%Y-%m')
-                
-            return combined_df
+            _, totals = StorageUtils.get_all_divisions_monthly_data()
+            return totals[['month', 'total_storage_cost', 'container_count']]
             
         else:
-            # 기존의 단일 테이블 처리 코드
-            conn = connect_db()
-            query = f"""
-            WITH calculated_days AS (
-                SELECT * ,
-                    date(
-                        CASE
-                            WHEN [unloadingterminal] LIKE '%/%'
-                            THEN substr([unloadingterminal], 7, 4) || '-' ||
-                                 substr([unloadingterminal], 4, 2) || '-' ||
-                                 substr([unloadingterminal], 1, 2)
-                            ELSE [unloadingterminal]
-                        END
-                    ) AS unloading_terminal_date,
-                    date([terminalappointment]) AS terminal_appointment_date
-                FROM {table_name}
-                WHERE container IS NOT NULL
-            ),
-            days_over_seven AS (
-                SELECT *,
-                    julianday(terminal_appointment_date) - julianday(unloading_terminal_date) + 1 AS total_stay_days
-                FROM calculated_days
-            ),
-            storage_costs AS (
-                SELECT * ,
-                    CASE
-                        WHEN destinationport IN ('LZO', 'LAZARO', 'Lazaro Cardenas', 'LAZARO CARDENAS') THEN
-                            CASE
-                                WHEN total_stay_days > 10 THEN total_stay_days - 10
-                                ELSE 0
-                            END
-                        ELSE
-                            CASE
-                                WHEN total_stay_days > 7 THEN total_stay_days - 7
-                                ELSE 0
-                            END
-                    END AS days_over,
-                    CASE
-                        WHEN total_stay_days > 7 THEN 
-                            CASE 
-                                WHEN destinationport IN ('LZO', 'LAZARO', 'Lazaro Cardenas', 'LAZARO CARDENAS') THEN
-                                    CASE
-                                        WHEN total_stay_days > 10 THEN (total_stay_days - 10) * 2027
-                                        ELSE 0
-                                    END
-                                ELSE 4356.42 + (total_stay_days - 7) * 2194.43
-                            END
-                        ELSE 0
-                    END AS storage_cost,
-                    strftime('%Y-%m', date([terminalappointment])) AS month
-                FROM days_over_seven
-            )
-            SELECT 
-                month, 
-                SUM(storage_cost) as total_storage_cost,
-                COUNT(*) as container_count
-            FROM storage_costs
-            GROUP BY month
-            ORDER BY month
-            """
-            df = pd.read_sql(query, conn)
-            conn.close()
+            with db_connection() as conn:
+                df = StorageUtils._read_monthly_agg(conn, table_name)
 
-            # 날짜 표식 처리 - 수정된 부분
-            df['month'] = pd.to_datetime(df['month'], errors='coerce', format='%Y-%m')
-            # NaT 값을 가진 행 제거
-            df = df.dropna(subset=['month'])
-
-            return df
+            return df[['month', 'total_storage_cost', 'container_count']]
 
     @staticmethod
+    @StorageResultCache.cached
     def get_individual_storage_data(table_name):
         """
         개별 컨테이너의 스토리지 비용을 계산하는 메서드
         """
-        conn = connect_db()
-        query = f"""
-        WITH calculated_days AS (
-            SELECT * ,
-                date(
-                    CASE
-                        WHEN [unloadingterminal] LIKE '%/%'
-                        THEN substr([unloadingterminal], 7, 4) || '-' ||
-                             substr([unloadingterminal], 4, 2) || '-' ||
-                             substr([unloadingterminal], 1, 2)
-                        ELSE [unloadingterminal]
-                    END
-                ) AS unloading_terminal_date,
-                date([terminalappointment]) AS terminal_appointment_date,
-                strftime('%Y-%m', date([terminalappointment])) AS month
-            FROM {table_name}
-            WHERE container IS NOT NULL
-        ),
-        days_over_seven AS (
-            SELECT *,
-                julianday(terminal_appointment_date) - julianday(unloading_terminal_date) + 1 AS total_stay_days
-            FROM calculated_days
-        )
-        SELECT *,
-            CASE
-                WHEN destinationport IN ('LZO', 'LAZARO', 'Lazaro Cardenas', 'LAZARO CARDENAS') THEN
-                    CASE
-                        WHEN total_stay_days > 10 THEN total_stay_days - 10
-                        ELSE 0
-                    END
-                ELSE
-                    CASE
-                        WHEN total_stay_days > 7 THEN total_stay_days - 7
-                        ELSE 0
-                    END
-            END AS days_over,
-            CASE
-                WHEN total_stay_days > 7 THEN 
-                    CASE 
-                        WHEN destinationport IN ('LZO', 'LAZARO', 'Lazaro Cardenas', 'LAZARO CARDENAS') THEN
-                            CASE
-                                WHEN total_stay_days > 10 THEN (total_stay_days - 10) * 2027
-                                ELSE 0
-                            END
-                        ELSE 4356.42 + (total_stay_days - 7) * 2194.43
-                    END
-                ELSE 0
-            END AS storage_cost
-        FROM days_over_seven
-        ORDER BY month
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        with db_connection() as conn:
+            engine = StorageCostEngine.from_table(conn, table_name, columns="*")
+
+        df = engine.per_container()
+        return df.sort_values('month', na_position='first', kind='stable').reset_index(drop=True)
+
+    @staticmethod
+    def iter_individual_storage_data(table_name, columns=None, min_year=None, charged_only=False, chunksize=2000):
+        """
+        개별 컨테이너 스토리지 비용을 반출월 순서대로 한 달씩 (month, DataFrame)으로 내보내는 제너레이터
+        columns: 가져올 원본 컬럼 (None이면 전체), min_year: 반출 연도 하한, charged_only: 비용이 발생한 컨테이너만
+        컬럼 선택과 필터는 쿼리에서 처리하고 결과는 chunksize 행씩 나눠 읽음 (반출월이 없는 행은 제외)
+        """
+        with db_connection() as conn:
+            tariff = TariffRules.load(conn)
+            _, days = DateNormalizer.sql(conn, table_name)
+
+            if columns is None:
+                column_sql = "*"
+            else:
+                needed = list(columns) + [col for col in ('destinationport', 'terminal') if col not in columns]
+                column_sql = ', '.join(f'[{col}]' for col in needed)
+
+            conditions = []
+            if min_year is not None:
+                first_day, _ = DateNormalizer.month_day_range(f"{min_year}-01")
+                conditions.append(f"{days['appt']} >= {first_day}")
+            if charged_only:
+                # 가장 짧은 무료 기간보다 오래 머문 컨테이너만 읽음 (정확한 비용 조건은 엔진 계산 후 확인)
+                min_free_days = int(tariff.free_days[:-1].min()) if len(tariff.rules) else 0
+                conditions.append(f"{days['appt']} - {days['unload']} + 1 > {min_free_days}")
+
+            query = StorageCostEngine._source_query(conn, table_name, column_sql, conditions=conditions)
+            query += f"    ORDER BY {days['appt']}\n"
+
+            # 반출일 순서로 읽으므로 chunk의 마지막 월만 다음 chunk와 이어질 수 있음
+            pending = None
+            for chunk in pd.read_sql(query, conn, chunksize=chunksize):
+                df = StorageCostEngine(chunk, tariff).per_container()
+                if charged_only:
+                    df = df[df['storage_cost'] > 0]
+                df = df.dropna(subset=['month'])
+                if pending is not None:
+                    df = pd.concat([pending, df], ignore_index=True)
+                if df.empty:
+                    pending = None
+                    continue
+
+                last_month = df['month'].iloc[-1]
+                for month, group in df[df['month'] != last_month].groupby('month', sort=False):
+                    yield month, group.reset_index(drop=True)
+                pending = df[df['month'] == last_month]
+
+            if pending is not None and not pending.empty:
+                yield pending['month'].iloc[0], pending.reset_index(drop=True)
 
     @staticmethod
+    @StorageResultCache.cached
     def get_dd_container_data(table_name):
         """
         DD 고객의 월별 컨테이너 수를 계산하는 메서드
+        (반출일이 없는 컨테이너는 월별 집계에 없으므로 따로 세어 NaT 월로 맨 앞에 추가)
         """
-        conn = connect_db()
-        query = f"""
-        WITH calculated_days AS (
-            SELECT 
-                strftime('%Y-%m', date([terminalappointment])) AS month,
-                [f.dest],
-                COUNT(*) as container_count
-            FROM {table_name}
-            WHERE container IS NOT NULL
-            GROUP BY month, [f.dest]
-        )
-        SELECT 
-            month,
-            SUM(CASE WHEN [f.dest] = 'DD' THEN container_count ELSE 0 END) as dd_count
-        FROM calculated_days
-        GROUP BY month
-        ORDER BY month
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        
-        # month 컬럼을 datetime으로 변환
-        df['month'] = pd.to_datetime(df['month'], format='%Y-%m')
+        with db_connection() as conn:
+            df = StorageUtils._read_monthly_agg(conn, table_name)
+            _, days = DateNormalizer.sql(conn, table_name)
+            no_month = conn.execute(f"""
+                SELECT COUNT(*), SUM(CASE WHEN [f.dest] = 'DD' THEN 1 ELSE 0 END)
+                FROM {table_name}
+                WHERE container IS NOT NULL AND {days['appt']} IS NULL
+            """).fetchone()
+
+        df = df[['month', 'dd_count']]
+        if no_month[0]:
+            df = pd.concat([pd.DataFrame({'month': [pd.NaT], 'dd_count': [no_month[1]]}), df], ignore_index=True)
         return df
 
     # StorageUtils 클래스에 새로운 메서드 추가
     @staticmethod
+    @StorageResultCache.cached
     def get_kpi_container_count(table_name):
         """KPI용 컨테이너 카운트 계산"""
-        conn = connect_db()
-        query = f"""
-        SELECT 
-            strftime('%Y-%m', date([terminalappointment])) AS month,
-            COUNT(*) as container_count
-        FROM {table_name}
-        WHERE container IS NOT NULL
-        GROUP BY month
-        ORDER BY month
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        
-        
-        
-        # 날짜 표식 처리
-        df['month'] = pd.to_datetime(df['month'], errors='coerce', format='%Y-%m')
-        df = df.dropna(subset=['month'])
+        with db_connection() as conn:
+            df = StorageUtils._read_monthly_agg(conn, table_name)
         
-        return df
+        return df[['month', 'container_count']]
 
 class StorageCostAnalysisWindow(QDialog):
     def __init__(self, table_name, parent=None, tab_info=None):
@@ -1332,6 +3049,16 @@ class StorageCostAnalysisWindow(QDialog):
         apply_button.clicked.connect(self.update_analysis)
         date_filter_layout.addWidget(apply_button)
 
+        # 일별 비용 발생 곡선 버튼
+        daily_button = QPushButton("Daily Accrual")
+        daily_button.clicked.connect(self.plot_daily_accrual)
+        date_filter_layout.addWidget(daily_button)
+
+        # 체류일수 구간별 분포 버튼
+        bucket_button = QPushButton("Dwell Buckets")
+        bucket_button.clicked.connect(self.plot_dwell_buckets)
+        date_filter_layout.addWidget(bucket_button)
+
         analysis_layout.addLayout(date_filter_layout)
 
         # 분석 결과를 표시할 테이블 위젯
@@ -1416,30 +3143,11 @@ class StorageCostAnalysisWindow(QDialog):
     def load_data(self):
         try:
             if self.table_name == "all_tables":
-                # 모든 테이블의 데이터 합치기
-                storage_data = pd.DataFrame()
-                dd_data = pd.DataFrame()
-                
-                for table_name in self.tab_info.values():
-                    # 각 테이블의 데이터 가져오기
-                    table_storage = StorageUtils.get_monthly_storage_data(table_name)
-                    table_dd = StorageUtils.get_dd_container_data(table_name)
-                    
-                    storage_data = pd.concat([storage_data, table_storage], ignore_index=True)
-                    dd_data = pd.concat([dd_data, table_dd], ignore_index=True)
-                
-                # 월별로 데이터 집계
-                storage_data = storage_data.groupby('month').agg({
-                    'total_storage_cost': 'sum',
-                    'container_count': 'sum'
-                }).reset_index()
-                
-                dd_data = dd_data.groupby('month').agg({
-                    'dd_count': 'sum'
-                }).reset_index()
+                # 모든 테이블의 월별 합계를 한 번에 조회
+                merged_data = StorageUtils.get_monthly_storage_data_many(list(self.tab_info.values())).groupby(
+                    level='month')[['total_storage_cost', 'container_count', 'dd_count']].sum().reset_index()
                 
                 # DD 비율 계산
-                merged_data = pd.merge(storage_data, dd_data, on='month', how='left')
                 merged_data['dd_ratio'] = (merged_data['dd_count'] / merged_data['container_count'] * 100).fillna(0)
                 
                 # 테이블에 데이터 표시
@@ -1559,6 +3267,109 @@ class StorageCostAnalysisWindow(QDialog):
 
         self.canvas.draw()
 
+    def plot_daily_accrual(self):
+        """선택한 기간의 일별 비용 발생 곡선 표시 (무료 기간을 넘긴 컨테이너 수 / 그 날 발생한 비용)"""
+        try:
+            start_date = self.start_date.date().toPyDate().strftime('%Y-%m-%d')
+            end_date = self.end_date.date().toPyDate().strftime('%Y-%m-%d')
+            tables = list(self.tab_info.values()) if self.table_name == "all_tables" else [self.table_name]
+
+            daily = StorageUtils.get_daily_storage_accrual(tables, start_date=start_date, end_date=end_date)
+            daily = daily.groupby('date')[['containers_over_free', 'accrued_cost']].sum().reset_index()
+            if daily.empty:
+                QMessageBox.warning(self, "Warning", "선택한 기간에 스토리지 비용 데이터가 없습니다.")
+                return
+
+            self.figure.clear()
+            ax1 = self.figure.add_subplot(111)
+            ax2 = ax1.twinx()
+
+            # 일별 발생 비용 (cyan) / 무료 기간을 넘긴 컨테이너 수 (yellow)
+            line = ax1.plot(daily['date'], daily['accrued_cost'], 'c-', label='Accrued Cost')
+            bars = ax2.bar(daily['date'], daily['containers_over_free'], width=1, alpha=0.2, color='yellow',
+                           label='Containers Over Free Days')
+            ax1.set_xlabel('Date', color='white')
+            ax1.set_ylabel('Accrued Cost per Day (MXN)', color='cyan')
+            ax2.set_ylabel('Containers Over Free Days', color='yellow')
+            ax1.set_title(f"Daily Storage Cost Accrual: {daily['accrued_cost'].sum():,.2f} MXN", color='white')
+
+            # 스타일링
+            self.figure.patch.set_facecolor('#19232D')
+            ax1.set_facecolor('#19232D')
+            ax1.tick_params(colors='white')
+            ax2.tick_params(colors='white')
+            for label in ax1.get_xticklabels():
+                label.set_rotation(45)
+
+            ax1.legend(line + [bars], ['Accrued Cost', 'Containers Over Free Days'], loc='upper left')
+            self.figure.tight_layout()
+            self.canvas.draw()
+
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"일별 비용 곡선 표시 중 오류 발생: {str(e)}")
+
+    def plot_dwell_buckets(self):
+        """선택한 기간의 체류일수 구간별 스토리지 비용 (선사 또는 목적항별 누적 막대) / 컨테이너 수 표시"""
+        try:
+            start_month = self.start_date.date().toPyDate().strftime('%Y-%m')
+            end_month = self.end_date.date().toPyDate().strftime('%Y-%m')
+            if self.table_name == "all_tables":
+                tables = list(self.tab_info.values())
+                # 테이블 이름 대신 탭 이름으로 표시
+                names = {table: tab for tab, table in self.tab_info.items()}
+                stack_by = 'table_name'
+            else:
+                tables = [self.table_name]
+                names = {}
+                stack_by = 'destinationport'
+
+            data = StorageUtils.get_dwell_bucket_data(tables, start_month=start_month, end_month=end_month)
+            if data.empty:
+                QMessageBox.warning(self, "Warning", "선택한 기간에 체류일수 데이터가 없습니다.")
+                return
+
+            labels = list(StorageCostEngine.DWELL_BUCKET_LABELS)
+            data[stack_by] = data[stack_by].fillna('Unknown').map(lambda name: names.get(name, name))
+            cost = data.pivot_table(index='bucket', columns=stack_by, values='storage_cost',
+                                    aggfunc='sum', fill_value=0).reindex(labels, fill_value=0)
+            count = data.groupby('bucket')['container_count'].sum().reindex(labels, fill_value=0)
+
+            self.figure.clear()
+            ax1 = self.figure.add_subplot(111)
+            ax2 = ax1.twinx()
+
+            # 구간별 비용 누적 막대
+            positions = np.arange(len(labels))
+            bottom = np.zeros(len(labels))
+            for name in cost.columns:
+                ax1.bar(positions, cost[name].to_numpy(), bottom=bottom, width=0.6, label=str(name))
+                bottom += cost[name].to_numpy()
+
+            # 구간별 컨테이너 수 (yellow)
+            ax2.plot(positions, count.to_numpy(), 'y-o', label='Container Count')
+            for x, y in zip(positions, count.to_numpy()):
+                ax2.annotate(f'{y:,}', (x, y), textcoords="offset points", xytext=(0, 8), ha='center', color='white')
+
+            ax1.set_xticks(positions)
+            ax1.set_xticklabels([f'{label} days' for label in labels])
+            ax1.set_xlabel('Dwell Time', color='white')
+            ax1.set_ylabel('Storage Cost (MXN)', color='white')
+            ax2.set_ylabel('Container Count', color='yellow')
+            ax1.set_title(f"Storage Cost by Dwell Time ({start_month} ~ {end_month})", color='white')
+
+            # 스타일링
+            self.figure.patch.set_facecolor('#19232D')
+            ax1.set_facecolor('#19232D')
+            ax1.tick_params(colors='white')
+            ax2.tick_params(colors='white')
+
+            ax1.legend(loc='upper left', fontsize=8)
+            self.figure.tight_layout()
+            self.canvas.draw()
+
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"체류일수 분포 표시 중 오류 발생: {str(e)}")
+
     def compare_months(self):
         """선택한 두 월의 데이터 비교"""
         month1 = self.month1_combo.currentText()
@@ -1624,29 +3435,11 @@ class StorageCostAnalysisWindow(QDialog):
             end_date = pd.to_datetime(self.end_date.date().toPyDate())
 
             if self.table_name == "all_tables":
-                # 모든 테이블의 데이터 합치기
-                storage_data = pd.DataFrame()
-                dd_data = pd.DataFrame()
-                
-                for table_name in self.tab_info.values():
-                    table_storage = StorageUtils.get_monthly_storage_data(table_name)
-                    table_dd = StorageUtils.get_dd_container_data(table_name)
-                    
-                    storage_data = pd.concat([storage_data, table_storage], ignore_index=True)
-                    dd_data = pd.concat([dd_data, table_dd], ignore_index=True)
-                
-                # 월별로 데이터 집계
-                storage_data = storage_data.groupby('month').agg({
-                    'total_storage_cost': 'sum',
-                    'container_count': 'sum'
-                }).reset_index()
-                
-                dd_data = dd_data.groupby('month').agg({
-                    'dd_count': 'sum'
-                }).reset_index()
+                # 모든 테이블의 월별 합계를 한 번에 조회
+                merged_data = StorageUtils.get_monthly_storage_data_many(list(self.tab_info.values())).groupby(
+                    level='month')[['total_storage_cost', 'container_count', 'dd_count']].sum().reset_index()
                 
                 # DD 비율 계산
-                merged_data = pd.merge(storage_data, dd_data, on='month', how='left')
                 merged_data['dd_ratio'] = (merged_data['dd_count'] / merged_data['container_count'] * 100).fillna(0)
                 
                 filtered_data = merged_data
@@ -1697,18 +3490,35 @@ class StorageCostAnalysisWindow(QDialog):
 
 
 # SQLite 데이터베이스에 연결하는 함수
-def connect_db():
+def sqlite_uri(path, mode):
+    """파일 경로를 SQLite URI로 변환 (UNC 경로는 file:////server/share/...)"""
+    path = os.path.abspath(path).replace('\\', '/')
+    quoted = urllib.parse.quote(path, safe='/:')
+    return f"file://{'' if quoted.startswith('/') else '/'}{quoted}?mode={mode}"
+
+
+def connect_db(path=None, profile="default"):
+    """
+    새 SQLite 연결을 여는 함수 (path가 없으면 db_file, profile: DB_PROFILES의 URI 모드 / PRAGMA 적용)
+    실패하면 0.25초부터 두 배씩 늘어나는 backoff로 최대 3번 시도 (작업자 스레드 / 명령줄 실행에서만)
+    GUI 스레드는 화면이 멈추지 않도록 한 번만 시도 (잠금 대기는 연결의 timeout / busy_timeout이 처리)
+    쿼리에서는 직접 부르지 말고 db_connection()으로 스레드별 공용 연결을 빌려 사용
+    """
+    path = path or db_file
+    settings = DB_PROFILES[profile]
     try:
-        # 최대 3번 재시도
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
+        gui_thread = not HEADLESS and threading.current_thread() is threading.main_thread()
+        max_retries = 1 if gui_thread else ConnectionManager.MAX_RETRIES
+        for retry_count in range(1, max_retries + 1):
             try:
-                conn = sqlite3.connect(db_file, timeout=20)  # timeout 값 증가
+                conn = sqlite3.connect(sqlite_uri(path, settings['mode']), uri=True,
+                                       timeout=ConnectionManager.TIMEOUT, check_same_thread=False)
+                for name, value in settings.get('pragmas', {}).items():
+                    if not re.fullmatch(r'\w+', name) or not re.fullmatch(r'[\w.-]+', str(value)):
+                        raise ValueError(f"Invalid PRAGMA in database profile '{profile}': {name}={value}")
+                    conn.execute(f"PRAGMA {name} = {value}")
                 return conn
             except sqlite3.OperationalError as e:
-                retry_count += 1
                 if retry_count == max_retries:
                     error_msg = f"""
                     Database connection failure ({retry_count}/{max_retries})
@@ -1720,20 +3530,254 @@ def connect_db():
                     
                     Error messages: {str(e)}
                     """
-                    QMessageBox.critical(None, "Database connection errors", error_msg)
+                    if not HEADLESS:
+                        QMessageBox.critical(None, "Database connection errors", error_msg)
                     raise
-                print(f"Connection retrying... ({retry_count}/{max_retries})")
-                time.sleep(2)  # 재시도 전 2초 대기
-                
+                delay = ConnectionManager.BACKOFF_BASE * 2 ** (retry_count - 1)
+                print(f"Connection retrying... ({retry_count}/{max_retries}, {delay:.2f}s)")
+                time.sleep(delay)
+
+    except sqlite3.OperationalError:
+        raise
     except Exception as e:
         error_msg = f"""
         An unexpected error occurred during the database connection.
         
         Error messages: {str(e)}
         """
-        QMessageBox.critical(None, "Error", error_msg)
+        if not HEADLESS:
+            QMessageBox.critical(None, "Error", error_msg)
         raise
 
+
+class ConnectionManager:
+    """
+    스레드마다 오래 유지되는 SQLite 연결을 (DB 파일, 연결 프로필)별로 하나씩 관리하는 클래스
+    (공유 폴더의 DB 파일을 쿼리마다 새로 여는 비용을 스레드당 한 번만 부담)
+    borrow()로 빌리고, HEALTH_CHECK_INTERVAL 이상 쉬었던 연결은 빌릴 때 확인해서 끊겼으면 다시 연결
+    persistent가 아닌 프로필 (writer)은 가장 바깥 borrow가 끝날 때 닫음
+    """
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.25  # 재시도 대기 (초): 0.25, 0.5, 1.0 ...
+    TIMEOUT = 20
+    HEALTH_CHECK_INTERVAL = 30.0  # 이 시간(초) 이상 쓰지 않은 연결은 빌릴 때 상태 확인
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _connections = {}  # (스레드 id, 경로, 프로필) -> 연결 (close_all용)
+    opened = 0
+
+    @classmethod
+    def _slots(cls):
+        """현재 스레드의 {(경로, 프로필): [연결, 빌린 깊이, 마지막 사용 시각, 오류 여부]}"""
+        if not hasattr(cls._local, 'slots'):
+            cls._local.slots = {}
+        return cls._local.slots
+
+    @staticmethod
+    def _healthy(conn):
+        """DB 파일 헤더를 읽는 가벼운 쿼리로 연결 상태 확인"""
+        try:
+            conn.execute("PRAGMA schema_version").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @classmethod
+    def _checkout(cls, key, slot):
+        """빌려줄 연결 준비 (없거나 끊긴 연결은 새로 엶)"""
+        conn = slot[0]
+        # close_all로 이미 닫힌 연결, 오류가 난 연결, 오래 쉬었고 상태 확인에 실패한 연결은 교체
+        closed = cls._connections.get((threading.get_ident(),) + key) is not conn
+        if conn is not None and (closed or slot[3] or (time.monotonic() - slot[2] >= cls.HEALTH_CHECK_INTERVAL
+                                                       and not cls._healthy(conn))):
+            print("Debug - Database connection lost, reconnecting")
+            cls._discard(key, slot)
+            conn = None
+        if conn is None:
+            conn = connect_db(*key)
+            slot[0], slot[3] = conn, False
+            with cls._lock:
+                cls._connections[(threading.get_ident(),) + key] = conn
+                cls.opened += 1
+        return conn
+
+    @classmethod
+    def _discard(cls, key, slot):
+        with cls._lock:
+            cls._connections.pop((threading.get_ident(),) + key, None)
+        try:
+            slot[0].close()
+        except sqlite3.Error:
+            pass
+        slot[0] = None
+
+    @classmethod
+    @contextmanager
+    def borrow(cls, path=None, profile="default"):
+        """
+        현재 스레드의 공용 연결을 빌려주는 컨텍스트 매니저 (같은 스레드 안에서 중첩하면 같은 연결)
+        가장 바깥 borrow가 끝날 때 커밋하지 않은 변경은 롤백 (기존 conn.close()와 같은 동작)
+        """
+        key = (path or db_file, profile)
+        slot = cls._slots().setdefault(key, [None, 0, 0.0, False])
+        conn = cls._checkout(key, slot) if slot[1] == 0 else slot[0]
+        slot[1] += 1
+        try:
+            yield conn
+        except (sqlite3.OperationalError, sqlite3.InterfaceError):
+            # 네트워크 끊김 등으로 연결을 더 쓸 수 없으면 다음에 빌릴 때 다시 연결
+            if not cls._healthy(conn):
+                slot[3] = True
+            raise
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                slot[2] = time.monotonic()
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except sqlite3.Error:
+                    slot[3] = True
+                if slot[3] or not DB_PROFILES[profile].get('persistent', True):
+                    cls._discard(key, slot)
+
+    @classmethod
+    def close_current(cls):
+        """현재 스레드의 연결을 모두 닫음 (작업자 스레드 종료 시)"""
+        slots = cls._slots()
+        for key, slot in list(slots.items()):
+            if slot[0] is not None and slot[1] == 0:
+                cls._discard(key, slot)
+                del slots[key]
+
+    @classmethod
+    def close_all(cls):
+        """모든 스레드의 연결을 닫음 (프로그램 종료 시)"""
+        with cls._lock:
+            connections = list(cls._connections.values())
+            cls._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        cls._local.slots = {}
+
+
+class DatabaseReplica:
+    """
+    공유 폴더 master_database.db의 로컬 읽기 전용 복제본 (replica_dir)
+    원본의 수정 시각 / 크기 / Log updated_at 중 하나라도 바뀌었을 때만 SQLite backup API로 복사
+    복제본이 준비되면 읽기는 복제본에서, 쓰기 (db_connection(write=True))는 계속 원본에서 수행
+    원본에 연결할 수 없을 때도 마지막 복제본으로 읽기는 계속 가능
+    """
+    REFRESH_INTERVAL = 60  # 자동 동기화 확인 간격 (초)
+
+    enabled = False
+    source = None  # 복제본을 만든 원본 경로 (db_file이 바뀌면 원본에서 직접 읽음)
+    _signature = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def replica_path():
+        return os.path.join(replica_dir, os.path.basename(db_file))
+
+    @classmethod
+    def read_path(cls):
+        """읽기 연결에 사용할 DB 경로 (복제본을 쓸 수 없으면 원본)"""
+        if cls.enabled and cls.source == db_file:
+            return cls.replica_path()
+        return db_file
+
+    @staticmethod
+    def _read_log(conn):
+        """Log 테이블의 updated_at 행 ({테이블: 시각}, 테이블이 없으면 빈 dict)"""
+        try:
+            cursor = conn.execute("SELECT * FROM Log WHERE field1 = 'updated_at'")
+            row = cursor.fetchone()
+            columns = [desc[0] for desc in cursor.description]
+        except sqlite3.OperationalError:
+            return {}
+        return {column: value for column, value in zip(columns, row or ()) if column != 'field1'}
+
+    @classmethod
+    def _load_signature(cls, path):
+        """이전 실행에서 저장한 복제본 서명 (<복제본>.json)"""
+        try:
+            with open(path + '.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def refresh(cls, force=False):
+        """
+        원본이 바뀌었으면 복제본을 다시 만드는 메서드 (원본에 연결할 수 없으면 기존 복제본 유지)
+        반환값: 복사하지 않았으면 None, 복사했으면 Log updated_at이 바뀐 테이블 목록
+        """
+        with cls._lock:
+            source, path = db_file, cls.replica_path()
+            try:
+                stat = os.stat(source)
+                with ConnectionManager.borrow(source, DB_READ_PROFILE) as src:
+                    log = cls._read_log(src)
+                    signature = {'mtime': stat.st_mtime, 'size': stat.st_size, 'updated_at': log}
+
+                    if cls._signature is None and cls.source is None and os.path.exists(path):
+                        cls._signature = cls._load_signature(path)
+                    if not force and signature == cls._signature and os.path.exists(path):
+                        cls.source = source
+                        return None
+
+                    os.makedirs(replica_dir, exist_ok=True)
+                    with ConnectionManager.borrow(path, DB_WRITE_PROFILE) as dst:
+                        src.backup(dst)
+            except (OSError, sqlite3.Error) as e:
+                # VPN 끊김 등: 이전 복제본이 있으면 읽기 전용으로 계속 사용
+                print(f"Debug - Replica refresh failed, using existing copy: {str(e)}")
+                if cls.source is None and os.path.exists(path):
+                    cls.source = source
+                return None
+
+            previous = (cls._signature or {}).get('updated_at') or {}
+            changed = [table for table, updated_at in log.items() if previous.get(table) != updated_at]
+            cls._signature, cls.source = signature, source
+            try:
+                with open(path + '.json', 'w', encoding='utf-8') as f:
+                    json.dump(signature, f)
+            except OSError:
+                pass
+            return changed
+
+
+class ReplicaRefreshWorker(QThread):
+    """DatabaseReplica.refresh를 GUI 밖에서 실행하는 작업자 스레드 (복사했으면 바뀐 테이블 목록 전달)"""
+    refreshed = pyqtSignal(list)
+
+    def run(self):
+        try:
+            changed = DatabaseReplica.refresh()
+            if changed is not None:
+                self.refreshed.emit(changed)
+        except Exception as e:
+            print(f"Error in replica worker thread: {str(e)}")
+        finally:
+            ConnectionManager.close_current()
+
+
+def db_connection(path=None, write=False):
+    """
+    스레드별 공용 DB 연결을 빌려 쓰는 컨텍스트 매니저 (with db_connection() as conn:)
+    읽기는 DB_READ_PROFILE 연결로, path가 없으면 로컬 복제본 (DatabaseReplica)에서
+    write=True이면 DB_WRITE_PROFILE 연결로 공유 폴더 원본에 씀
+    """
+    if write:
+        return ConnectionManager.borrow(path, DB_WRITE_PROFILE)
+    if path is None:
+        path = DatabaseReplica.read_path()
+    return ConnectionManager.borrow(path, DB_READ_PROFILE)
+
 class CustomFilterProxyModel(QSortFilterProxyModel):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -1764,7 +3808,7 @@ class DataDisplayWindow(QDialog):
         
         # 윈도우 플래그 설정 - 기본 윈도우 컨트롤 활성화
         self.setWindowFlags(Qt.Window | Qt.WindowMinMaxButtonsHint | Qt.WindowCloseButtonHint)
-        self.df = df  
+        self.df = DateNormalizer.drop_columns(df)
         
         # 메인 레이아웃
         main_layout = QVBoxLayout()
@@ -2290,17 +4334,9 @@ class ShippingLineDataDisplayWindow(QDialog):
 
     def send_email(self):
         # 데이터베이스에서 원본 shipping line 이름들 가져오기
-        conn = connect_db()
-        cursor = conn.cursor()
-        
-        original_shipping_lines = []
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'table%'")
-        tables = cursor.fetchall()
-        
-        for (table_name,) in tables:
-            cursor.execute(f"SELECT DISTINCT shippingline FROM [{table_name}]")
-            shipping_lines = cursor.fetchall()
-            original_shipping_lines.extend([sl[0] for sl in shipping_lines if sl[0]])
+        with db_connection() as conn:
+            tables = ContainerStore.division_tables(conn)
+            original_shipping_lines = ContainerStore.distinct(conn, 'shippingline', tables)
         
         # 매칭되는 원본 shipping line 이름들 찾기
         matching_shipping_lines = [
@@ -2365,6 +4401,8 @@ class ShippingLineDataDisplayWindow(QDialog):
     def send_email_via_outlook(self, recipient_emails, cc_emails, subject, body, attachment_path):
         
         try:
+            # Outlook 전송에만 필요하므로 여기서 import (명령줄 실행은 pywin32 없이도 동작)
+            import win32com.client
             outlook = win32com.client.Dispatch('Outlook.Application')
             mail = outlook.CreateItem(0)  # 0: MailItem
 
@@ -2392,14 +4430,13 @@ class ShippingLineDataDisplayWindow(QDialog):
         """
         #contact_db_path = r"C:\Users\SyncthingServiceAcct\test\aiden\Vessel contact.db"
         try:
-            conn = sqlite3.connect(contact_db_path)
-            cursor = conn.cursor()
+            with db_connection(contact_db_path) as conn:
+                cursor = conn.cursor()
 
-            # 'VESSEL CONTACT' 테이블에서 모든 행을 조회
-            query = "SELECT [HAPAG LLOYD], [HYUNDAI], [MAERSK], [MSC], [ONE], [CC] FROM [VESSEL CONTACT]"
-            cursor.execute(query)
-            results = cursor.fetchall()
-            conn.close()
+                # 'VESSEL CONTACT' 테이블에서 모든 행을 조회
+                query = "SELECT [HAPAG LLOYD], [HYUNDAI], [MAERSK], [MSC], [ONE], [CC] FROM [VESSEL CONTACT]"
+                cursor.execute(query)
+                results = cursor.fetchall()
 
             to_emails = []
             cc_emails = []
@@ -2642,20 +4679,10 @@ class OriginWindow(QDialog):
     def update_destination_ports(self):
         """Destination Ports 목록 업데이트"""
         try:
-            conn = connect_db()
-            cursor = conn.cursor()
-            
-            # 모든 테이블에서 unique한 destinationport 값들을 가져옴
-            all_ports = set()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'table%'")
-            tables = cursor.fetchall()
-            
-            for (table_name,) in tables:
-                cursor.execute(f"SELECT DISTINCT destinationport FROM [{table_name}]")
-                ports = cursor.fetchall()
-                all_ports.update([port[0] for port in ports if port[0]])
-            
-            conn.close()
+            with db_connection() as conn:
+                # 모든 테이블에서 unique한 destinationport 값들을 가져옴
+                tables = ContainerStore.division_tables(conn)
+                all_ports = set(ContainerStore.distinct(conn, 'destinationport', tables))
             
             # 정렬하여 리스트에 추가
             sorted_ports = sorted(all_ports)
@@ -2693,73 +4720,54 @@ class OriginWindow(QDialog):
             end_date = self.end_date_edit.date().toString("yyyy-MM-dd")
             
             # 데이터베이스에서 모든 원본 값들을 가져오기
-            conn = connect_db()
-            cursor = conn.cursor()
+            with db_connection() as conn:
+                # 모든 테이블에서 unique한 origin과 shipping line 값들을 가져옴
+                tables = ContainerStore.division_tables(conn)
+                original_origins = ContainerStore.distinct(conn, 'origin', tables)
+                original_shipping_lines = ContainerStore.distinct(conn, 'shippingline', tables)
             
-            # 모든 테이블에서 unique한 origin과 shipping line 값들을 가져옴
-            original_origins = []
-            original_shipping_lines = []
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'table%'")
-            tables = cursor.fetchall()
-            
-            for (table_name,) in tables:
-                # Origin 값들 가져오기
-                cursor.execute(f"SELECT DISTINCT origin FROM [{table_name}]")
-                origins = cursor.fetchall()
-                original_origins.extend([origin[0] for origin in origins if origin[0]])
-                
-                # Shipping Line 값들 가져오기
-                cursor.execute(f"SELECT DISTINCT shippingline FROM [{table_name}]")
-                shipping_lines = cursor.fetchall()
-                original_shipping_lines.extend([sl[0] for sl in shipping_lines if sl[0]])
-            
-            # 중복 제거
-            original_origins = list(set(original_origins))
-            original_shipping_lines = list(set(original_shipping_lines))
-            
-            # 매칭되는 원본 값들 찾기
-            matching_origins = [
-                orig for orig in original_origins 
-                if Mapping.standardize_origin_name(orig) == mapped_origin
-            ]
+                # 매칭되는 원본 값들 찾기
+                matching_origins = [
+                    orig for orig in original_origins 
+                    if Mapping.standardize_origin_name(orig) == mapped_origin
+                ]
             
-            matching_shipping_lines = [
-                sl for sl in original_shipping_lines 
-                if Mapping.standardize_shipping_line_name(sl) == mapped_shipping_line
-            ]
+                matching_shipping_lines = [
+                    sl for sl in original_shipping_lines 
+                    if Mapping.standardize_shipping_line_name(sl) == mapped_shipping_line
+                ]
             
-            if not matching_origins:
-                matching_origins = [mapped_origin]
-            if not matching_shipping_lines:
-                matching_shipping_lines = [mapped_shipping_line]
+                if not matching_origins:
+                    matching_origins = [mapped_origin]
+                if not matching_shipping_lines:
+                    matching_shipping_lines = [mapped_shipping_line]
             
-            # 데이터 검색
-            all_data = []
-            for (table_name,) in tables:
+                # 데이터 검색 (마이그레이션된 DB는 containers 한 번 조회)
+                all_data = []
                 origin_placeholders = ','.join(['?' for _ in matching_origins])
                 shipping_placeholders = ','.join(['?' for _ in matching_shipping_lines])
                 port_placeholders = ','.join(['?' for _ in selected_ports])
-                query = f"""
-                SELECT *, '{table_name}' as source_table
-                FROM [{table_name}]
-                WHERE [origin] IN ({origin_placeholders})
-                AND [shippingline] IN ({shipping_placeholders})
-                AND [destinationport] IN ({port_placeholders})
-                AND date([etaport]) BETWEEN ? AND ?
+                where = f"""
+                    [origin] IN ({origin_placeholders})
+                    AND [shippingline] IN ({shipping_placeholders})
+                    AND [destinationport] IN ({port_placeholders})
+                    AND date([etaport]) BETWEEN ? AND ?
                 """
+                params = matching_origins + matching_shipping_lines + selected_ports + [start_date, end_date]
                 try:
-                    params = matching_origins + matching_shipping_lines + selected_ports + [start_date, end_date]
-                    df = pd.read_sql(query, conn, params=params)
+                    frames = ContainerStore.read_divisions(conn, tables, where, params)
+                except Exception as e:
+                    print(f"Error querying division tables: {str(e)}")
+                    frames = {}
+
+                for table_name, df in frames.items():
                     # 빈 데이터프레임이 아닐 때만 추가
                     if not df.empty:
                         # NA 값이 있는 컬럼 처리
                         df = df.dropna(how='all', axis=1)  # 모든 값이 NA인 컬럼 제거
+                        df['source_table'] = table_name
                         all_data.append(df)
-                except Exception as e:
-                    print(f"Error querying {table_name}: {str(e)}")
-                    continue
 
-            conn.close()
 
             if all_data:
                 # 빈 데이터프레임이 없는 상태에서만 concat 실행
@@ -2877,19 +4885,7 @@ class MainWindow(QMainWindow):
         self.tabs = QTabWidget()
 
         # 탭 이름과 테이블 이름 매핑
-        self.tab_info = {
-            "WM": "table1",
-            "AC": "table2",
-            "AV_AO": "table3",
-            "REF": "table4",
-            "MWO": "table5",
-            "DW": "table6",
-            "MN": "table7",
-            "TV": "table8",
-            "RB": "table9",
-            "JEM": "table10",
-            "FCL": "table11"
-        }
+        self.tab_info = dict(TAB_INFO)
 
         # 각각의 Tab 생성
         self.tab_widgets = {}
@@ -2953,12 +4949,38 @@ class MainWindow(QMainWindow):
         # 전체 스토리지 비용 차트 표시
         self.show_combined_storage_cost_chart()
 
+        # 예상 스토리지 비용 조회 작업자 / 결과 창
+        self.storage_cost_worker = None
+        self.data_window = None
+
+        # 로컬 복제본 주기적 동기화 (원본이 바뀌었을 때만 복사)
+        self.replica_worker = None
+        self.replica_timer = QTimer(self)
+        self.replica_timer.timeout.connect(self.refresh_replica)
+        if DatabaseReplica.enabled:
+            self.replica_timer.start(DatabaseReplica.REFRESH_INTERVAL * 1000)
+
         # MainWindow 클래스의 __init__ 메서드에 추가
         kpi_menu = self.menuBar().addMenu('KPI')
         show_kpi_action = QAction('Show KPI Dashboard', self)
         show_kpi_action.triggered.connect(self.show_kpi_dashboard)
         kpi_menu.addAction(show_kpi_action)
 
+    def refresh_replica(self):
+        """복제본 동기화 작업자 시작 (이전 작업이 아직 실행 중이면 건너뜀)"""
+        if self.replica_worker is not None and self.replica_worker.isRunning():
+            return
+        self.replica_worker = ReplicaRefreshWorker(self)
+        self.replica_worker.refreshed.connect(self.on_replica_refreshed)
+        self.replica_worker.start()
+
+    def on_replica_refreshed(self, changed_tables):
+        """다른 사용자의 업로드가 복제본에 반영되면 바뀐 탭만 다시 그림"""
+        StorageResultCache.apply_upload(changed_tables, [])
+        changed = [table for table in changed_tables if table in self.tab_widgets]
+        if changed:
+            self.reload_data(changed)
+
     def show_kpi_dashboard(self):
         """KPI 대시보드 표시"""
         password_dialog = KPIPasswordDialog(self)
@@ -3018,10 +5040,9 @@ class MainWindow(QMainWindow):
         self.division_list_view.setMaximumWidth(120)  # 리스트 최대 너비 제한
         
         # Billing_storage 테이블에서 디비전 목록 가져오기
-        conn = sqlite3.connect(db_file)
-        query = "SELECT DISTINCT [divlgems] FROM Billing_storage"
-        df_divisions = pd.read_sql(query, conn)
-        conn.close()
+        with db_connection() as conn:
+            query = "SELECT DISTINCT [divlgems] FROM Billing_storage"
+            df_divisions = pd.read_sql(query, conn)
 
         divisions = df_divisions['divlgems'].dropna().tolist()
         divisions.sort()
@@ -3107,9 +5128,8 @@ class MainWindow(QMainWindow):
                 self.billing_canvas.draw()
                 return
                 
-            conn = sqlite3.connect(db_file)
-            df = pd.read_sql("SELECT * FROM Billing_storage", conn)
-            conn.close()
+            with db_connection() as conn:
+                df = pd.read_sql("SELECT * FROM Billing_storage", conn)
 
             if df.empty:
                 QMessageBox.warning(self, "Warning", "No data available")
@@ -3455,7 +5475,7 @@ class MainWindow(QMainWindow):
         # **'데이터 갱신' 액션 생성**
         reload_action = QAction("Reload", self)
         reload_action.setShortcut("Ctrl+R")  # 단축키 설정 (선택 사항)
-        reload_action.triggered.connect(self.reload_data)
+        reload_action.triggered.connect(lambda: self.reload_data())
 
         # 'File' 메뉴에 액션 추가
         file_menu.addAction(upload_action)
@@ -3468,22 +5488,22 @@ class MainWindow(QMainWindow):
         데이터베이스의 table1부터 table11까지의 데이터를 하나의 마스터 엑셀 파일로 추출하는 기능.
         """
         try:
-            conn = connect_db()
             table_names = list(self.tab_info.values())  # ['table1', 'table2', ..., 'table11']
+            with db_connection() as conn:
+                # 마이그레이션된 DB는 containers 한 번 조회로 모든 디비전을 읽음
+                frames = ContainerStore.read_divisions(conn, table_names)
             df_list = []
             columns_list = []
 
             # table1의 컬럼 순서를 가져오기 위해 먼저 table1을 처리
             table1 = table_names[0]  # assuming 'table1' is the first in the list
-            query_table1 = f"SELECT * FROM {table1}"
-            df_table1 = pd.read_sql(query_table1, conn)
+            df_table1 = DateNormalizer.drop_columns(frames[table1])
             df_list.append(df_table1)
             columns_list.append(set(df_table1.columns.tolist()))
 
             # 나머지 테이블 처리
             for table in table_names[1:]:
-                query = f"SELECT * FROM {table}"
-                df = pd.read_sql(query, conn)
+                df = DateNormalizer.drop_columns(frames[table])
                 df_list.append(df)
                 columns_list.append(set(df.columns.tolist()))
 
@@ -3495,7 +5515,6 @@ class MainWindow(QMainWindow):
 
             if not common_columns:
                 QMessageBox.warning(self, "Warning", "No common columns found.")
-                conn.close()
                 return
 
             # 공통 컬럼을 table1의 순서대로 정리
@@ -3531,8 +5550,6 @@ class MainWindow(QMainWindow):
             # 컬럼 순서 재정렬
             master_df = master_df[final_column_order]
 
-            conn.close()
-
             if master_df.empty:
                 QMessageBox.information(self, "Information", "No data to include in the master Excel.")
                 return
@@ -3562,18 +5579,17 @@ class MainWindow(QMainWindow):
 
     def export_shipping_line_report(self):
         try:
-            conn = connect_db()
-            shipping_lines_set = set()
-            shipping_line_mapping = {}
-            for table_name in self.tab_info.values():
-                query = f"SELECT DISTINCT [shippingline] FROM {table_name}"
-                df = pd.read_sql(query, conn)
-                for original_name in df['shippingline'].dropna().tolist():
-                    standardized_name = self.standardize_shipping_line_name(original_name)
-                    shipping_lines_set.add(standardized_name)
-                    shipping_line_mapping[standardized_name] = shipping_line_mapping.get(standardized_name, []) + [
-                        original_name]
-            conn.close()
+            with db_connection() as conn:
+                shipping_lines_set = set()
+                shipping_line_mapping = {}
+                for table_name in self.tab_info.values():
+                    query = f"SELECT DISTINCT [shippingline] FROM {table_name}"
+                    df = pd.read_sql(query, conn)
+                    for original_name in df['shippingline'].dropna().tolist():
+                        standardized_name = self.standardize_shipping_line_name(original_name)
+                        shipping_lines_set.add(standardized_name)
+                        shipping_line_mapping[standardized_name] = shipping_line_mapping.get(standardized_name, []) + [
+                            original_name]
 
             if not shipping_lines_set:
                 QMessageBox.information(self, "Information", "No shipping line data in the database.")
@@ -3598,55 +5614,54 @@ class MainWindow(QMainWindow):
 
     def export_data_for_shipping_line(self, shipping_line, original_names):
         try:
-            conn = connect_db()
-            selected_columns = [
-                'division',
-                'portofloading',
-                'destinationport',
-                'terminal',
-                'vessel',
-                'mbl',
-                'container',
-                'modality',
-                'urgentcargo',
-                'etaport',
-                'unloadingterminal',
-                'terminalappointment',
-                'f.dest',
-                'eta',
-                'shippingline'  # shippingline 컬럼 포함
-            ]
-            df_list = []
-            cursor = conn.cursor()
-
-            for table_name in self.tab_info.values():
-                # 테이블의 컬럼 정보 가��오기
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns_info = cursor.fetchall()
-                table_columns = [info[1] for info in columns_info]
-
-                if 'shippingline' not in table_columns:
-                    # shippingline 컬럼이 없는 테이블은 제외
-                    continue
+            with db_connection() as conn:
+                selected_columns = [
+                    'division',
+                    'portofloading',
+                    'destinationport',
+                    'terminal',
+                    'vessel',
+                    'mbl',
+                    'container',
+                    'modality',
+                    'urgentcargo',
+                    'etaport',
+                    'unloadingterminal',
+                    'terminalappointment',
+                    'f.dest',
+                    'eta',
+                    'shippingline'  # shippingline 컬럼 포함
+                ]
+                df_list = []
+                cursor = conn.cursor()
 
-                # shippingline 컬럼이 있는 경우: 선사에 해당하는 ���이터 필터링
-                placeholders = ','.join(['?'] * len(original_names))
-                query = f"""
-                    SELECT * FROM {table_name}
-                    WHERE UPPER(TRIM([shippingline])) IN ({placeholders})
-                """
-                cleaned_original_names = [name.strip().upper() for name in original_names]
-                df = pd.read_sql(query, conn, params=cleaned_original_names)
+                for table_name in self.tab_info.values():
+                    # 테이블의 컬럼 정보 가��오기
+                    cursor.execute(f"PRAGMA table_info({table_name})")
+                    columns_info = cursor.fetchall()
+                    table_columns = [info[1] for info in columns_info]
+
+                    if 'shippingline' not in table_columns:
+                        # shippingline 컬럼이 없는 테이블은 제외
+                        continue
+
+                    # shippingline 컬럼이 있는 경우: 선사에 해당하는 ���이터 필터링
+                    placeholders = ','.join(['?'] * len(original_names))
+                    query = f"""
+                        SELECT * FROM {table_name}
+                        WHERE UPPER(TRIM([shippingline])) IN ({placeholders})
+                    """
+                    cleaned_original_names = [name.strip().upper() for name in original_names]
+                    df = pd.read_sql(query, conn, params=cleaned_original_names)
 
-                if not df.empty:
-                    # 필요한 컬럼만 선택하고, 없는 컬럼은 NaN으로 채움
-                    for col in selected_columns:
-                        if col not in df.columns:
-                            df[col] = np.nan  # 또는 공란으로 채우려면 ''
-                    df = df[selected_columns]
-                    df_list.append(df)
+                    if not df.empty:
+                        # 필요한 컬럼만 선택하고, 없는 컬럼은 NaN으로 채움
+                        for col in selected_columns:
+                            if col not in df.columns:
+                                df[col] = np.nan  # 또는 공란으로 채우려면 ''
+                        df = df[selected_columns]
+                        df_list.append(df)
 
-            conn.close()
 
             if not df_list:
                 QMessageBox.information(self, "Information", f"No data for shipping line '{shipping_line}'.")
@@ -3689,14 +5704,13 @@ class MainWindow(QMainWindow):
 
     def get_last_update_time(self, table_name):
         try:
-            conn = connect_db()
-            cursor = conn.cursor()
+            with db_connection() as conn:
+                cursor = conn.cursor()
 
-            # Log 테이블에서 해당 테이블의 마지막 업데이트 시간 가져오기
-            cursor.execute("SELECT {} FROM Log WHERE field1 = 'updated_at'".format(table_name))
-            result = cursor.fetchone()
+                # Log 테이블에서 해당 테이블의 마지막 업데이트 시간 가져오기
+                cursor.execute("SELECT {} FROM Log WHERE field1 = 'updated_at'".format(table_name))
+                result = cursor.fetchone()
 
-            conn.close()
 
             # 결과가 없으면 '없음'을 반환
             if result and result[0]:
@@ -3740,13 +5754,12 @@ class MainWindow(QMainWindow):
         combo_box = QComboBox()
 
         # 'destinationport' 콤보박스 추가
-        conn = connect_db()
-        query = f"""
-            SELECT DISTINCT [destinationport] FROM {table_name}
-            WHERE [destinationport] IS NOT NULL
-        """
-        df_ports = pd.read_sql(query, conn)
-        conn.close()
+        with db_connection() as conn:
+            query = f"""
+                SELECT DISTINCT [destinationport] FROM {table_name}
+                WHERE [destinationport] IS NOT NULL
+            """
+            df_ports = pd.read_sql(query, conn)
         ports = sorted(df_ports['destinationport'])
         combo_box.addItems(ports)
         donut_layout.addWidget(combo_box)
@@ -3776,15 +5789,15 @@ class MainWindow(QMainWindow):
         delay_donut_layout = QVBoxLayout()
 
         # 월 선택 콤보박스 생성
-        conn = connect_db()
-        query_months = f"""
-                SELECT DISTINCT strftime('%Y-%m', date([etaport])) AS month
-                FROM {table_name}
-                WHERE [initialeta] IS NOT NULL AND [etaport] IS NOT NULL AND date([etaport]) != date([initialeta])
-                ORDER BY month
-            """
-        df_months = pd.read_sql(query_months, conn)
-        conn.close()
+        with db_connection() as conn:
+            dates, days = DateNormalizer.sql(conn, table_name)
+            query_months = f"""
+                    SELECT DISTINCT substr({dates['etaport']}, 1, 7) AS month
+                    FROM {table_name}
+                    WHERE [initialeta] IS NOT NULL AND [etaport] IS NOT NULL AND {days['etaport']} != {days['initialeta']}
+                    ORDER BY month
+                """
+            df_months = pd.read_sql(query_months, conn)
         months = df_months['month'].dropna().tolist()
 
         month_combo_box = QComboBox()
@@ -3854,21 +5867,21 @@ class MainWindow(QMainWindow):
         }
 
     def show_vessel_delay_donut_chart(self, table_name, selected_month, figure, canvas):
-        try:
-            conn = connect_db()
-            # 선택된 월에 대한 vesseldelayreason별 개수 조회
-            query = f"""
-            SELECT COALESCE(NULLIF(TRIM([vesseldelayreason]), ''), 'Others') as vesseldelayreason, COUNT(*) as count
-            FROM {table_name}
-            WHERE 
-                [initialeta] IS NOT NULL
-                AND [etaport] IS NOT NULL
-                AND date([etaport]) > date([initialeta])
-                AND strftime('%Y-%m', date([etaport])) = ?
-            GROUP BY vesseldelayreason
-            """
-            df = pd.read_sql(query, conn, params=(selected_month,))
-            conn.close()
+        try:
+            with db_connection() as conn:
+                dates, days = DateNormalizer.sql(conn, table_name)
+                # 선택된 월에 대한 vesseldelayreason별 개수 조회
+                query = f"""
+                SELECT COALESCE(NULLIF(TRIM([vesseldelayreason]), ''), 'Others') as vesseldelayreason, COUNT(*) as count
+                FROM {table_name}
+                WHERE 
+                    [initialeta] IS NOT NULL
+                    AND [etaport] IS NOT NULL
+                    AND {days['etaport']} > {days['initialeta']}
+                    AND substr({dates['etaport']}, 1, 7) = ?
+                GROUP BY vesseldelayreason
+                """
+                df = pd.read_sql(query, conn, params=(selected_month,))
 
             if not df.empty:
                 reasons = df['vesseldelayreason'].fillna('Others').tolist()
@@ -4016,24 +6029,24 @@ class MainWindow(QMainWindow):
     def open_delay_detail_window(self, selected_month, table_name):
         try:
             self.current_table_name = table_name  # 현재 테이블 이름 저장
-            conn = connect_db()
+            with db_connection() as conn:
+                dates, days = DateNormalizer.sql(conn, table_name)
 
-            # 쿼리 수정 - vesseldelayreason이 NULL이거나 빈 문자열인 경우도 포함
-            query = f"""
-            SELECT 
-                COALESCE(NULLIF(TRIM([vesseldelayreason]), ''), 'Others') as vesseldelayreason,
-                [initialeta], 
-                [etaport],
-                julianday([etaport]) - julianday([initialeta]) AS delay_days,
-                strftime('%Y-%m', date([etaport])) AS month
-            FROM {table_name}
-            WHERE [initialeta] IS NOT NULL
-            AND [etaport] IS NOT NULL
-            AND date([etaport]) > date([initialeta])
-            AND strftime('%Y-%m', date([etaport])) = ?
-            """
-            df = pd.read_sql(query, conn, params=(selected_month,))
-            conn.close()
+                # 쿼리 수정 - vesseldelayreason이 NULL이거나 빈 문자열인 경우도 포함
+                query = f"""
+                SELECT 
+                    COALESCE(NULLIF(TRIM([vesseldelayreason]), ''), 'Others') as vesseldelayreason,
+                    [initialeta], 
+                    [etaport],
+                    {days['etaport']} - {days['initialeta']} AS delay_days,
+                    substr({dates['etaport']}, 1, 7) AS month
+                FROM {table_name}
+                WHERE [initialeta] IS NOT NULL
+                AND [etaport] IS NOT NULL
+                AND {days['etaport']} > {days['initialeta']}
+                AND substr({dates['etaport']}, 1, 7) = ?
+                """
+                df = pd.read_sql(query, conn, params=(selected_month,))
 
             if not df.empty:
                 # 딜레이 일자 범주화
@@ -4138,44 +6151,45 @@ class MainWindow(QMainWindow):
 
     def show_detail_data(self, selected_month, delay_category, reason):
         try:
-            conn = connect_db()
-            # 딜레이 일자 범주에 따른 조건 설정
-            if delay_category == '3 days or less':
-                delay_condition = "(julianday([etaport]) - julianday([initialeta])) <= 3 AND (julianday([etaport]) - julianday([initialeta])) >= 1"
-            elif delay_category == '4 to 7 days':
-                delay_condition = "(julianday([etaport]) - julianday([initialeta])) >= 4 AND (julianday([etaport]) - julianday([initialeta])) <= 7"
-            elif delay_category == '7 days or more':
-                delay_condition = "(julianday([etaport]) - julianday([initialeta])) > 7"
-            else:
-                # Unknown 카테고리도 포함
-                delay_condition = "1=1"  # 모든 조건을 허용
+            with db_connection() as conn:
+                dates, days = DateNormalizer.sql(conn, self.current_table_name)
+                delay_days = f"({days['etaport']} - {days['initialeta']})"
+                # 딜레이 일자 범주에 따른 조건 설정
+                if delay_category == '3 days or less':
+                    delay_condition = f"{delay_days} <= 3 AND {delay_days} >= 1"
+                elif delay_category == '4 to 7 days':
+                    delay_condition = f"{delay_days} >= 4 AND {delay_days} <= 7"
+                elif delay_category == '7 days or more':
+                    delay_condition = f"{delay_days} > 7"
+                else:
+                    # Unknown 카테고리도 포함
+                    delay_condition = "1=1"  # 모든 조건을 허용
 
-            # reason이 'Unknown'인 경우와 아닌 경우에 대한 쿼리 조건 분리
-            if reason == 'Others':
-                reason_condition = "([vesseldelayreason] IS NULL OR TRIM([vesseldelayreason]) = '')"
-            else:
-                reason_condition = "[vesseldelayreason] = ?"
+                # reason이 'Unknown'인 경우와 아닌 경우에 대한 쿼리 조건 분리
+                if reason == 'Others':
+                    reason_condition = "([vesseldelayreason] IS NULL OR TRIM([vesseldelayreason]) = '')"
+                else:
+                    reason_condition = "[vesseldelayreason] = ?"
 
-            # 데이터베이스 쿼리
-            query = f"""
-            SELECT *
-            FROM {self.current_table_name}
-            WHERE {reason_condition}
-            AND [initialeta] IS NOT NULL
-            AND [etaport] IS NOT NULL
-            AND date([etaport]) != date([initialeta])
-            AND strftime('%Y-%m', date([etaport])) = ?
-            AND {delay_condition}
-            """
+                # 데이터베이스 쿼리
+                query = f"""
+                SELECT *
+                FROM {self.current_table_name}
+                WHERE {reason_condition}
+                AND [initialeta] IS NOT NULL
+                AND [etaport] IS NOT NULL
+                AND {days['etaport']} != {days['initialeta']}
+                AND substr({dates['etaport']}, 1, 7) = ?
+                AND {delay_condition}
+                """
 
-            # reason이 'Unknown'인 경우와 아닌 경우에 따라 파라미터 설정
-            if reason == 'Others':
-                params = (selected_month,)
-            else:
-                params = (reason, selected_month)
+                # reason이 'Unknown'인 경우와 아닌 경우에 따라 파라미터 설정
+                if reason == 'Others':
+                    params = (selected_month,)
+                else:
+                    params = (reason, selected_month)
 
-            df = pd.read_sql(query, conn, params=params)
-            conn.close()
+                df = pd.read_sql(query, conn, params=params)
 
             if not df.empty:
                 self.data_window = DataDisplayWindow(df, self)
@@ -4188,20 +6202,20 @@ class MainWindow(QMainWindow):
 
     def update_vessel_delay_report(self, table_name):
         try:
-            conn = connect_db()
+            with db_connection() as conn:
+                dates, days = DateNormalizer.sql(conn, table_name)
 
-            # DELAY 계산을 위한 쿼리
-            query = f"""
-            SELECT [initialeta], [etaport],
-                   julianday([etaport]) - julianday([initialeta]) AS delay_days
-            FROM {table_name}
-            WHERE [initialeta] IS NOT NULL
-            AND [etaport] IS NOT NULL
-            AND date([etaport]) != date([initialeta])  -- DELAY 조건: 두 날짜가 같지 않을 때
-            """
+                # DELAY 계산을 위한 쿼리
+                query = f"""
+                SELECT [initialeta], [etaport],
+                       {days['etaport']} - {days['initialeta']} AS delay_days
+                FROM {table_name}
+                WHERE [initialeta] IS NOT NULL
+                AND [etaport] IS NOT NULL
+                AND {days['etaport']} != {days['initialeta']}  -- DELAY 조건: 두 날짜가 같지 않을 때
+                """
 
-            df = pd.read_sql(query, conn)
-            conn.close()
+                df = pd.read_sql(query, conn)
 
             # DELAY 개수 (initialeta의 개수) 및 평균 DELAY 계산
             vessel_delay_count = df['initialeta'].count()  # DELAY로 간  [initialeta]의 개수
@@ -4281,10 +6295,9 @@ class MainWindow(QMainWindow):
         MASTER 버튼 클릭 시 테이블의 전체 데이터를 보여주는 창을 엽니다.
         """
         try:
-            conn = connect_db()
-            query = f"SELECT * FROM {table_name}"
-            df = pd.read_sql(query, conn)
-            conn.close()
+            with db_connection() as conn:
+                # 업로드 순서대로 표시 (마이그레이션된 DB는 containers rowid 순)
+                df = ContainerStore.read_divisions(conn, [table_name])[table_name]
 
             if not df.empty:
                 # 기존 창이 있다면 닫기
@@ -4303,184 +6316,258 @@ class MainWindow(QMainWindow):
 
     def show_estimated_storage_cost(self, table_name):
         """
-        스토리지 비용을 계산하고 표시하는 메서드
+        스토리지 비용을 계산하고 표시하는 메서드 (조회는 작업자 스레드에서 하고 도착한 월부터 탭 추가)
         """
         try:
-            # StorageUtils를 사용하여 개별 스토리지 비용 데이터 가져오기
-            storage_df = StorageUtils.get_individual_storage_data(table_name)
-            
-            if not storage_df.empty:
-                # 2024년 이후 데이터만 필터링
-                storage_df = storage_df[pd.to_datetime(storage_df['terminalappointment']).dt.year >= 2024]
-                
-                # storage_cost가 0보다 큰 데이터만 필터링
-                storage_df = storage_df[storage_df['storage_cost'] > 0]
-                
-                if storage_df.empty:
-                    QMessageBox.information(self, "Information", "No storage cost data after 2024.")
-                    return
-
-                # 필요한 칼럼만 선택
-                selected_columns = [
-                    'division',
-                    'remark',
-                    'delays/fee',
-                    'destinationport',
-                    'shippingline',
-                    'terminal',
-                    'origin',
-                    'container',
-                    'shippingdate',
-                    'initialeta',
-                    'etaport',
-                    'vesseldelayreason',
-                    'unloadingterminal',
-                    'terminalappointment',
-                    'eta',
-                    'month',
-                    'total_stay_days',
-                    'days_over',
-                    'storage_cost'
-                ]
-                storage_df = storage_df[selected_columns]
+            # 필요한 칼럼만 선택
+            selected_columns = [
+                'division',
+                'remark',
+                'delays/fee',
+                'destinationport',
+                'shippingline',
+                'terminal',
+                'origin',
+                'container',
+                'shippingdate',
+                'initialeta',
+                'etaport',
+                'vesseldelayreason',
+                'unloadingterminal',
+                'terminalappointment',
+                'eta',
+                'month',
+                'total_stay_days',
+                'days_over',
+                'storage_cost'
+            ]
+            computed_columns = ['month', 'total_stay_days', 'days_over', 'storage_cost']
+
+            # 이전 조회가 진행 중이면 취소하고 새 창에 표시
+            self._stop_storage_cost_worker()
+            self.data_window = None
+
+            # 2024년 이후 / storage_cost가 0보다 큰 데이터만 월별로 나눠 조회 (필터와 칼럼 선택은 쿼리에서 처리)
+            self.storage_cost_worker = StorageCostWorker(
+                table_name,
+                selected_columns,
+                [col for col in selected_columns if col not in computed_columns],
+                self
+            )
+            self.storage_cost_worker.month_ready.connect(self._add_storage_cost_month)
+            self.storage_cost_worker.no_data.connect(self._on_storage_cost_no_data)
+            self.storage_cost_worker.failed.connect(self._on_storage_cost_failed)
+            self.storage_cost_worker.start()
 
-                # 월별 데이터 분리
-                monthly_data = {
-                    str(month): group for month, group in storage_df.groupby('month')
-                }
-                
-                # 새로운 창에 데이터 표시 (윈도우 플래그 추가)
-                self.data_window = MonthlyDataWindow(monthly_data, self)
-                self.data_window.setWindowFlags(
-                    Qt.Window |  # 기본 윈도우
-                    Qt.WindowMinMaxButtonsHint |  # 최소화/최대화 버튼
-                    Qt.WindowCloseButtonHint |  # 닫기 버튼
-                    Qt.WindowSystemMenuHint  # 시스템 메뉴 (복사/붙여넣기 포함)
-                )
-                self.data_window.setModal(False)
-                # 클립보드 작업 활성화
-                self.data_window.setWindowFlag(Qt.WindowContextHelpButtonHint, False)
-                # 테이블 위젯에서 복사/붙여넣기 활성화
-                if hasattr(self.data_window, 'table_widget'):
-                    self.data_window.table_widget.setContextMenuPolicy(Qt.ActionsContextMenu)
-                    copy_action = QAction("Copy", self.data_window.table_widget)
-                    copy_action.setShortcut(QKeySequence.Copy)
-                    copy_action.triggered.connect(self.data_window.copy_selection)
-                    self.data_window.table_widget.addAction(copy_action)
-                
-                self.data_window.show()
-            else:
-                QMessageBox.information(self, "Information", "No containers with storage costs.")
-                
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred while loading data: {str(e)}")
 
+    def _add_storage_cost_month(self, month, df):
+        """월별 예상 스토리지 비용 탭 추가 (첫 번째 월이 도착하면 창 표시)"""
+        if self.data_window is None:
+            # 새로운 창에 데이터 표시 (윈도우 플래그 추가)
+            self.data_window = MonthlyDataWindow(parent=self)
+            self.data_window.setWindowFlags(
+                Qt.Window |  # 기본 윈도우
+                Qt.WindowMinMaxButtonsHint |  # 최소화/최대화 버튼
+                Qt.WindowCloseButtonHint |  # 닫기 버튼
+                Qt.WindowSystemMenuHint  # 시스템 메뉴 (복사/붙여넣기 포함)
+            )
+            self.data_window.setModal(False)
+            # 클립보드 작업 활성화
+            self.data_window.setWindowFlag(Qt.WindowContextHelpButtonHint, False)
+            # 창을 닫으면 남은 월 조회 취소
+            worker = self.storage_cost_worker
+            self.data_window.finished.connect(lambda _: worker.requestInterruption())
+            self.data_window.add_month(month, df)
+            self.data_window.show()
+        else:
+            self.data_window.add_month(month, df)
+
+    def _on_storage_cost_no_data(self):
+        QMessageBox.information(self, "Information", "No storage cost data after 2024.")
+
+    def _on_storage_cost_failed(self, message):
+        QMessageBox.critical(self, "Error", f"An error occurred while loading data: {message}")
+
+    def _stop_storage_cost_worker(self, wait=False):
+        """
+        진행 중인 예상 스토리지 비용 조회를 취소 (이후 결과는 무시)
+        wait=True이면 작업자의 조회 연결이 닫힐 때까지 대기
+        """
+        worker = self.storage_cost_worker
+        if worker is None:
+            return
+        for signal in (worker.month_ready, worker.no_data, worker.failed):
+            try:
+                signal.disconnect()
+            except TypeError:
+                pass
+        worker.requestInterruption()
+        if wait:
+            worker.wait()
+
     def upload_excel_file(self):
         try:
             file_path, _ = QFileDialog.getOpenFileName(self, "Select Excel File", "", "Excel Files (*.xlsx *.xls)")
             if file_path:
+                # 예상 스토리지 비용 조회가 진행 중이면 취소하고 읽기 연결이 닫힌 뒤 업로드
+                self._stop_storage_cost_worker(wait=True)
+
                 xls = pd.ExcelFile(file_path)
                 sheet_names = xls.sheet_names
                 sheet_to_table = {tab_name: table_name for tab_name, table_name in self.tab_info.items()}
                 sheet_to_table['Billing_storage'] = 'Billing_storage'
 
-                conn = connect_db()
-                cursor = conn.cursor()
-
-                # Log 테이블 존재 여부 확인 및 생성
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS Log (
-                        field1 TEXT,
-                        table1 TEXT,
-                        table2 TEXT,
-                        table3 TEXT,
-                        table4 TEXT,
-                        table5 TEXT,
-                        table6 TEXT,
-                        table7 TEXT,
-                        table8 TEXT,
-                        table9 TEXT,
-                        table10 TEXT
-                    )
-                """)
+                with db_connection(write=True) as conn:
+                    cursor = conn.cursor()
+                    changed_tables = []
+                    updated_tables = []
+                    # 테이블을 새로 만들었거나 정규화 컬럼을 추가한 경우에만 인덱스 / 정규화 점검
+                    schema_changed = False
 
-                # Log 테이블에 'updated_at' 행이 있는지 확인
-                cursor.execute("SELECT COUNT(*) FROM Log WHERE field1 = 'updated_at'")
-                count = cursor.fetchone()[0]
-                if count == 0:
-                    # 'updated_at' 이 없으면 추가
+                    # Log 테이블 존재 여부 확인 및 생성
                     cursor.execute("""
-                        INSERT INTO Log (field1) 
-                        VALUES ('updated_at')
+                        CREATE TABLE IF NOT EXISTS Log (
+                            field1 TEXT,
+                            table1 TEXT,
+                            table2 TEXT,
+                            table3 TEXT,
+                            table4 TEXT,
+                            table5 TEXT,
+                            table6 TEXT,
+                            table7 TEXT,
+                            table8 TEXT,
+                            table9 TEXT,
+                            table10 TEXT
+                        )
                     """)
-                    conn.commit()
-
-                for sheet_name in sheet_names:
-                    if sheet_name in sheet_to_table:
-                        table_name = sheet_to_table[sheet_name]
-
-                        # 1. 기존 테이블의 첫 번째 행과 컬럼 정보 가져오기
-                        cursor.execute(f"PRAGMA table_info({table_name})")
-                        columns_info = cursor.fetchall()
-                        db_columns = [column[1] for column in columns_info]
 
-                        cursor.execute(f"SELECT * FROM {table_name} LIMIT 1")
-                        first_row = cursor.fetchone()
-
-                        # 컬럼 수 확인 로직 추가
-                        if len(db_columns) != len(columns_info):
-                            QMessageBox.warning(self, "Warning", 
-                                f"Column count mismatch in sheet '{sheet_name}'. \n"
-                                f"Expected {len(db_columns)} columns, but got {len(columns_info)} columns.")
-                            continue
+                    # Log 테이블에 'updated_at' 행이 있는지 확인
+                    cursor.execute("SELECT COUNT(*) FROM Log WHERE field1 = 'updated_at'")
+                    count = cursor.fetchone()[0]
+                    if count == 0:
+                        # 'updated_at' 이 없으면 추가
+                        cursor.execute("""
+                            INSERT INTO Log (field1) 
+                            VALUES ('updated_at')
+                        """)
+                        conn.commit()
 
-                        # 컬럼 매핑 전에 유효성 검사
-                        try:
-                            df = pd.read_excel(xls, sheet_name=sheet_name, header=0)
-                            df.columns = db_columns[:len(df.columns)]
+                    for sheet_name in sheet_names:
+                        if sheet_name in sheet_to_table:
+                            table_name = sheet_to_table[sheet_name]
+
+                            # 1. 기존 테이블의 첫 번째 행과 컬럼 정보 가져오기
+                            cursor.execute(f"PRAGMA table_info({table_name})")
+                            columns_info = cursor.fetchall()
+                            db_columns = [column[1] for column in columns_info]
+
+                            cursor.execute(f"SELECT * FROM {table_name} LIMIT 1")
+                            first_row = cursor.fetchone()
+
+                            # 컬럼 수 확인 로직 추가
+                            if len(db_columns) != len(columns_info):
+                                QMessageBox.warning(self, "Warning", 
+                                    f"Column count mismatch in sheet '{sheet_name}'. \n"
+                                    f"Expected {len(db_columns)} columns, but got {len(columns_info)} columns.")
+                                continue
+
+                            # 컬럼 매핑 전에 유효성 검사
+                            try:
+                                df = pd.read_excel(xls, sheet_name=sheet_name, header=0)
+                                df.columns = db_columns[:len(df.columns)]
                             
-                            # destinationport 컬럼이 있는 경우 공백 제거
-                            if 'destinationport' in df.columns:
-                                df = df.copy()
-                                df['destinationport'] = df['destinationport'].astype(str).str.strip()
+                                # destinationport 컬럼이 있는 경우 공백 제거
+                                if 'destinationport' in df.columns:
+                                    df = df.copy()
+                                    df['destinationport'] = df['destinationport'].astype(str).str.strip()
                                 
-                        except Exception as e:
-                            QMessageBox.warning(self, "Warning", 
-                                f"Failed to map columns in sheet '{sheet_name}': {str(e)}")
-                            continue
-
-                        if first_row:
-                            # Fixed='F'가 아닌 데이터만 삭제
-                            cursor.execute(f"DELETE FROM {table_name} WHERE Fixed IS NULL OR Fixed != 'F'")
+                            except Exception as e:
+                                QMessageBox.warning(self, "Warning", 
+                                    f"Failed to map columns in sheet '{sheet_name}': {str(e)}")
+                                continue
+
+                            is_division = table_name in self.tab_info.values()
+                            # containers로 마이그레이션된 디비전은 뷰 대신 containers에 division 값과 함께 저장
+                            target, where, params = ContainerStore.target(conn, table_name)
+                            incremental = first_row is not None or target != table_name
+                            if incremental:
+                                # 변경된 월을 찾기 위해 삭제 전 행 보관
+                                if is_division:
+                                    StorageUtils.snapshot_upload_rows(conn, table_name)
+
+                                # Fixed='F'가 아닌 데이터만 삭제
+                                cursor.execute(f"DELETE FROM {target} WHERE {where} AND (Fixed IS NULL OR Fixed != 'F')", params)
+                                cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {target}")
+                                last_rowid = cursor.fetchone()[0]
                             
-                            # 새 데이터 삽입
-                            df.to_sql(table_name, conn, if_exists='append', index=False)
-                        else:
-                            # 테이블이 비어있는 경우
-                            # 기존 첫 번째 행 데이터를 가져와서 DataFrame 생성
-                            first_row_df = pd.DataFrame([first_row], columns=db_columns)
+                                # 새 데이터 삽입
+                                if target != table_name:
+                                    df = df.assign(**{ContainerStore.KEY: table_name})
+                                df.to_sql(target, conn, if_exists='append', index=False)
+                            else:
+                                # 테이블이 비어있는 경우
+                                # 기존 첫 번째 행 데이터를 가져와서 DataFrame 생성
+                                first_row_df = pd.DataFrame([first_row], columns=db_columns)
                             
-                            # 첫 번째 행과 새 데이터 결합
-                            df = pd.concat([first_row_df, df], ignore_index=True)
+                                # 첫 번째 행과 새 데이터 결합
+                                df = pd.concat([first_row_df, df], ignore_index=True)
                             
-                            # 전체 데이터 삽입
-                            df.to_sql(table_name, conn, if_exists='replace', index=False)
-
-                        # 현재 시간 업데이트
-                        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        cursor.execute(f"UPDATE Log SET {table_name} = ? WHERE field1 = 'updated_at'", (current_time,))
-                        conn.commit()
-
-                        # 업데이트 라벨 갱신
-                        if table_name in self.tab_widgets:
-                            tab = self.tab_widgets[table_name]
-                            tab["update_label"].setText(f"Last updated: {current_time}")
-                    else:
-                        QMessageBox.warning(self, "Warning", f"No tab for sheet '{sheet_name}'.")
+                                # 전체 데이터 삽입
+                                df.to_sql(table_name, conn, if_exists='replace', index=False)
+
+                            if is_division:
+                                # 날짜 컬럼 정규화 (ISO 날짜 + 정수 일련번호) - 추가된 행만, 테이블을 새로 만든 경우는 전체
+                                added = DateNormalizer.normalize(conn, table_name, last_rowid if incremental else None)
+                                if added or not incremental:
+                                    schema_changed = True
+
+                                # 변경된 월의 스토리지 집계만 갱신 (테이블을 새로 만든 경우는 전체 갱신)
+                                if incremental:
+                                    changed, months = StorageUtils.record_upload_changes(conn, table_name, last_rowid)
+                                else:
+                                    changed, months = True, None
+                                    StorageUtils.log_storage_changes(conn, table_name, [None])
+                                if changed:
+                                    changed_tables.append(table_name)
+                                    StorageUtils.refresh_monthly_storage_agg(conn, table_name, months)
+                                updated_tables.append(table_name)
+
+                            # 현재 시간 업데이트
+                            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                            cursor.execute(f"UPDATE Log SET {table_name} = ? WHERE field1 = 'updated_at'", (current_time,))
+                            conn.commit()
+
+                            # 업데이트 라벨 갱신
+                            if table_name in self.tab_widgets:
+                                tab = self.tab_widgets[table_name]
+                                tab["update_label"].setText(f"Last updated: {current_time}")
+                        else:
+                            QMessageBox.warning(self, "Warning", f"No tab for sheet '{sheet_name}'.")
+
+                    if schema_changed:
+                        # 아직 정규화되지 않은 테이블 처리
+                        DateNormalizer.ensure(conn, list(self.tab_info.values()))
+                        # to_sql로 새로 만든 테이블의 조회 인덱스 복구 / 통계 갱신
+                        QueryIndexes.ensure(conn, list(self.tab_info.values()))
+                    # 요금 규칙 테이블 / 아직 집계되지 않은 테이블 처리
+                    TariffRules.ensure(conn)
+                    StorageUtils.ensure_monthly_storage_agg(conn, list(self.tab_info.values()))
+
+                    # 데이터가 바뀐 지난 월의 KPI 스냅샷 갱신 (실패해도 KPI 창은 실시간 계산으로 동작)
+                    if changed_tables:
+                        try:
+                            KPISnapshot.backfill(conn, self.tab_info)
+                        except Exception as e:
+                            print(f"Debug - Error refreshing KPI snapshot: {str(e)}")
+                    conn.commit()
 
-                conn.close()
+                # 읽기용 복제본에 업로드 결과 반영 후 캐시 정리
+                DatabaseReplica.refresh()
+                StorageResultCache.apply_upload(changed_tables, updated_tables)
                 QMessageBox.information(self, "Success", "Excel file uploaded successfully.")
-                self.reload_data()
+                self.reload_data(changed_tables)
             else:
                 QMessageBox.warning(self, "Cancel", "Excel file upload canceled.")
 
@@ -4492,16 +6579,15 @@ class MainWindow(QMainWindow):
         Billing_storage 테이블을 업데이트하는 함수
         """
         try:
-            conn = sqlite3.connect(db_file)
+            with db_connection(write=True) as conn:
 
-            # 기존의 Billing_storage 테이블이 있으면 삭제하고 새로 만듭니다.
-            cursor = conn.cursor()
-            cursor.execute("DROP TABLE IF EXISTS Billing_storage")
+                # 기존의 Billing_storage 테이블이 있으면 삭제하고 새로 만듭니다.
+                cursor = conn.cursor()
+                cursor.execute("DROP TABLE IF EXISTS Billing_storage")
 
-            # DataFrame을 데이터베이스에 저장합니다.
-            df.to_sql('Billing_storage', conn, index=False)
+                # DataFrame을 데이터베이스에 저장합니다.
+                df.to_sql('Billing_storage', conn, index=False)
 
-            conn.close()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred while updating the Billing_storage table: {str(e)}")
 
@@ -4704,46 +6790,45 @@ class MainWindow(QMainWindow):
 
     def show_container_counts_chart(self, table_name, figure, canvas):
         try:
-            conn = connect_db()
-            today = datetime.today().date()
-            tomorrow = today + timedelta(days=1)  # 내일 날짜 계산
+            with db_connection() as conn:
+                today = datetime.today().date()
+                tomorrow = today + timedelta(days=1)  # 내일 날짜 계산
 
-            # 긴급 컨테이너 - CEDROS 조회
-            query_emergency_cedros = f"""
-            SELECT COUNT(*) as count
-            FROM {table_name}
-            WHERE ([urgentcargo] LIKE '%y%' OR [urgentcargo] LIKE '%Y%')
-            AND [f.dest] = 'CEDROS'
-            AND (
-                (date([eta]) >= '{today}' AND [eta] IS NOT NULL)
-                OR
-                ([eta] IS NULL AND date([etaport]) >= '{today}')
-            )
-            """
-            df_emergency_cedros = pd.read_sql(query_emergency_cedros, conn)
-            emergency_count_cedros = df_emergency_cedros["count"].iloc[0]
+                # 긴급 컨테이너 - CEDROS 조회
+                query_emergency_cedros = f"""
+                SELECT COUNT(*) as count
+                FROM {table_name}
+                WHERE ([urgentcargo] LIKE '%y%' OR [urgentcargo] LIKE '%Y%')
+                AND [f.dest] = 'CEDROS'
+                AND (
+                    (date([eta]) >= '{today}' AND [eta] IS NOT NULL)
+                    OR
+                    ([eta] IS NULL AND date([etaport]) >= '{today}')
+                )
+                """
+                df_emergency_cedros = pd.read_sql(query_emergency_cedros, conn)
+                emergency_count_cedros = df_emergency_cedros["count"].iloc[0]
 
-            # 오늘 입고 예정 컨테이너 - CEDROS 조회
-            query_incoming_today_cedros = f"""
-            SELECT COUNT(*) as count
-            FROM {table_name}
-            WHERE (date([eta]) = '{today}') AND [eta] IS NOT NULL
-            AND [f.dest] = 'CEDROS'
-            """
-            df_incoming_today_cedros = pd.read_sql(query_incoming_today_cedros, conn)
-            incoming_today_count_cedros = df_incoming_today_cedros["count"].iloc[0]
+                # 오늘 입고 예정 컨테이너 - CEDROS 조회
+                query_incoming_today_cedros = f"""
+                SELECT COUNT(*) as count
+                FROM {table_name}
+                WHERE (date([eta]) = '{today}') AND [eta] IS NOT NULL
+                AND [f.dest] = 'CEDROS'
+                """
+                df_incoming_today_cedros = pd.read_sql(query_incoming_today_cedros, conn)
+                incoming_today_count_cedros = df_incoming_today_cedros["count"].iloc[0]
 
-            # 내일 입고 예정 컨테이너 - CEDROS 조회
-            query_incoming_tomorrow_cedros = f"""
-            SELECT COUNT(*) as count
-            FROM {table_name}
-            WHERE (date([eta]) = '{tomorrow}') AND [eta] IS NOT NULL
-            AND [f.dest] = 'CEDROS'
-            """
-            df_incoming_tomorrow_cedros = pd.read_sql(query_incoming_tomorrow_cedros, conn)
-            incoming_tomorrow_count_cedros = df_incoming_tomorrow_cedros["count"].iloc[0]
+                # 내일 입고 예정 컨테이너 - CEDROS 조회
+                query_incoming_tomorrow_cedros = f"""
+                SELECT COUNT(*) as count
+                FROM {table_name}
+                WHERE (date([eta]) = '{tomorrow}') AND [eta] IS NOT NULL
+                AND [f.dest] = 'CEDROS'
+                """
+                df_incoming_tomorrow_cedros = pd.read_sql(query_incoming_tomorrow_cedros, conn)
+                incoming_tomorrow_count_cedros = df_incoming_tomorrow_cedros["count"].iloc[0]
 
-            conn.close()
 
             # 데이터를 딕셔너리로 정리
             data = {
@@ -4833,7 +6918,6 @@ class MainWindow(QMainWindow):
         선택한 카테고리에 해당하는 CEDROS의 데이터를 가져와서 표시하는 메서드
         """
         try:
-            conn = connect_db()
             today = datetime.today().date()
             tomorrow = today + timedelta(days=1)
 
@@ -4864,12 +6948,11 @@ class MainWindow(QMainWindow):
                 AND [f.dest] = 'CEDROS'
                 """
             else:
-                conn.close()
                 QMessageBox.warning(self, "Warning", "Unknown category.")
                 return
 
-            df = pd.read_sql(query, conn)
-            conn.close()
+            with db_connection() as conn:
+                df = pd.read_sql(query, conn)
 
             if not df.empty:
                 self.data_window = DataDisplayWindow(df, self)
@@ -4979,73 +7062,71 @@ class MainWindow(QMainWindow):
         try:
             import numpy as np
 
-            conn = connect_db()
-            today = datetime.today().date()
-
-            # modality와 destinationport별 총 데이터 개수 확인
-            query_modality = f"""
-            SELECT COUNT(*) as count
-            FROM {table_name}
-            WHERE [modality] = '{modality}' 
-            AND [destinationport] = '{port}'
-            """
-            df_modality = pd.read_sql(query_modality, conn)
-            modality_count = df_modality['count'].iloc[0]
+            with db_connection() as conn:
+                today = datetime.today().date()
 
-            if modality_count == 0:
-                # 데이터 없음 처리
-                figure.clear()
-                ax = figure.add_subplot(111)
-                ax.text(0.5, 0.5, 'No data', horizontalalignment='center', verticalalignment='center',
-                        transform=ax.transAxes, color='white')
-                ax.set_title(f"{modality}", color='white', fontsize=12)
-                ax.axis('off')
-                figure.patch.set_facecolor('#19232D')
-                ax.set_facecolor('#19232D')
-                canvas.draw()
-                conn.close()
-                return
+                # modality와 destinationport별 총 데이터 개수 확인
+                query_modality = f"""
+                SELECT COUNT(*) as count
+                FROM {table_name}
+                WHERE [modality] = '{modality}' 
+                AND [destinationport] = '{port}'
+                """
+                df_modality = pd.read_sql(query_modality, conn)
+                modality_count = df_modality['count'].iloc[0]
+
+                if modality_count == 0:
+                    # 데이터 없음 처리
+                    figure.clear()
+                    ax = figure.add_subplot(111)
+                    ax.text(0.5, 0.5, 'No data', horizontalalignment='center', verticalalignment='center',
+                            transform=ax.transAxes, color='white')
+                    ax.set_title(f"{modality}", color='white', fontsize=12)
+                    ax.axis('off')
+                    figure.patch.set_facecolor('#19232D')
+                    ax.set_facecolor('#19232D')
+                    canvas.draw()
+                    return
 
-            # '입항 전' 계산 (etaport가 오늘 이후인 것들)
-            query_pre_arrival = f"""
-            SELECT COUNT(*) as count
-            FROM {table_name}
-            WHERE [modality] = '{modality}' 
-            AND [destinationport] = '{port}'
-            AND [etaport] IS NOT NULL 
-            AND [etaport] != ''
-            AND date([etaport]) > '{today}'
-            """
-            df_pre_arrival = pd.read_sql(query_pre_arrival, conn)
-            pre_arrival_count = df_pre_arrival['count'].iloc[0]
+                # '입항 전' 계산 (etaport가 오늘 이후인 것들)
+                query_pre_arrival = f"""
+                SELECT COUNT(*) as count
+                FROM {table_name}
+                WHERE [modality] = '{modality}' 
+                AND [destinationport] = '{port}'
+                AND [etaport] IS NOT NULL 
+                AND [etaport] != ''
+                AND date([etaport]) > '{today}'
+                """
+                df_pre_arrival = pd.read_sql(query_pre_arrival, conn)
+                pre_arrival_count = df_pre_arrival['count'].iloc[0]
 
-            # '당일 반출' 계산 (terminalappointment가 오늘인 것들)
-            query_same_day = f"""
-            SELECT COUNT(*) as count
-            FROM {table_name}
-            WHERE [modality] = '{modality}' 
-            AND [destinationport] = '{port}'
-            AND [terminalappointment] IS NOT NULL 
-            AND [terminalappointment] != ''
-            AND date([terminalappointment]) = '{today}'
-            """
-            df_same_day = pd.read_sql(query_same_day, conn)
-            same_day_count = df_same_day['count'].iloc[0]
+                # '당일 반출' 계산 (terminalappointment가 오늘인 것들)
+                query_same_day = f"""
+                SELECT COUNT(*) as count
+                FROM {table_name}
+                WHERE [modality] = '{modality}' 
+                AND [destinationport] = '{port}'
+                AND [terminalappointment] IS NOT NULL 
+                AND [terminalappointment] != ''
+                AND date([terminalappointment]) = '{today}'
+                """
+                df_same_day = pd.read_sql(query_same_day, conn)
+                same_day_count = df_same_day['count'].iloc[0]
 
-            # '잔량' 계산 (terminalappointment가 오늘 이후인 것들)
-            query_remaining = f"""
-            SELECT COUNT(*) as count
-            FROM {table_name}
-            WHERE [modality] = '{modality}' 
-            AND [destinationport] = '{port}'
-            AND [terminalappointment] IS NOT NULL 
-            AND [terminalappointment] != ''
-            AND date([terminalappointment]) > '{today}'
-            """
-            df_remaining = pd.read_sql(query_remaining, conn)
-            remaining_count = df_remaining['count'].iloc[0]
+                # '잔량' 계산 (terminalappointment가 오늘 이후인 것들)
+                query_remaining = f"""
+                SELECT COUNT(*) as count
+                FROM {table_name}
+                WHERE [modality] = '{modality}' 
+                AND [destinationport] = '{port}'
+                AND [terminalappointment] IS NOT NULL 
+                AND [terminalappointment] != ''
+                AND date([terminalappointment]) > '{today}'
+                """
+                df_remaining = pd.read_sql(query_remaining, conn)
+                remaining_count = df_remaining['count'].iloc[0]
 
-            conn.close()
 
             # 데이터 준비
             counts = {
@@ -5175,7 +7256,6 @@ class MainWindow(QMainWindow):
         선택한 카테고리에 해당하는 데이터를 가져와서 표시하는 메서드
         """
         try:
-            conn = connect_db()
             today = datetime.today().date()
 
             if category == 'Pre-arrival':
@@ -5209,12 +7289,11 @@ class MainWindow(QMainWindow):
                 AND date([terminalappointment]) > '{today}'
                 """
             else:
-                conn.close()
                 QMessageBox.warning(self, "Warning", "Unknown category.")
                 return
 
-            df = pd.read_sql(query, conn)
-            conn.close()
+            with db_connection() as conn:
+                df = pd.read_sql(query, conn)
 
             if not df.empty:
                 self.data_window = DataDisplayWindow(df, self)
@@ -5235,10 +7314,8 @@ class MainWindow(QMainWindow):
         self.show_modality_donut_chart_by_port(table_name, "RAIL", selected_port, rail_figure, rail_canvas)
     
     def show_combined_storage_cost_chart(self):
-        combined_data = pd.DataFrame()
-        for table_name in self.tab_info.values():
-            df = StorageUtils.get_monthly_storage_data(table_name)
-            combined_data = pd.concat([combined_data, df], ignore_index=True)
+        combined_data = StorageUtils.get_monthly_storage_data_many(list(self.tab_info.values())).groupby(
+            level='month')[['total_storage_cost', 'container_count']].sum().reset_index()
 
         if not combined_data.empty:
             # 'month'를 datetime으로 변환하고 연도와 월 추출
@@ -5352,7 +7429,13 @@ class MainWindow(QMainWindow):
             ax2.tick_params(axis='y', labelcolor='white')
 
             # 차트 제목
-            ax1.set_title(f"This Month's Total Storage Cost: {current_month_cost:,.2f} MXN", color='white')
+            title = f"This Month's Total Storage Cost: {current_month_cost:,.2f} MXN"
+            projection = self.calculate_storage_cost()
+            if not projection.empty:
+                # 아직 반출되지 않은 컨테이너의 예측 기간 동안 추가로 발생할 비용
+                title += (f"\nOpen Containers - Next {StorageProjectionEngine.DEFAULT_HORIZON_DAYS} Days: "
+                          f"{projection['projected_cost'].sum():,.2f} MXN")
+            ax1.set_title(title, color='white')
 
             # 레이아웃 및 배경색 설정
             self.combined_storage_figure.tight_layout()
@@ -5420,9 +7503,10 @@ class MainWindow(QMainWindow):
             ax.set_facecolor('#19232D')
             self.combined_storage_canvas.draw()    
 
-    def reload_data(self):
+    def reload_data(self, tables=None):
         """
         데이터베이스에서 데이터를 다시 로드하고 차트 및 표시를 업데이트합니다.
+        tables를 지정하면 해당 테이블의 탭만 다시 그립니다 (업로드로 내용이 바뀐 테이블).
         """
         # 로딩 애니메이션 시작 (필요에 따라 로딩 애니메이션 추가 가능)
         # self.loading_label.show()
@@ -5433,6 +7517,9 @@ class MainWindow(QMainWindow):
             # 업데이트 시간 라벨 갱신
             tab["update_label"].setText(f"Last updated: {self.get_last_update_time(table_name)}")
 
+            if tables is not None and table_name not in tables:
+                continue
+
             # 차트 갱신
             self.show_storage_cost_chart(table_name, tab["storage_figure"], tab["storage_canvas"])
             self.show_chart(table_name, tab["analysis_figure"], tab["analysis_canvas"])
@@ -5455,7 +7542,8 @@ class MainWindow(QMainWindow):
                                                    tab["delay_donut_canvas"])
 
         # 전체 스토리지 비용 차트 갱신
-        self.show_combined_storage_cost_chart()
+        if tables is None or tables:
+            self.show_combined_storage_cost_chart()
 
         # 로딩 애니메이션 종료 (필요에 따라 로딩 애니메이션 추가 가능)
         # self.loading_movie.stop()
@@ -5465,40 +7553,19 @@ class MainWindow(QMainWindow):
 
     def get_unique_origins(self):
         try:
-            conn = connect_db()
-            origins_set = set()
-            cursor = conn.cursor()
-            for table_name in self.tab_info.values():
-                query = f"SELECT DISTINCT origin FROM {table_name}"
-                cursor.execute(query)
-                results = cursor.fetchall()
-                for row in results:
-                    origin = row[0]
-                    if origin:
-                        standardized_origin = Mapping.standardize_origin_name(origin)
-                        origins_set.add(standardized_origin)
-            conn.close()
-            return sorted(origins_set)
+            with db_connection() as conn:
+                origins = ContainerStore.distinct(conn, 'origin', self.tab_info.values())
+            return sorted({Mapping.standardize_origin_name(origin) for origin in origins})
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred while getting the origin list: {str(e)}")
             return []
 
     def get_shipping_lines_for_origin(self, origin):
         try:
-            conn = connect_db()
-            cursor = conn.cursor()
-            
-            shipping_lines = []
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'table%'")
-            tables = cursor.fetchall()
-            
-            for (table_name,) in tables:
-                cursor.execute(f"SELECT DISTINCT shippingline FROM [{table_name}] WHERE origin = ?", (origin,))
-                results = cursor.fetchall()
-                shipping_lines.extend([sl[0] for sl in results if sl[0]])
-            
-            conn.close()
-            
+            with db_connection() as conn:
+                tables = ContainerStore.division_tables(conn)
+                shipping_lines = ContainerStore.distinct(conn, 'shippingline', tables, "origin = ?", (origin,))
+
             # 결과를 반환하기 전에 표준화 적용
             standardized_shipping_lines = [Mapping.standardize_shipping_line_name(sl) for sl in shipping_lines]
             return sorted(set(standardized_shipping_lines))  # 중복 제거 후 정렬하여 반환
@@ -5509,43 +7576,50 @@ class MainWindow(QMainWindow):
 
     def calculate_analyses(self, origin, shipping_lines, destination_ports, start_date, end_date):
         try:
-            conn = connect_db()
-            data_frames = []
-            cursor = conn.cursor()
+            with db_connection() as conn:
+                data_frames = []
+                cursor = conn.cursor()
 
-            # Origin과 Shipping Line 이름을 표준화
-            standardized_origin = Mapping.standardize_origin_name(origin)
-            standardized_shipping_lines = [Mapping.standardize_shipping_line_name(sl) for sl in shipping_lines]
+                # Origin과 Shipping Line 이름을 표준화
+                standardized_origin = Mapping.standardize_origin_name(origin)
+                standardized_shipping_lines = [Mapping.standardize_shipping_line_name(sl) for sl in shipping_lines]
 
-            # 플레이스홀더 생성
-            shipping_placeholders = ','.join(['?' for _ in standardized_shipping_lines])
-            port_placeholders = ','.join(['?' for _ in destination_ports])
+                # 플레이스홀더 생성
+                shipping_placeholders = ','.join(['?' for _ in standardized_shipping_lines])
+                port_placeholders = ','.join(['?' for _ in destination_ports])
             
-            # 파라미터 리스트 생성
-            params = [standardized_origin] + standardized_shipping_lines + destination_ports + [start_date, end_date]
-
-            for table_name in self.tab_info.values():
-                query = f"""
-                    SELECT origin, shippingdate, initialeta, etaport, unloadingterminal, eta, shippingline,
-                           julianday(etaport) - julianday(initialeta) AS vessel_delay
-                    FROM {table_name}
-                    WHERE TRIM(origin) = ? 
-                    AND TRIM(shippingline) IN ({shipping_placeholders})
-                    AND TRIM(destinationport) IN ({port_placeholders})
-                    AND DATE(etaport) BETWEEN ? AND ?
-                """
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                if rows:
-                    columns = [desc[0] for desc in cursor.description]
-                    df = pd.DataFrame(rows, columns=columns)
+                # 파라미터 리스트 생성
+                params = [standardized_origin] + standardized_shipping_lines + destination_ports + [start_date, end_date]
+
+                # 마이그레이션된 DB는 containers 한 번 조회
+                for source, where, source_params in ContainerStore.sources(conn, self.tab_info.values()):
+                    dates, days = DateNormalizer.sql(conn, source)
+                    query = f"""
+                        SELECT origin, shippingline,
+                               {days['shippingdate']} AS shippingdate,
+                               {days['initialeta']} AS initialeta,
+                               {days['etaport']} AS etaport,
+                               {days['unload']} AS unloadingterminal,
+                               {days['eta']} AS eta,
+                               {days['etaport']} - {days['initialeta']} AS vessel_delay
+                        FROM [{source}]
+                        WHERE {where}
+                        AND TRIM(origin) = ? 
+                        AND TRIM(shippingline) IN ({shipping_placeholders})
+                        AND TRIM(destinationport) IN ({port_placeholders})
+                        AND {dates['etaport']} BETWEEN ? AND ?
+                    """
+                    cursor.execute(query, list(source_params) + params)
+                    rows = cursor.fetchall()
+                    if rows:
+                        columns = [desc[0] for desc in cursor.description]
+                        df = pd.DataFrame(rows, columns=columns)
 
-                    # 데이터프레임의 origin과 shippingline 컬럼을 표준화
-                    df['origin'] = df['origin'].apply(Mapping.standardize_origin_name)
-                    df['shippingline'] = df['shippingline'].apply(Mapping.standardize_shipping_line_name)
+                        # 데이터프레임의 origin과 shippingline 컬럼을 표준화
+                        df['origin'] = df['origin'].apply(Mapping.standardize_origin_name)
+                        df['shippingline'] = df['shippingline'].apply(Mapping.standardize_shipping_line_name)
 
-                    data_frames.append(df)
-            conn.close()
+                        data_frames.append(df)
 
             # 빈 데이터프레임 처리
             data_frames = [df for df in data_frames if not df.empty and not df.isna().all().all()]
@@ -5555,11 +7629,8 @@ class MainWindow(QMainWindow):
 
             data = pd.concat(data_frames, ignore_index=True)
 
-            # 날짜 열 처리
+            # 날짜 열은 정수 일련번호로 조회되므로 리드타임은 단순 뺄셈으로 계산
             date_columns = ['shippingdate', 'initialeta', 'etaport', 'unloadingterminal', 'eta']
-            for col in date_columns:
-                if col in data.columns:
-                    data[col] = pd.to_datetime(data[col], errors='coerce')
 
             # 유효한 날짜 데이터만 사용
             data = data.dropna(subset=date_columns)
@@ -5579,7 +7650,7 @@ class MainWindow(QMainWindow):
 
             # 2. shippingdate - etaport 평균 리드타임
             if 'shippingdate' in data.columns and 'etaport' in data.columns:
-                data['leadtime1'] = (data['etaport'] - data['shippingdate']).dt.days
+                data['leadtime1'] = data['etaport'] - data['shippingdate']
                 leadtime1_avg = data['leadtime1'].mean()
                 results['Average Lead Time (shippingdate to etaport)'] = leadtime1_avg
             else:
@@ -5587,7 +7658,7 @@ class MainWindow(QMainWindow):
 
             # 3. etaport - unloadingterminal 평균 리드타임
             if 'etaport' in data.columns and 'unloadingterminal' in data.columns:
-                data['leadtime2'] = (data['unloadingterminal'] - data['etaport']).dt.days
+                data['leadtime2'] = data['unloadingterminal'] - data['etaport']
                 leadtime2_avg = data['leadtime2'].mean()
                 results['Average Lead Time (etaport to unloadingterminal)'] = leadtime2_avg
             else:
@@ -5595,7 +7666,7 @@ class MainWindow(QMainWindow):
 
             # 4. unloadingterminal - eta 평균 리드타임
             if 'unloadingterminal' in data.columns and 'eta' in data.columns:
-                data['leadtime3'] = (data['eta'] - data['unloadingterminal']).dt.days
+                data['leadtime3'] = data['eta'] - data['unloadingterminal']
                 leadtime3_avg = data['leadtime3'].mean()
                 results['Average Lead Time (unloadingterminal to eta)'] = leadtime3_avg
             else:
@@ -5603,7 +7674,7 @@ class MainWindow(QMainWindow):
 
             # 5. shippingdate - eta 평균 리드타임
             if 'shippingdate' in data.columns and 'eta' in data.columns:
-                data['leadtime4'] = (data['eta'] - data['shippingdate']).dt.days
+                data['leadtime4'] = data['eta'] - data['shippingdate']
                 leadtime4_avg = data['leadtime4'].mean()
                 results['Average Lead Time (shippingdate to eta)'] = leadtime4_avg
             else:
@@ -5616,28 +7687,27 @@ class MainWindow(QMainWindow):
 
     def show_origin_analysis(self, table_name, start_date, end_date):
         try:
-            conn = connect_db()
+            with db_connection() as conn:
             
-            # 날짜 범위에 해당하는 데이터 조회 쿼리
-            query = f"""
-            SELECT [origin], [eta], COUNT(*) as count
-            FROM {table_name}
-            WHERE date([eta]) BETWEEN ? AND ?
-            GROUP BY [origin]
-            ORDER BY count DESC
-            """
-            df = pd.read_sql(query, conn, params=(start_date, end_date))
+                # 날짜 범위에 해당하는 데이터 조회 쿼리
+                query = f"""
+                SELECT [origin], [eta], COUNT(*) as count
+                FROM {table_name}
+                WHERE date([eta]) BETWEEN ? AND ?
+                GROUP BY [origin]
+                ORDER BY count DESC
+                """
+                df = pd.read_sql(query, conn, params=(start_date, end_date))
             
-            # 전체 데이터 조회를 위한 쿼리 (검증용)
-            verification_query = f"""
-            SELECT [origin], [eta], [container], [division]
-            FROM {table_name}
-            WHERE date([eta]) BETWEEN ? AND ?
-            ORDER BY [eta]
-            """
-            verification_df = pd.read_sql(verification_query, conn, params=(start_date, end_date))
+                # 전체 데이터 조회를 위한 쿼리 (검증용)
+                verification_query = f"""
+                SELECT [origin], [eta], [container], [division]
+                FROM {table_name}
+                WHERE date([eta]) BETWEEN ? AND ?
+                ORDER BY [eta]
+                """
+                verification_df = pd.read_sql(verification_query, conn, params=(start_date, end_date))
             
-            conn.close()
 
             if df.empty:
                 QMessageBox.information(self, "Information", "No data for the selected period.")
@@ -5795,28 +7865,27 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Warning", "Please select at least one Origin and one Shipping Line.")
                 return
 
-            conn = connect_db()
+            with db_connection() as conn:
             
-            # 선택된 Origin과 Shipping Line을 표준화
-            standardized_origins = [Mapping.standardize_origin_name(origin) for origin in selected_origins]
-            standardized_shipping_lines = [Mapping.standardize_shipping_line_name(sl) for sl in selected_shipping_lines]
+                # 선택된 Origin과 Shipping Line을 표준화
+                standardized_origins = [Mapping.standardize_origin_name(origin) for origin in selected_origins]
+                standardized_shipping_lines = [Mapping.standardize_shipping_line_name(sl) for sl in selected_shipping_lines]
 
-            # 선택된 조건에 맞는 데이터 조회
-            query = f"""
-            SELECT [origin], [etaport], [container], [division], [shippingline]
-            FROM {self.current_table_name}
-            WHERE date([etaport]) BETWEEN ? AND ?
-            AND [origin] IN ({','.join(['?']*len(standardized_origins))})
-            AND [shippingline] IN ({','.join(['?']*len(standardized_shipping_lines))})
-            ORDER BY [etaport]
-            """
+                # 선택된 조건에 맞는 데이터 조회
+                query = f"""
+                SELECT [origin], [etaport], [container], [division], [shippingline]
+                FROM {self.current_table_name}
+                WHERE date([etaport]) BETWEEN ? AND ?
+                AND [origin] IN ({','.join(['?']*len(standardized_origins))})
+                AND [shippingline] IN ({','.join(['?']*len(standardized_shipping_lines))})
+                ORDER BY [etaport]
+                """
             
-            # 쿼리 파라미터 설정
-            params = [start_date, end_date] + standardized_origins + standardized_shipping_lines
+                # 쿼리 파라미터 설정
+                params = [start_date, end_date] + standardized_origins + standardized_shipping_lines
             
-            # 데이터 조회
-            df = pd.read_sql(query, conn, params=params)
-            conn.close()
+                # 데이터 조회
+                df = pd.read_sql(query, conn, params=params)
 
             if not df.empty:
                 # 데이터 표시 창 생성
@@ -5843,42 +7912,262 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred while verifying data: {str(e)}")
 
-    def calculate_storage_cost(self, df):
-        
-        # 현재 날짜 기준 설정
-        current_date = datetime.now()
-        
-        # 데이터프레임의 날짜를 datetime으로 변환
-        df['etaport'] = pd.to_datetime(df['etaport'])
-        
-        # 현재 연도 데이터와 미래 데이터(2025년 이후) 필터링
-        current_df = df[df['etaport'].dt.year == current_date.year]
-        future_df = df[df['etaport'].dt.year >= 2025]  # 2025년 이후 모든 데이터
-        
-        # 두 데이터프레임 합치기
-        combined_df = pd.concat([current_df, future_df])
-        
-        if combined_df.empty:
-            return pd.DataFrame()
-        
-        # 시작일: 현재 날짜 기준
-        start_date = current_date - timedelta(days=30)
-        
-        # 종료일: 데이터의 가장 마지막 날짜 + 1년
-        # (미래 데이터의 스토리지 비용을 1년치 더 계산하기 위함)
-        max_future_date = future_df['etaport'].max() if not future_df.empty else current_date
-        end_date = max_future_date + timedelta(days=365)
-    
+    def calculate_storage_cost(self, horizon_days=StorageProjectionEngine.DEFAULT_HORIZON_DAYS):
+        """
+        아직 야드에 있는 컨테이너의 앞으로 horizon_days일 동안의 월별 예상 스토리지 비용 (탭의 모든 선사)
+        반환값: table_name, month, projected_cost, cumulative_cost, charged_containers
+        """
+        try:
+            return StorageUtils.get_projected_storage_cost(list(self.tab_info.values()), horizon_days=horizon_days)
+        except Exception as e:
+            print(f"Debug - Error projecting storage cost: {str(e)}")
+            return pd.DataFrame(columns=['table_name', 'month', 'projected_cost', 'cumulative_cost', 'charged_containers'])
+
     def show_storage_cost_analysis(self, table_name):
         """스토리지 비용 분석 창을 표시"""
         analysis_window = StorageCostAnalysisWindow(table_name, self)
         analysis_window.show()
  
 
+# KPI 보고서 컬럼 (KPI 창 테이블 헤더와 같은 이름)
+KPI_REPORT_COLUMNS = {
+    'division': 'Division', 'total_score': 'Total Score', 'grade': 'Grade',
+    'mom_change': 'MoM Change(%)', 'mom_score': 'MoM Score(35)',
+    'yoy_change': 'YoY Change(%)', 'yoy_score': 'YoY Score(25)',
+    'cost_per_container': 'Cost/Cont', 'cost_per_container_rank': 'Rank', 'cost_per_container_score': 'Score(25)',
+    'trend_score': 'Trend Score(15)', 'container_count': 'Container Count', 'container_bonus': 'Bonus Score(15)'
+}
+AVERAGE_REPORT_COLUMNS = {
+    'division': 'Division', 'total_score': 'Avg Total Score', 'mom_score': 'Avg MoM Score(35)',
+    'yoy_score': 'Avg YoY Score(25)', 'cost_per_container_score': 'Avg Cost/Cont Score(25)',
+    'trend_score': 'Avg Trend Score(15)'
+}
+
+
+def build_kpi_report(calculator, month, start_month, end_month, tab_info=None):
+    """
+    KPI 창과 같은 KPI 표 (month)와 월별 평균 점수 표 (start_month ~ end_month)를 DataFrame으로 생성
+    반환값: (KPI 표, 평균 점수 표), 디비전은 탭 이름으로 표시
+    """
+    tab_info = tab_info or TAB_INFO
+    table_to_tab = {table: tab for tab, table in tab_info.items()}
+    divisions = list(tab_info.values())
+
+    kpi = calculator.get_kpi_range(month, month).droplevel('month')
+    kpi = kpi.reindex([d for d in divisions if d in kpi.index]).rename_axis('division').reset_index()
+    kpi['division'] = kpi['division'].map(lambda name: table_to_tab.get(name, name))
+    kpi = kpi[list(KPI_REPORT_COLUMNS)].rename(columns=KPI_REPORT_COLUMNS)
+
+    averages = calculator.get_kpi_range(start_month, end_month).groupby(level='division')[
+        KPIWorker.AVERAGE_COLUMNS].mean()
+    averages = averages.reindex([d for d in divisions if d in averages.index]).rename_axis('division').reset_index()
+    averages['division'] = averages['division'].map(lambda name: table_to_tab.get(name, name))
+    averages = averages[list(AVERAGE_REPORT_COLUMNS)].rename(columns=AVERAGE_REPORT_COLUMNS)
+    return kpi.round(2), averages.round(2)
+
+
+def run_kpi_report(argv=None):
+    """
+    GUI 없이 KPI 표와 월별 평균 점수를 계산해 파일로 저장하는 명령줄 진입점 (예약 작업용)
+    예: python CNTR_CY.py kpi-report --db master_database.db --month 2024-05 --format xlsx csv --output reports
+    """
+    global db_file, HEADLESS
+
+    last_month = (pd.Timestamp(datetime.now().strftime('%Y-%m-01')) - pd.DateOffset(months=1)).strftime('%Y-%m')
+    parser = argparse.ArgumentParser(prog="CNTR_CY.py kpi-report",
+                                     description="Compute the division KPI table and monthly average scores without the GUI.")
+    parser.add_argument("--db", default=db_file, help="master_database.db path (default: shared database)")
+    parser.add_argument("--month", default=last_month, help="KPI month YYYY-MM (default: last month)")
+    parser.add_argument("--start", help="average range start YYYY-MM (default: 11 months before --month)")
+    parser.add_argument("--end", help="average range end YYYY-MM (default: --month)")
+    parser.add_argument("--format", nargs="+", choices=["csv", "xlsx", "json"], default=["xlsx"], help="output formats")
+    parser.add_argument("--output", default=".", help="output directory")
+    args = parser.parse_args(argv)
+
+    HEADLESS = True
+    db_file = args.db
+    try:
+        month = pd.Timestamp(f"{args.month}-01")
+        end_month = pd.Timestamp(f"{args.end}-01") if args.end else month
+        start_month = pd.Timestamp(f"{args.start}-01") if args.start else end_month - pd.DateOffset(months=11)
+
+        started = time.perf_counter()
+        kpi, averages = build_kpi_report(KPICalculator(tab_info=TAB_INFO), month, start_month, end_month)
+
+        # 파일 이름은 KPI 창 Export와 같은 형식
+        os.makedirs(args.output, exist_ok=True)
+        reports = {
+            f"Storage Cost_KPI_{month.strftime('%Y%m')}": ("KPI", kpi),
+            f"Storage Cost_Monthly_Average_{start_month.strftime('%Y%m')}_to_{end_month.strftime('%Y%m')}":
+                ("Monthly_Average", averages),
+        }
+        for name, (sheet_name, df) in reports.items():
+            for file_format in args.format:
+                path = os.path.join(args.output, f"{name}.{file_format}")
+                if file_format == "csv":
+                    df.to_csv(path, index=False, encoding="utf-8-sig")
+                elif file_format == "xlsx":
+                    df.to_excel(path, sheet_name=sheet_name, index=False, engine="openpyxl")
+                else:
+                    df.to_json(path, orient="records", force_ascii=False, indent=2)
+                print(f"Saved {path} ({len(df)} rows)")
+
+        print(f"KPI report finished in {time.perf_counter() - started:.2f}s")
+        return 0
+    except Exception as e:
+        print(f"Error generating KPI report: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        ConnectionManager.close_all()
+
+
+def run_tariffs(argv=None):
+    """
+    요금 규칙을 파일에서 가져오거나 (월별 집계 / KPI 스냅샷 재계산 포함) 파일로 내보내는 명령줄 진입점
+    예: python CNTR_CY.py tariffs import tariff_rules.csv --db master_database.db
+    """
+    global db_file, HEADLESS
+
+    parser = argparse.ArgumentParser(prog="CNTR_CY.py tariffs",
+                                     description="Import or export storage tariff rules.")
+    parser.add_argument("action", choices=["import", "export"], help="import: replace all rules from file, export: write current rules")
+    parser.add_argument("file", help="rules file (.csv, .xlsx or .json) with columns: " + ", ".join(TariffRules.COLUMNS))
+    parser.add_argument("--db", default=db_file, help="master_database.db path (default: shared database)")
+    args = parser.parse_args(argv)
+
+    HEADLESS = True
+    db_file = args.db
+    try:
+        if args.action == "export":
+            with db_connection() as conn:
+                rules = pd.DataFrame(TariffRules.DEFAULT_RULES, columns=TariffRules.COLUMNS)
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='tariff_rules'").fetchone():
+                    stored = pd.read_sql(
+                        f"SELECT {', '.join(TariffRules.COLUMNS)} FROM tariff_rules ORDER BY rule_id", conn)
+                    if not stored.empty:
+                        rules = stored
+            extension = os.path.splitext(args.file)[1].lower()
+            if extension in ('.xlsx', '.xls'):
+                rules.to_excel(args.file, index=False)
+            elif extension == '.json':
+                rules.to_json(args.file, orient='records', indent=2, force_ascii=False)
+            else:
+                rules.to_csv(args.file, index=False, encoding='utf-8-sig')
+            print(f"Saved {args.file} ({len(rules)} rules)")
+            return 0
+
+        rules = TariffRules.read_file(args.file)
+        started = time.perf_counter()
+        with db_connection(write=True) as conn:
+            TariffRules.replace(conn, rules)
+            refreshed = KPISnapshot.backfill(conn, dict(TAB_INFO))
+            conn.commit()
+        print(f"Imported {len(rules)} tariff rules, recalculated storage aggregates "
+              f"and {refreshed} KPI snapshot month(s) in {time.perf_counter() - started:.2f}s")
+        return 0
+    except Exception as e:
+        print(f"Error updating tariff rules: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        ConnectionManager.close_all()
+
+def run_migrate_containers(argv=None):
+    """
+    선사별 테이블을 containers 테이블 + 호환 뷰로 옮기는 명령줄 진입점 (한 번만 실행)
+    예: python CNTR_CY.py migrate-containers --db master_database.db
+    """
+    global db_file, HEADLESS
+
+    parser = argparse.ArgumentParser(prog="CNTR_CY.py migrate-containers",
+                                     description="Move table1..table11 into one containers table and keep them as views.")
+    parser.add_argument("--db", default=db_file, help="master_database.db path (default: shared database)")
+    args = parser.parse_args(argv)
+
+    HEADLESS = True
+    db_file = args.db
+    try:
+        started = time.perf_counter()
+        with db_connection(write=True) as conn:
+            migrated = ContainerStore.migrate(conn, list(TAB_INFO.values()))
+            conn.commit()
+            rows = conn.execute(f"SELECT COUNT(*) FROM {ContainerStore.TABLE}").fetchone()[0] if migrated else 0
+        if migrated:
+            print(f"Migrated {len(migrated)} tables ({rows} rows) in {time.perf_counter() - started:.2f}s")
+        else:
+            print("Nothing to migrate (containers table already exists or no division tables)")
+        return 0
+    except Exception as e:
+        print(f"Error migrating division tables: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        ConnectionManager.close_all()
+
+
+def run_index_advisor(argv=None):
+    """
+    대표 조회 쿼리의 실행 계획을 출력하고 전체 스캔을 보고하는 명령줄 진입점
+    예: python CNTR_CY.py index-advisor --db master_database.db --create
+    """
+    global db_file, HEADLESS
+
+    parser = argparse.ArgumentParser(prog="CNTR_CY.py index-advisor",
+                                     description="Run EXPLAIN QUERY PLAN on the app's main queries and report full table scans.")
+    parser.add_argument("--db", default=db_file, help="master_database.db path (default: shared database)")
+    parser.add_argument("--create", action="store_true", help="create missing query indexes before explaining")
+    parser.add_argument("--all", action="store_true", help="print every plan, not only full scans")
+    args = parser.parse_args(argv)
+
+    HEADLESS = True
+    db_file = args.db
+    tables = list(TAB_INFO.values())
+    try:
+        if args.create:
+            with db_connection(write=True) as conn:
+                created = QueryIndexes.ensure(conn, tables)
+                conn.commit()
+            print(f"Created {len(created)} indexes" + (f": {', '.join(created)}" if created else ""))
+
+        with db_connection() as conn:
+            existing = [t for t in tables if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name=?", (t,)).fetchone()]
+            report = QueryIndexes.explain(conn, existing)
+
+        flagged = report[report['full_scan'] & ~report['expected']]
+        rows = report if args.all else flagged
+        for record in rows.itertuples(index=False):
+            if record.full_scan and record.expected:
+                status = "SCAN (expected)"
+            else:
+                status = "FULL SCAN" if record.full_scan else "ok"
+            print(f"{status:<16} {record.query:<26} {record.table:<12} {record.plan}")
+        print(f"{len(report)} plans checked, {len(flagged)} unexpected full scans")
+        return 0
+    except Exception as e:
+        print(f"Error running index advisor: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        ConnectionManager.close_all()
+
+
 if __name__ == "__main__":
+    # 명령줄 KPI 보고서 (GUI 없이 실행)
+    if len(sys.argv) > 1 and sys.argv[1] == "kpi-report":
+        sys.exit(run_kpi_report(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "tariffs":
+        sys.exit(run_tariffs(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate-containers":
+        sys.exit(run_migrate_containers(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "index-advisor":
+        sys.exit(run_index_advisor(sys.argv[2:]))
+
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(ConnectionManager.close_all)
+
+    # 읽기는 로컬 복제본에서 (로딩 화면에서 첫 동기화)
+    DatabaseReplica.enabled = True
 
-    # qdarkstyle 적용
+    # qdarkstyle 적용 (GUI 실행에만 필요하므로 여기서 import)
+    import qdarkstyle
     app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
 
     # 로딩 화면으로 시작
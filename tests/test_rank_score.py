@@ -0,0 +1,158 @@
+"""
+KPICalculator.rank_score 커널이 기존 반복문 점수 계산 (_calculate_mom_score / _calculate_yoy_score /
+calculate_cost_per_container_rank)과 같은 순위 / 점수를 내는지 확인하는 속성 기반 테스트
+실행: python -m pytest tests (pytest, hypothesis와 CNTR_CY.py 의존성 필요)
+"""
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import example, given, strategies as st
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+CNTR_CY = pytest.importorskip("CNTR_CY")
+rank_score = CNTR_CY.KPICalculator.rank_score
+
+
+# ---- 기존 구현 (비교 기준, 원래 코드 그대로) ----
+
+def old_mom_score(change_percent, all_changes):
+    """MoM 변화율에 따른 점수 계산 (35점 만점)"""
+    if not all_changes:
+        return 17.5
+
+    if change_percent not in all_changes:
+        all_changes.append(change_percent)
+
+    sorted_changes = sorted(all_changes)
+    total_divisions = len(sorted_changes)
+
+    if total_divisions == 1:
+        return 35
+
+    rank_scores = {}
+    current_rank = 1
+    prev_change = None
+
+    for i, change in enumerate(sorted_changes):
+        if prev_change is not None and change != prev_change:
+            current_rank = i + 1
+
+        score = 35 - ((current_rank - 1) * (17.5 / (total_divisions - 1)))
+        rank_scores[change] = score
+        prev_change = change
+
+    return rank_scores[change_percent]
+
+
+def old_yoy_score(change_percent, all_changes):
+    """YoY 변화율에 따른 점수 계산 (25점 만점)"""
+    if not all_changes:
+        return 12.5
+
+    if change_percent not in all_changes:
+        all_changes.append(change_percent)
+
+    sorted_changes = sorted(all_changes)
+    total_divisions = len(sorted_changes)
+
+    if total_divisions == 1:
+        return 25
+
+    rank_scores = {}
+    current_rank = 1
+    prev_change = None
+
+    for i, change in enumerate(sorted_changes):
+        if prev_change is not None and change != prev_change:
+            current_rank = i + 1
+
+        score = 25 - ((current_rank - 1) * (12.5 / (total_divisions - 1)))
+        rank_scores[change] = score
+        prev_change = change
+
+    return rank_scores[change_percent]
+
+
+def old_cost_rank(division_costs):
+    """컨테이너당 비용 순위 / 점수 (calculate_cost_per_container_rank의 순위 계산 부분)"""
+    division_costs = sorted(division_costs, key=lambda x: x[1])
+
+    results = {}
+    current_rank = 1
+    prev_cost = None
+    rank_scores = {1: 25, 2: 22.5, 3: 20, 4: 17.5, 5: 15, 6: 12.5, 7: 10, 8: 7.5, 9: 5, 10: 2.5}
+
+    for i, (division, cost) in enumerate(division_costs):
+        if prev_cost is not None and cost != prev_cost:
+            current_rank = i + 1
+
+        score = rank_scores.get(current_rank, 0)
+        results[division] = {'rank': current_rank, 'score': score}
+        prev_cost = cost
+
+    return results
+
+
+# ---- 입력 생성: 동점이 자주 나오도록 작은 정수 값과 일반 실수를 섞음 ----
+
+values_strategy = st.one_of(
+    st.integers(min_value=-3, max_value=3).map(float),
+    st.sampled_from([-100.0, 0.0, 100.0]),
+    st.floats(min_value=-100, max_value=1000, allow_nan=False, allow_infinity=False),
+)
+vectors = st.lists(values_strategy, min_size=1, max_size=16)
+
+
+@given(vectors)
+@example([5.0, 5.0, 5.0])
+@example([1.0, 2.0, 2.0, 3.0])
+@example([0.0])
+def test_mom_score_matches_loop(values):
+    _, score = rank_score(values, 35, worst=17.5)
+    for value, new in zip(values, score):
+        assert new == pytest.approx(old_mom_score(value, list(values)), rel=1e-12, abs=1e-12)
+
+
+@given(vectors)
+@example([-100.0, 100.0, -100.0])
+def test_yoy_score_matches_loop(values):
+    _, score = rank_score(values, 25, worst=12.5)
+    for value, new in zip(values, score):
+        assert new == pytest.approx(old_yoy_score(value, list(values)), rel=1e-12, abs=1e-12)
+
+
+@given(vectors)
+@example([float(i) for i in range(12)])              # 11등, 12등은 0점
+@example([1.0] * 3 + [float(i) for i in range(2, 12)])  # 동점 뒤 순위 건너뜀 + 11등 이하
+def test_cost_rank_matches_loop(values):
+    divisions = [f'table{i}' for i in range(1, len(values) + 1)]
+    expected = old_cost_rank(list(zip(divisions, values)))
+    rank, score = rank_score(np.array(values), 25, step=2.5)
+    for division, r, s in zip(divisions, rank, score):
+        assert int(r) == expected[division]['rank']
+        assert s == pytest.approx(expected[division]['score'], abs=1e-12)
+        if expected[division]['rank'] >= 11:
+            assert s == 0
+
+
+@given(st.lists(st.lists(st.one_of(values_strategy, st.just(math.nan)), min_size=4, max_size=4),
+                min_size=1, max_size=12))
+def test_matrix_columns_rank_independently(rows):
+    """2차원 입력은 열(월)마다 NaN을 빼고 따로 순위를 매김"""
+    matrix = np.array(rows, dtype='float64')
+    rank, score = rank_score(matrix, 35, worst=17.5)
+    for column in range(matrix.shape[1]):
+        present = ~np.isnan(matrix[:, column])
+        assert np.isnan(score[~present, column]).all()
+        values = matrix[present, column].tolist()
+        if not values:
+            continue
+        _, expected = rank_score(values, 35, worst=17.5)
+        np.testing.assert_allclose(score[present, column], expected, rtol=1e-12, atol=1e-12)
+        for value, new in zip(values, score[present, column]):
+            assert new == pytest.approx(old_mom_score(value, list(values)), rel=1e-12, abs=1e-12)